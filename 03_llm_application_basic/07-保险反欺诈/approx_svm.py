@@ -0,0 +1,102 @@
+"""
+近似核SVM
+==========
+
+SVC(probability=True) 的问题:
+1. 核SVM的训练复杂度随样本数超二次增长
+2. probability=True 会在内部再做一次5折交叉验证的 Platt 校准，相当于多训练5次
+
+近似核SVM的做法:
+1. 用 Nystroem 或随机傅里叶特征（RBFSampler）把样本映射到有限维特征空间，近似RBF核
+2. 在映射后的特征上训练线性SVM（LinearSVC），训练时间随样本数线性增长
+3. 预留一部分训练数据，只做一次 Platt 校准（对 decision_function 拟合逻辑回归）得到概率
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.svm import LinearSVC
+
+
+class ApproxKernelSVC(BaseEstimator, ClassifierMixin):
+    """
+    近似RBF核 + 线性SVM + 单次留出 Platt 校准的二分类器
+
+    参数:
+        approximation (str): 'nystroem' 或 'rff'（随机傅里叶特征）
+        n_components (int): 近似特征维度
+        gamma (float or None): RBF核参数，None 时与 SVC 的 gamma='scale' 一致
+        C (float): 线性SVM的正则化参数
+        class_weight: 类别权重，与 SVC 用法相同
+        calibration_size (float): 用于 Platt 校准的留出比例
+        random_state (int): 随机种子
+    """
+
+    def __init__(self, approximation='nystroem', n_components=300, gamma=None, C=1.0,
+                 class_weight='balanced', calibration_size=0.2, random_state=42):
+        self.approximation = approximation
+        self.n_components = n_components
+        self.gamma = gamma
+        self.C = C
+        self.class_weight = class_weight
+        self.calibration_size = calibration_size
+        self.random_state = random_state
+
+    def _make_feature_map(self, gamma, n_samples):
+        if self.approximation == 'nystroem':
+            return Nystroem(kernel='rbf', gamma=gamma, random_state=self.random_state,
+                            n_components=min(self.n_components, n_samples))
+        if self.approximation == 'rff':
+            return RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.random_state)
+        raise ValueError(f"未知的核近似方法: {self.approximation}")
+
+    def fit(self, X, y):
+        """
+        训练模型：特征映射 + 线性SVM，然后在留出集上做一次 Platt 校准
+
+        参数:
+            X (array-like): 特征矩阵
+            y (array-like): 二分类标签
+
+        返回:
+            ApproxKernelSVC: self
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        if len(self.classes_) != 2:
+            raise ValueError("仅支持二分类")
+
+        X_fit, X_cal, y_fit, y_cal = train_test_split(
+            X, y, test_size=self.calibration_size, random_state=self.random_state, stratify=y
+        )
+
+        # gamma='scale' 与 SVC 一致：1 / (n_features * X.var())
+        gamma = self.gamma
+        if gamma is None:
+            variance = X_fit.var()
+            gamma = 1.0 / (X_fit.shape[1] * variance) if variance > 0 else 1.0
+
+        self.feature_map_ = self._make_feature_map(gamma, len(X_fit))
+        Z_fit = self.feature_map_.fit_transform(X_fit)
+        self.svm_ = LinearSVC(C=self.C, class_weight=self.class_weight, random_state=self.random_state)
+        self.svm_.fit(Z_fit, y_fit)
+
+        # Platt 校准：在留出集的决策值上拟合一维逻辑回归
+        self.calibrator_ = LogisticRegression()
+        self.calibrator_.fit(self.svm_.decision_function(self.feature_map_.transform(X_cal))[:, None], y_cal)
+        return self
+
+    def decision_function(self, X):
+        """线性SVM在近似核特征上的决策值"""
+        return self.svm_.decision_function(self.feature_map_.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict_proba(self, X):
+        """经过 Platt 校准的类别概率"""
+        return self.calibrator_.predict_proba(self.decision_function(X)[:, None])
+
+    def predict(self, X):
+        """与 SVC 一致，按决策值的符号预测类别"""
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
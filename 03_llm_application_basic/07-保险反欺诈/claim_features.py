@@ -0,0 +1,118 @@
+"""
+理赔特征工程（训练与线上打分共用）
+==================================
+
+训练脚本在标准化之前依次做了：缺失值填充 → 分类特征编码 → 特征工程（create_features）→
+数值特征选择、无穷大和缺失值置0。线上打分必须走完全相同的步骤，
+否则 claim_per_vehicle、injury_ratio、net_capital 等派生特征会缺失或算错，分数和原因码都不可信。
+
+说明:
+1. high_claim_amount 以训练集 total_claim_amount 的 75% 分位数为界，线上打分使用训练时保存的阈值，
+   不能按请求里的这一批理赔重新计算分位数（单条理赔时分位数就是它自己）
+2. prepare_claims() 检查原始理赔是否包含所有必需的字段，缺少时直接报错，不做均值填充
+"""
+
+import numpy as np
+import pandas as pd
+
+# create_features 用到的原始字段
+FEATURE_INPUTS = [
+    'total_claim_amount', 'number_of_vehicles_involved', 'injury_claim', 'property_claim', 'vehicle_claim',
+    'age', 'months_as_customer', 'policy_annual_premium', 'umbrella_limit', 'incident_hour_of_the_day',
+    'capital-gains', 'capital-loss',
+]
+
+# create_features 新增的特征
+ENGINEERED_FEATURES = [
+    'claim_per_vehicle', 'injury_ratio', 'property_ratio', 'vehicle_ratio',
+    'customer_age_group', 'customer_tenure_group', 'premium_per_month', 'has_umbrella',
+    'is_night_accident', 'high_claim_amount', 'net_capital', 'has_capital_gains', 'has_capital_loss',
+]
+
+
+def high_claim_threshold(df):
+    """高额索赔的阈值：total_claim_amount 的 75% 分位数"""
+    return float(df['total_claim_amount'].quantile(0.75))
+
+
+def create_features(df, high_claim_cutoff=None):
+    """
+    创建新的特征以增强模型的预测能力
+
+    参数:
+        df (DataFrame): 原始数据框
+        high_claim_cutoff (float): 高额索赔的阈值，None 时用 df 自身的 75% 分位数（训练时）
+
+    返回:
+        DataFrame: 包含新特征的数据框
+
+    新特征包括:
+    1. 索赔金额相关特征：每车索赔金额、各类索赔比例
+    2. 客户特征：年龄分组、客户时长分组
+    3. 保单特征：月保费、是否有伞形保险
+    4. 事故特征：是否夜间事故、是否高额索赔
+    5. 财务特征：净资本、是否有资本收益/损失
+    """
+    df = df.copy()
+    if high_claim_cutoff is None:
+        high_claim_cutoff = high_claim_threshold(df)
+
+    # 1. 索赔金额相关特征
+    df['claim_per_vehicle'] = df['total_claim_amount'] / (df['number_of_vehicles_involved'] + 1)
+    df['injury_ratio'] = df['injury_claim'] / (df['total_claim_amount'] + 1)
+    df['property_ratio'] = df['property_claim'] / (df['total_claim_amount'] + 1)
+    df['vehicle_ratio'] = df['vehicle_claim'] / (df['total_claim_amount'] + 1)
+
+    # 2. 客户特征 - 将连续变量分组
+    df['customer_age_group'] = pd.cut(df['age'], bins=[0, 25, 35, 50, 100], labels=[0, 1, 2, 3])
+    df['customer_tenure_group'] = pd.cut(df['months_as_customer'], bins=[0, 12, 60, 120, 1000], labels=[0, 1, 2, 3])
+
+    # 3. 保单特征
+    df['premium_per_month'] = df['policy_annual_premium'] / 12  # 月保费
+    df['has_umbrella'] = (df['umbrella_limit'] > 0).astype(int)  # 是否有伞形保险
+
+    # 4. 事故特征
+    df['is_night_accident'] = ((df['incident_hour_of_the_day'] >= 22) |
+                               (df['incident_hour_of_the_day'] <= 6)).astype(int)
+    df['high_claim_amount'] = (df['total_claim_amount'] > high_claim_cutoff).astype(int)
+
+    # 5. 财务特征
+    df['net_capital'] = df['capital-gains'] - df['capital-loss']
+    df['has_capital_gains'] = (df['capital-gains'] > 0).astype(int)
+    df['has_capital_loss'] = (df['capital-loss'] > 0).astype(int)
+
+    return df
+
+
+def prepare_claims(claims, numeric_features, label_encoders, high_claim_cutoff):
+    """
+    把原始理赔转换成模型输入（标准化之前），步骤与训练脚本一致
+
+    参数:
+        claims (list | DataFrame): 原始理赔，每条为 {字段: 取值}；分类字段可以是原始取值或已编码的整数
+        numeric_features (list): 模型使用的特征（训练时的列顺序）
+        label_encoders (dict): {列名: LabelEncoder}
+        high_claim_cutoff (float): 训练时保存的高额索赔阈值
+
+    返回:
+        DataFrame: 列为 numeric_features 的特征矩阵
+
+    异常:
+        ValueError: 缺少必需的字段
+    """
+    claims = pd.DataFrame(claims).reset_index(drop=True)
+    raw_features = [col for col in numeric_features if col not in ENGINEERED_FEATURES]
+    required = list(dict.fromkeys(raw_features + FEATURE_INPUTS))
+    missing = [col for col in required if col not in claims.columns]
+    if missing:
+        raise ValueError(f"理赔缺少必需的字段: {missing}")
+
+    # 与训练时相同的缺失值填充和分类特征编码（已编码的整数直接使用）
+    if 'authorities_contacted' in claims.columns:
+        claims['authorities_contacted'] = claims['authorities_contacted'].fillna('Unknown')
+    for col, encoder in label_encoders.items():
+        if col in claims.columns and not pd.api.types.is_numeric_dtype(claims[col]):
+            claims[col] = encoder.transform(claims[col].astype(str))
+
+    features = create_features(claims, high_claim_cutoff)[numeric_features].astype(np.float64)
+    return features.replace([np.inf, -np.inf], np.nan).fillna(0)
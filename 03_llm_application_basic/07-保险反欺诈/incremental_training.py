@@ -0,0 +1,237 @@
+"""
+欺诈检测模型的增量训练
+======================
+
+每次都在完整的 train.csv 上从头训练所有模型，数据越多越慢。
+增量训练只用每天新增的理赔数据（delta）更新模型，并定期做一次全量重训作为校准点。
+
+支持两种模型:
+1. 'sgd'：SGDClassifier(loss='log_loss')，即在线逻辑回归。
+   每次增量先用 partial_fit 更新 StandardScaler 的均值/方差，再 partial_fit 更新模型权重
+2. 'gb_append'：GradientBoostingClassifier(warm_start=True)，每次增量在新数据上追加若干棵树。
+   已有的树是在旧的标准化尺度上分裂的，所以该模式下冻结 StandardScaler，只在全量重训时更新。
+   追加的树只看到几十条新数据，和全量训练时一样强的树会拟合新数据的噪声，几次增量后 AUC 反而大幅下降，
+   所以追加的树更少（trees_per_update）、叶子更大（update_min_samples_leaf）、行抽样（subsample）；
+   新增数据不足 min_delta_rows 条时先暂存，攒够了再一起追加
+
+两种模式都用全量数据算出的 balanced 类别权重：SGD 通过 class_weight，GB 通过 sample_weight。
+
+留出集校验:
+update() 传入留出集时，比较更新前后留出集上的 AUC，变差则撤销这次更新（模型和标准化器恢复原样），
+latest 检查点也不会被覆盖。每次更新的结果记录在 last_update 中。
+
+检查点:
+全量训练后保存 full 检查点，每次全量训练和增量更新后都刷新 latest 检查点（模型、标准化器和计数器），
+可用 IncrementalFraudModel.load_checkpoint() 恢复后继续增量更新。
+"""
+
+import copy
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
+
+
+class IncrementalFraudModel:
+    """
+    支持增量更新和定期全量重训的欺诈检测模型
+
+    参数:
+        model_type (str): 'sgd' 或 'gb_append'
+        full_retrain_every (int): 累计多少次增量更新后需要全量重训
+        trees_per_update (int): gb_append 模式下每次增量追加的树数量
+        update_min_samples_leaf (int): gb_append 模式下追加的树每个叶子的最少样本数
+        min_delta_rows (int): gb_append 模式下一次追加至少需要的新增数据条数，不足时暂存
+        checkpoint_dir (str or None): 检查点目录，None 表示不保存
+        random_state (int): 随机种子
+    """
+
+    def __init__(self, model_type='sgd', full_retrain_every=30, trees_per_update=3, update_min_samples_leaf=20,
+                 min_delta_rows=100, checkpoint_dir='checkpoints', random_state=42):
+        if model_type not in ('sgd', 'gb_append'):
+            raise ValueError(f"不支持的模型类型: {model_type}")
+        self.model_type = model_type
+        self.full_retrain_every = full_retrain_every
+        self.trees_per_update = trees_per_update
+        self.update_min_samples_leaf = update_min_samples_leaf
+        self.min_delta_rows = min_delta_rows
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self.random_state = random_state
+        self.scaler = None
+        self.model = None
+        self.classes_ = np.array([0, 1])
+        self.class_weight = None
+        self.updates_since_full = 0
+        self.rows_seen = 0
+        self.last_update = None
+        self._pending_X = None
+        self._pending_y = None
+
+    def _new_model(self, class_weight):
+        if self.model_type == 'sgd':
+            return SGDClassifier(
+                loss='log_loss',            # 对数损失，即逻辑回归，可输出概率
+                alpha=1e-4,
+                class_weight=class_weight,  # partial_fit 不支持 'balanced'，用全量数据算出的权重字典
+                random_state=self.random_state
+            )
+        return GradientBoostingClassifier(
+            n_estimators=100,
+            learning_rate=0.1,
+            max_depth=3,
+            subsample=0.8,                  # 每棵树只用 80% 的样本，追加的树不至于完全贴合新数据
+            min_samples_leaf=5,
+            warm_start=True,                # 允许在已有的树之后继续追加
+            random_state=self.random_state
+        )
+
+    def _sample_weight(self, y):
+        """GB 不支持 class_weight，按类别权重展开成每个样本的权重"""
+        return np.array([self.class_weight[label] for label in y])
+
+    def _fit_model(self, X_scaled, y):
+        if self.model_type == 'sgd':
+            self.model.fit(X_scaled, y)
+        else:
+            self.model.fit(X_scaled, y, sample_weight=self._sample_weight(y))
+
+    def fit_full(self, X, y):
+        """
+        全量训练（首次训练或定期校准）
+
+        参数:
+            X (array-like): 未标准化的特征矩阵
+            y (array-like): 标签（0/1）
+
+        返回:
+            float: 训练耗时（秒）
+        """
+        start = time.perf_counter()
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        self.scaler = StandardScaler().fit(X)
+        weights = compute_class_weight('balanced', classes=self.classes_, y=y)
+        self.class_weight = dict(zip(self.classes_, weights))
+        self.model = self._new_model(self.class_weight)
+        self._fit_model(self.scaler.transform(X), y)
+        self.updates_since_full = 0
+        self.rows_seen = len(X)
+        self._pending_X = self._pending_y = None
+        self.save_checkpoint('full')
+        self.save_checkpoint('latest')
+        return time.perf_counter() - start
+
+    def update(self, X_delta, y_delta, X_holdout=None, y_holdout=None):
+        """
+        用新增数据增量更新模型
+
+        参数:
+            X_delta (array-like): 新增理赔的特征矩阵（未标准化）
+            y_delta (array-like): 新增理赔的标签
+            X_holdout (array-like or None): 留出集特征（未标准化，不参与训练），传入时更新后 AUC 变差则撤销
+            y_holdout (array-like or None): 留出集标签
+
+        返回:
+            float: 更新耗时（秒）；是否真正更新见 last_update['status']：
+                'applied' 已更新，'buffered' 新增数据不足 min_delta_rows 条已暂存，
+                'skipped' 暂存数据只有一个类别无法追加树，'rejected' 留出集 AUC 变差已撤销
+        """
+        if self.model is None:
+            raise RuntimeError("请先调用 fit_full() 完成首次全量训练")
+        start = time.perf_counter()
+        X_delta = np.asarray(X_delta, dtype=np.float64)
+        y_delta = np.asarray(y_delta)
+
+        if self.model_type == 'gb_append':
+            # 新追加的树拟合的是已有模型在新数据上的残差，数据太少时只会拟合噪声，先暂存
+            if self._pending_X is not None:
+                X_delta = np.vstack([self._pending_X, X_delta])
+                y_delta = np.concatenate([self._pending_y, y_delta])
+            if len(X_delta) < self.min_delta_rows or len(np.unique(y_delta)) < 2:
+                self._pending_X, self._pending_y = X_delta, y_delta
+                status = 'buffered' if len(X_delta) < self.min_delta_rows else 'skipped'
+                self.last_update = {'status': status, 'rows': len(X_delta)}
+                self.save_checkpoint('latest')   # 模型没变，保存暂存的数据，重启后不会丢失
+                return time.perf_counter() - start
+
+        auc_before = None
+        if X_holdout is not None:
+            X_holdout = np.asarray(X_holdout, dtype=np.float64)
+            auc_before = roc_auc_score(y_holdout, self.predict_proba(X_holdout)[:, 1])
+            previous = copy.deepcopy((self.model, self.scaler))
+
+        if self.model_type == 'sgd':
+            self.scaler.partial_fit(X_delta)
+            self.model.partial_fit(self.scaler.transform(X_delta), y_delta, classes=self.classes_)
+        else:
+            # 追加的树更弱：更少、叶子更大；全量训练时的叶子大小在下次全量重训时恢复
+            self.model.n_estimators += self.trees_per_update
+            self.model.min_samples_leaf = self.update_min_samples_leaf
+            self._fit_model(self.scaler.transform(X_delta), y_delta)
+            self._pending_X = self._pending_y = None
+
+        self.last_update = {'status': 'applied', 'rows': len(X_delta)}
+        if auc_before is not None:
+            auc_after = roc_auc_score(y_holdout, self.predict_proba(X_holdout)[:, 1])
+            self.last_update.update(auc_before=round(auc_before, 4), auc_after=round(auc_after, 4))
+            if auc_after < auc_before:
+                # 撤销：新增数据不再重试，latest 检查点保持更新前的模型
+                self.model, self.scaler = previous
+                self.last_update['status'] = 'rejected'
+                return time.perf_counter() - start
+
+        self.updates_since_full += 1
+        self.rows_seen += len(X_delta)
+        self.save_checkpoint('latest')
+        return time.perf_counter() - start
+
+    def needs_full_retrain(self):
+        """是否已到全量重训的时间点"""
+        return self.updates_since_full >= self.full_retrain_every
+
+    def predict_proba(self, X):
+        """预测类别概率"""
+        return self.model.predict_proba(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        """预测类别（0/1）"""
+        return self.model.predict(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def save_checkpoint(self, tag):
+        """
+        保存检查点
+
+        参数:
+            tag (str): 检查点标签，'full' 或 'latest'
+
+        返回:
+            Path or None: 检查点文件路径
+        """
+        if self.checkpoint_dir is None:
+            return None
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self.checkpoint_dir / f'{self.model_type}_{tag}.joblib'
+        joblib.dump(self, path)
+        return path
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """
+        从检查点恢复模型
+
+        参数:
+            path (str): 检查点文件路径
+
+        返回:
+            IncrementalFraudModel: 恢复的模型
+        """
+        model = joblib.load(path)
+        if not isinstance(model, cls):
+            raise TypeError(f"检查点不是 {cls.__name__}: {path}")
+        return model
@@ -19,37 +19,45 @@
 # 环境依赖和库导入
 # =============================================================================
 # 请确保已安装以下依赖包：
-# pip install pandas scikit-learn matplotlib seaborn python-dotenv dashscope
+# pip install pandas scikit-learn joblib python-dotenv dashscope
 
 # 标准库导入
 import os
 import json
+import sys
+import time
 import warnings
 from pathlib import Path
 
 # 第三方库导入
+# 只导入实际用到的库：matplotlib/seaborn 等绘图和调参库导入耗时较长，本脚本不使用
+import joblib
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 # 机器学习相关库
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.feature_selection import SelectKBest, f_classif
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.metrics import (
-    classification_report, confusion_matrix, accuracy_score, 
-    roc_auc_score, precision_recall_curve, roc_curve,
-    precision_score, recall_score, f1_score
-)
-
-# 大模型API相关库
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, roc_auc_score, precision_score, recall_score, f1_score
+
+# 本地模块：树集成模型编译加速、近似核SVM
+from tree_ensemble import compile_tree_ensemble, verify_against_sklearn, benchmark_against_sklearn
+from approx_svm import ApproxKernelSVC
+from incremental_training import IncrementalFraudModel
+from bootstrap_eval import bootstrap_evaluate, summarize_bootstrap, prob_better
+from claim_explain import make_explainer, reason_codes
+from claim_features import create_features, high_claim_threshold
+from stage_profiler import StageProfiler, compare_reports
+
+# 大模型API相关库（dashscope 在 analyze_fields_with_llm 中按需导入）
 from dotenv import load_dotenv
-import dashscope
-from dashscope import Generation
+
+# 上一级目录的公共模块（上下文缓存的前缀和命中统计）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prompt_cache import PromptPrefix, CacheStats
 
 # 忽略警告信息，保持输出整洁
 warnings.filterwarnings('ignore')
@@ -64,11 +72,22 @@ load_dotenv(env_file)
 # 获取大模型API密钥并配置
 api_key = os.environ.get('DASHSCOPE_API_KEY')
 if api_key:
-    dashscope.api_key = api_key
     print("✅ API密钥配置成功")
 else:
     print("⚠️ 警告: 未找到DASHSCOPE_API_KEY，大模型功能将不可用")
 
+# =============================================================================
+# 性能剖析配置
+# =============================================================================
+# 每个阶段记录墙钟时间、CPU时间、RSS峰值和DataFrame内存，结束时写入 profiles/ 下的JSON报告
+#   FRAUD_SAMPLE_ROWS=5000   - 把训练数据重采样到指定行数（可大于原始行数），多个规模各运行一次即可得到扩展曲线
+#   FRAUD_PROFILE_STACKS=1   - 同时采样调用栈，输出可用 flamegraph.pl / speedscope 打开的折叠栈文件
+#   FRAUD_PROFILE_PYALLOC=1  - 用 tracemalloc 记录Python分配峰值（会拖慢各阶段，这次运行的耗时不要用于对比）
+SAMPLE_ROWS = int(os.environ.get('FRAUD_SAMPLE_ROWS') or 0) or None
+PROFILE_DIR = Path('profiles')
+profiler = StageProfiler(trace_python_alloc=os.environ.get('FRAUD_PROFILE_PYALLOC') == '1',
+                         sample_stacks=os.environ.get('FRAUD_PROFILE_STACKS') == '1')
+
 # =============================================================================
 # 1. 数据加载和探索性数据分析
 # =============================================================================
@@ -78,7 +97,13 @@ print("=" * 60)
 
 # 加载训练数据集
 print("\n🔍 加载训练数据集...")
+profiler.begin('加载训练数据')
 train_df = pd.read_csv('train.csv')
+if SAMPLE_ROWS:
+    # 有放回重采样，用于在更大（或更小）的数据规模上剖析各阶段
+    train_df = train_df.sample(n=SAMPLE_ROWS, replace=SAMPLE_ROWS > len(train_df), random_state=42).reset_index(drop=True)
+    print(f"   🔁 已按 FRAUD_SAMPLE_ROWS 重采样训练数据至 {SAMPLE_ROWS} 行")
+profiler.end(train_df=train_df)
 
 # 显示数据基本信息
 print("\n📋 训练集基本信息:")
@@ -96,6 +121,23 @@ print("\n🔍 数据质量检查 - 缺失值统计:")
 missing_stats = train_df.isnull().sum().sort_values(ascending=False)
 print(missing_stats.head(10))  # 显示前10个缺失值最多的列
 
+# 字段分析的固定指令：作为系统提示词放在最前面，数据样本放在最后，由 PromptPrefix 保证每次调用逐字节一致。
+# 指令本身约 250 个 token，不到上下文缓存的最小长度（prompt_cache.MIN_CACHEABLE_TOKENS），单靠前缀不会命中；
+# 只有加上数据样本后整个输入达到最小长度、且同一份数据重复分析时才可能命中。
+# 是否命中、有多少请求因为太短不可能命中（below_min_requests），都以 CacheStats 按响应 usage 的统计为准
+FIELD_ANALYSIS_PROMPT = """作为一名保险欺诈检测专家，请分析用户提供的保险数据集中各字段的含义及其在欺诈检测中的重要性。
+
+对于每个字段，请提供以下信息：
+1. 字段含义：该字段在保险业务中代表什么
+2. 欺诈相关性：该字段与欺诈检测的相关程度（高/中/低）
+3. 分析理由：为什么该字段对欺诈检测重要或不重要
+4. 异常模式：该字段中哪些值或模式可能暗示欺诈行为
+
+请以JSON格式返回分析结果，不要包含任何额外文本，按以下模板响应：
+{"字段名": {"含义": "<字段含义>", "欺诈相关性": "高/中/低", "分析理由": "<分析理由>", "异常模式": "<异常模式>"}}"""
+FIELD_ANALYSIS_PREFIX = PromptPrefix(FIELD_ANALYSIS_PROMPT)
+field_analysis_cache_stats = CacheStats()
+
 def analyze_fields_with_llm(df, api_key):
     """
     使用大模型分析保险数据集中各字段的含义及其在欺诈检测中的重要性
@@ -107,31 +149,18 @@ def analyze_fields_with_llm(df, api_key):
     返回:
         dict: 包含字段分析结果的字典
     """
-    # 准备数据集样本用于分析
-    columns = train_df.head()
-    
-    # 构建分析提示词
-    prompt = f"""
-    作为一名保险欺诈检测专家，请分析以下保险数据集中各字段的含义及其在欺诈检测中的重要性。
-    
-    数据集前五行内容：
-    columns = {columns}
-    
-    对于每个字段，请提供以下信息：
-    1. 字段含义：该字段在保险业务中代表什么
-    2. 欺诈相关性：该字段与欺诈检测的相关程度（高/中/低）
-    3. 分析理由：为什么该字段对欺诈检测重要或不重要
-    4. 异常模式：该字段中哪些值或模式可能暗示欺诈行为
+    # 准备数据集样本用于分析（变量内容，放在固定指令之后）
+    columns = df.head()
+    messages = FIELD_ANALYSIS_PREFIX.build(f"数据集前五行内容：\ncolumns = {columns}")
     
-    请以JSON格式返回分析结果，不要包含任何额外文本，按以下模板响应：
-    {{"字段名": {{"含义": "<字段含义>", "欺诈相关性": "高/中/低", "分析理由": "<分析理由>", "异常模式": "<异常模式>"}}}}
-    """
-    
-    # 调用大模型API进行分析
+    # 调用大模型API进行分析（只有配置了API密钥时才会走到这里，此时再导入 dashscope）
     try:
+        from dashscope import Generation
+        start = time.perf_counter()
         response = Generation.call(
             model="qwen-max",  # 使用通义千问大模型
-            prompt=prompt,
+            api_key=api_key,
+            messages=messages,
             result_format='message',
             temperature=0.1,   # 低温度以获得更确定性的回答
             max_tokens=4000    # 确保有足够的token来分析所有字段
@@ -139,6 +168,8 @@ def analyze_fields_with_llm(df, api_key):
         
         # 处理API响应
         if response.status_code == 200:
+            field_analysis_cache_stats.record(response, time.perf_counter() - start)
+            print(f"上下文缓存: {field_analysis_cache_stats.summary()}")
             try:
                 content = response.output.choices[0].message.content
                 # 提取JSON内容
@@ -203,14 +234,16 @@ def display_field_analysis(analysis_result):
 # 使用大模型分析数据集字段含义
 print("\n🤖 正在使用大模型分析数据集字段含义...")
 if api_key:
-    analysis_result = analyze_fields_with_llm(train_df, api_key)
+    with profiler.stage('大模型字段分析'):
+        analysis_result = analyze_fields_with_llm(train_df, api_key)
     display_field_analysis(analysis_result)
 else:
     print("⚠️ 跳过大模型分析（API密钥未配置）")
 
 # 加载测试数据集
 print("\n🔍 加载测试数据集...")
-test_df = pd.read_csv('test.csv')
+with profiler.stage('加载测试数据'):
+    test_df = pd.read_csv('test.csv')
 
 # 显示测试集基本信息
 print("\n📋 测试集基本信息:")
@@ -247,6 +280,7 @@ print(f"   🏋️ 测试集: {test_df.shape[0]} 行 × {test_df.shape[1]} 列")
 
 # 步骤1: 缺失值处理
 print("\n🔧 步骤1: 缺失值处理")
+profiler.begin('缺失值处理')
 missing_cols = train_df.columns[train_df.isnull().any()].tolist()
 print(f"   📍 包含缺失值的列: {missing_cols}")
 
@@ -263,10 +297,12 @@ if '_c39' in test_df.columns:
     print("   🗑️ 删除测试集中的_c39列")
 
 print("✅ 缺失值处理完成")
+profiler.end(train_df=train_df, test_df=test_df)
 
 # 步骤2: 特征编码 - 将分类变量转换为数值
 print("\n🔧 步骤2: 特征编码")
 print("   将分类变量转换为数值，以便机器学习算法处理")
+profiler.begin('特征编码')
 
 # 定义需要编码的分类列
 categorical_cols = [
@@ -299,60 +335,20 @@ for col in categorical_cols:
         print(f"   ⚠️ {col}: 列不存在，跳过编码")
 
 print("✅ 分类特征编码完成")
-
-def create_features(df):
-    """
-    创建新的特征以增强模型的预测能力
-    
-    参数:
-        df (DataFrame): 原始数据框
-    
-    返回:
-        DataFrame: 包含新特征的数据框
-    
-    新特征包括:
-    1. 索赔金额相关特征：每车索赔金额、各类索赔比例
-    2. 客户特征：年龄分组、客户时长分组
-    3. 保单特征：月保费、是否有伞形保险
-    4. 事故特征：是否夜间事故、是否高额索赔
-    5. 财务特征：净资本、是否有资本收益/损失
-    """
-    df = df.copy()
-    
-    # 1. 索赔金额相关特征
-    df['claim_per_vehicle'] = df['total_claim_amount'] / (df['number_of_vehicles_involved'] + 1)
-    df['injury_ratio'] = df['injury_claim'] / (df['total_claim_amount'] + 1)
-    df['property_ratio'] = df['property_claim'] / (df['total_claim_amount'] + 1)
-    df['vehicle_ratio'] = df['vehicle_claim'] / (df['total_claim_amount'] + 1)
-    
-    # 2. 客户特征 - 将连续变量分组
-    df['customer_age_group'] = pd.cut(df['age'], bins=[0, 25, 35, 50, 100], labels=[0, 1, 2, 3])
-    df['customer_tenure_group'] = pd.cut(df['months_as_customer'], bins=[0, 12, 60, 120, 1000], labels=[0, 1, 2, 3])
-    
-    # 3. 保单特征
-    df['premium_per_month'] = df['policy_annual_premium'] / 12  # 月保费
-    df['has_umbrella'] = (df['umbrella_limit'] > 0).astype(int)  # 是否有伞形保险
-    
-    # 4. 事故特征
-    df['is_night_accident'] = ((df['incident_hour_of_the_day'] >= 22) | 
-                               (df['incident_hour_of_the_day'] <= 6)).astype(int)
-    df['high_claim_amount'] = (df['total_claim_amount'] > 
-                               df['total_claim_amount'].quantile(0.75)).astype(int)
-    
-    # 5. 财务特征
-    df['net_capital'] = df['capital-gains'] - df['capital-loss']
-    df['has_capital_gains'] = (df['capital-gains'] > 0).astype(int)
-    df['has_capital_loss'] = (df['capital-loss'] > 0).astype(int)
-    
-    return df
+profiler.end(train_df=train_df, test_df=test_df)
 
 # 步骤3: 特征工程
+# 特征工程函数在 claim_features.py 中，线上打分（../warm_daemon.py）复用同一份实现
 print("\n🔧 步骤3: 特征工程")
 print("   创建新的特征以增强模型的预测能力")
 
 # 应用特征工程函数
-train_df_engineered = create_features(train_df)
-test_df_engineered = create_features(test_df)
+profiler.begin('特征工程')
+# 高额索赔阈值只从训练集计算，测试集和线上打分使用同一个阈值
+high_claim_cutoff = high_claim_threshold(train_df)
+train_df_engineered = create_features(train_df, high_claim_cutoff)
+test_df_engineered = create_features(test_df, high_claim_cutoff)
+profiler.end(train_df_engineered=train_df_engineered, test_df_engineered=test_df_engineered)
 
 # 统计新创建的特征数量
 new_features_count = train_df_engineered.shape[1] - train_df.shape[1]
@@ -363,6 +359,7 @@ print(f"   📊 测试集特征数: {test_df.shape[1]} → {test_df_engineered.s
 # 步骤4: 特征选择
 print("\n🔧 步骤4: 特征选择")
 print("   选择数值特征用于模型训练")
+profiler.begin('特征选择')
 
 # 定义需要排除的列（目标变量、标识符、日期等）
 exclude_cols = [
@@ -400,6 +397,7 @@ print(f"   📊 最终测试集形状: {X_test_full.shape}")
 print(f"   🎯 欺诈案例数量: {y_train.sum()} 个 ({y_train.mean():.2%})")
 
 print("✅ 数据预处理完成")
+profiler.end(X_train_full=X_train_full, X_test_full=X_test_full)
 
 # =============================================================================
 # 3. 模型训练和评估
@@ -412,9 +410,11 @@ print("=" * 60)
 print("\n🔧 步骤1: 数据标准化")
 print("   将特征标准化到相同尺度，提高模型性能")
 
+profiler.begin('数据标准化')
 scaler = StandardScaler()
 X_train_scaled = scaler.fit_transform(X_train_full)
 X_test_scaled = scaler.transform(X_test_full)
+profiler.end(X_train_scaled=X_train_scaled, X_test_scaled=X_test_scaled)
 print("   ✅ 数据标准化完成")
 
 # 步骤2: 数据划分
@@ -461,8 +461,26 @@ models = {
         class_weight='balanced', # 处理类别不平衡
         probability=True,        # 启用概率预测
         random_state=42
+    ),
+    'SVM (Nystroem)': ApproxKernelSVC(
+        approximation='nystroem', # Nystroem近似RBF核，训练时间随样本数线性增长
+        n_components=300,         # 近似特征维度，增大可更接近精确核SVM的精度
+        class_weight='balanced',  # 处理类别不平衡
+        calibration_size=0.2,     # 留出20%做一次Platt校准
+        random_state=42
     )
 }
+
+# SVM模式选择：
+#   'exact'  - 只使用 SVC(probability=True)，数据量大时训练时间超二次增长
+#   'approx' - 只使用近似核SVM（Nystroem + 线性SVM + 单次校准）
+#   'both'   - 两者都参与对比
+SVM_MODE = 'both'
+if SVM_MODE == 'exact':
+    models.pop('SVM (Nystroem)')
+elif SVM_MODE == 'approx':
+    models.pop('SVM')
+print(f"   ⚙️ SVM模式: {SVM_MODE}，参与对比的模型: {list(models.keys())}")
 # 步骤4: 模型训练和评估
 print("\n🔧 步骤4: 模型训练和评估")
 print("   训练多个模型并评估性能")
@@ -471,9 +489,12 @@ model_results = {}
 
 for name, model in models.items():
     print(f"\n🤖 训练 {name}...")
+    profiler.begin(f'模型训练: {name}')
     
-    # 训练模型
+    # 训练模型（记录训练耗时）
+    train_start = time.perf_counter()
     model.fit(X_train_split, y_train_split)
+    train_time = time.perf_counter() - train_start
     
     # 在验证集上进行预测
     y_pred = model.predict(X_val)
@@ -494,9 +515,11 @@ for name, model in models.items():
         'recall': recall,
         'f1': f1,
         'auc': auc,
+        'train_time': train_time,
         'y_pred': y_pred,
         'y_pred_proba': y_pred_proba
     }
+    profiler.end()
     
     # 显示训练结果
     print(f"   ✅ {name} 训练完成")
@@ -505,6 +528,7 @@ for name, model in models.items():
     print(f"      🔍 召回率: {recall:.4f}")
     print(f"      ⚖️  F1分数: {f1:.4f}")
     print(f"      📈 AUC: {auc:.4f}")
+    print(f"      ⏱️ 训练耗时: {train_time:.3f}s")
 
 # 步骤5: 模型性能对比
 print("\n🔧 步骤5: 模型性能对比")
@@ -517,25 +541,156 @@ comparison_df = pd.DataFrame({
     'Precision': [results['precision'] for results in model_results.values()],
     'Recall': [results['recall'] for results in model_results.values()],
     'F1-Score': [results['f1'] for results in model_results.values()],
-    'AUC': [results['auc'] for results in model_results.values()]
+    'AUC': [results['auc'] for results in model_results.values()],
+    'Train Time (s)': [results['train_time'] for results in model_results.values()]
 })
 
+# Bootstrap评估：对验证集重采样10000次，为每个指标给出95%置信区间
+# 所有模型共用同一组重采样（配对bootstrap），模型之间可以直接比较
+N_BOOTSTRAP = 10000
+profiler.begin('Bootstrap评估')
+bootstrap_start = time.perf_counter()
+bootstrap_samples = bootstrap_evaluate(
+    y_val,
+    {name: (results['y_pred'], results['y_pred_proba']) for name, results in model_results.items()},
+    n_boot=N_BOOTSTRAP
+)
+bootstrap_summary = summarize_bootstrap(bootstrap_samples, confidence=0.95)
+profiler.end()
+print(f"   ✅ Bootstrap评估完成（{N_BOOTSTRAP}次重采样 × {len(model_results)}个模型，"
+      f"耗时 {time.perf_counter() - bootstrap_start:.2f}s）")
+
+# 在对比表中加入置信区间列
+for column, metric in [('Accuracy', 'accuracy'), ('Precision', 'precision'), ('Recall', 'recall'),
+                       ('F1-Score', 'f1'), ('AUC', 'auc')]:
+    comparison_df[f'{column} 95% CI'] = [
+        f"[{low:.3f}, {high:.3f}]"
+        for low, high in zip(bootstrap_summary[f'{metric}_low'], bootstrap_summary[f'{metric}_high'])
+    ]
+comparison_df['AUC (bootstrap mean)'] = bootstrap_summary['auc_mean'].values
+
 # 显示性能对比表
 print("\n📊 模型性能对比表:")
-print(comparison_df.round(4))
+print(comparison_df[['Model', 'Accuracy', 'Precision', 'Recall', 'F1-Score', 'AUC', 'Train Time (s)']].round(4))
+print("\n📊 95%置信区间:")
+print(comparison_df[['Model'] + [col for col in comparison_df.columns if col.endswith('95% CI')]].to_string(index=False))
 
-# 找出最佳模型（基于AUC指标）
-best_model_name = comparison_df.loc[comparison_df['AUC'].idxmax(), 'Model']
+# 找出最佳模型（基于bootstrap平均AUC，比单次划分的AUC更稳定）
+ranked_models = comparison_df.sort_values('AUC (bootstrap mean)', ascending=False)['Model'].tolist()
+best_model_name = ranked_models[0]
 best_model = model_results[best_model_name]['model']
+if len(ranked_models) > 1:
+    runner_up = ranked_models[1]
+    print(f"\n   📊 配对bootstrap中 {best_model_name} 的AUC高于 {runner_up} 的比例: "
+          f"{prob_better(bootstrap_samples, best_model_name, runner_up):.1%}")
 
 print(f"\n🏆 最佳模型分析:")
 print(f"   🥇 最佳模型: {best_model_name}")
-print(f"   📈 最佳AUC: {model_results[best_model_name]['auc']:.4f}")
+print(f"   📈 最佳AUC: {model_results[best_model_name]['auc']:.4f} "
+      f"(95% CI {comparison_df.loc[comparison_df['Model'] == best_model_name, 'AUC 95% CI'].iloc[0]})")
 print(f"   📊 最佳准确率: {model_results[best_model_name]['accuracy']:.4f}")
 print(f"   🎯 最佳精确率: {model_results[best_model_name]['precision']:.4f}")
 print(f"   🔍 最佳召回率: {model_results[best_model_name]['recall']:.4f}")
 print(f"   ⚖️  最佳F1分数: {model_results[best_model_name]['f1']:.4f}")
 
+# 步骤6: 树模型编译加速（仅当最佳模型为随机森林或梯度提升时）
+# 把所有树展平为连续的NumPy数组，单条理赔打分从毫秒级降到微秒级
+compiled_model = None
+if isinstance(best_model, (RandomForestClassifier, GradientBoostingClassifier)):
+    print("\n🔧 步骤6: 树模型编译加速")
+    profiler.begin('树模型编译')
+    compiled_model = compile_tree_ensemble(best_model)
+    print(f"   🌲 已编译 {compiled_model.n_trees} 棵树，共 {len(compiled_model.feature)} 个节点")
+    
+    # 校验编译模型与sklearn预测一致
+    check = verify_against_sklearn(best_model, compiled_model, X_val)
+    print(f"   ✅ 概率最大误差: {check['max_abs_diff']:.2e}，预测类别完全一致: {check['predictions_identical']}")
+    
+    # 性能对比
+    bench = benchmark_against_sklearn(best_model, compiled_model, X_val)
+    print(f"   ⏱️ 单条打分: sklearn {bench['sklearn_single_us']:.1f}μs → 编译模型 {bench['compiled_single_us']:.1f}μs "
+          f"(加速 {bench['single_speedup']:.1f}x)")
+    print(f"   ⏱️ 批量打分({bench['batch_size']}条): sklearn {bench['sklearn_batch_ms']:.2f}ms → "
+          f"编译模型 {bench['compiled_batch_ms']:.2f}ms (加速 {bench['batch_speedup']:.1f}x)")
+    profiler.end()
+
+# 步骤7: 逐条理赔解释
+# 在批量打分的同时计算每条理赔的特征贡献，把贡献最大的特征翻译成原因码，供审核人员查看
+explainer = make_explainer(best_model, X_train_split)
+if explainer is None:
+    print(f"\n   ⚠️ {best_model_name} 暂不支持逐条解释，跳过步骤7")
+else:
+    print("\n🔧 步骤7: 逐条理赔解释")
+    profiler.begin('逐条理赔解释')
+    start = time.perf_counter()
+    val_scores = (compiled_model or best_model).predict_proba(X_val)[:, 1]
+    score_time = time.perf_counter() - start
+    start = time.perf_counter()
+    val_contributions = explainer.shap_values(X_val)
+    explain_time = time.perf_counter() - start
+    print(f"   ⏱️ 批量打分 {score_time * 1000:.1f}ms，批量解释 {explain_time * 1000:.1f}ms "
+          f"(每条 {explain_time / len(X_val) * 1000:.2f}ms，约为打分的 {explain_time / max(score_time, 1e-9):.0f} 倍)")
+    
+    # 原因码使用未标准化的特征取值：用与步骤2相同的参数重新划分未标准化数据
+    _, X_val_raw = train_test_split(X_train_full, test_size=0.2, random_state=42, stratify=y_train)
+    val_reasons = reason_codes(val_contributions, X_val_raw, numeric_features, label_encoders, top_k=3)
+    print("   🔍 欺诈分数最高的5条理赔及原因码:")
+    for i in np.argsort(-val_scores)[:5]:
+        print(f"      • 分数 {val_scores[i]:.3f}: {'; '.join(val_reasons[i]) or '无显著推高因素'}")
+    profiler.end()
+
+# 保存打分模型包：常驻服务（../warm_daemon.py）加载后，无需重新训练即可对新理赔打分并给出原因码
+SCORING_BUNDLE = Path('checkpoints') / 'fraud_scoring_bundle.joblib'
+SCORING_BUNDLE.parent.mkdir(parents=True, exist_ok=True)
+joblib.dump({
+    'model_name': best_model_name,
+    'model': best_model,
+    'compiled_model': compiled_model,
+    'scaler': scaler,
+    'numeric_features': numeric_features,
+    'label_encoders': label_encoders,
+    'high_claim_cutoff': high_claim_cutoff,
+}, SCORING_BUNDLE)
+print(f"\n💾 打分模型包已保存: {SCORING_BUNDLE}")
+
+# 步骤8: 增量训练演示
+# 模拟"历史数据 + 每日新增理赔"：先在前70%训练数据上全量训练，再把剩余数据按天增量更新，
+# 与在全部训练数据上从头训练的结果对比。模型自带标准化器，因此使用未标准化的特征。
+# 历史数据的最后20%作为留出集不参与训练，增量更新后留出集 AUC 变差时撤销这次更新
+print("\n🔧 步骤8: 增量训练演示")
+profiler.begin('增量训练')
+X_inc_train, X_inc_val, y_inc_train, y_inc_val = train_test_split(
+    X_train_full.values, y_train.values,
+    test_size=0.2, random_state=42, stratify=y_train   # 与步骤2相同的划分
+)
+n_history = int(len(X_inc_train) * 0.7)
+n_gate = int(n_history * 0.2)
+X_gate, y_gate = X_inc_train[n_history - n_gate:n_history], y_inc_train[n_history - n_gate:n_history]
+daily_deltas = np.array_split(np.arange(n_history, len(X_inc_train)), 6)  # 剩余数据模拟6天的新增理赔
+
+for model_type in ['sgd', 'gb_append']:
+    inc_model = IncrementalFraudModel(model_type=model_type, full_retrain_every=30, checkpoint_dir='checkpoints')
+    full_time = inc_model.fit_full(X_inc_train[:n_history - n_gate], y_inc_train[:n_history - n_gate])
+    print(f"\n   🤖 {model_type}: 历史数据全量训练 {full_time:.3f}s，"
+          f"AUC {roc_auc_score(y_inc_val, inc_model.predict_proba(X_inc_val)[:, 1]):.4f}")
+    for day, delta_idx in enumerate(daily_deltas, start=1):
+        update_time = inc_model.update(X_inc_train[delta_idx], y_inc_train[delta_idx], X_gate, y_gate)
+        status = {'applied': '已更新', 'buffered': '数据不足已暂存', 'skipped': '只有一个类别已暂存',
+                  'rejected': '留出集AUC变差已撤销'}[inc_model.last_update['status']]
+        print(f"      📅 第{day}天 新增{len(delta_idx)}条: 增量更新 {update_time:.3f}s（{status}），"
+              f"AUC {roc_auc_score(y_inc_val, inc_model.predict_proba(X_inc_val)[:, 1]):.4f}")
+        if inc_model.needs_full_retrain():
+            seen = np.r_[0:n_history - n_gate, n_history:delta_idx[-1] + 1]   # 留出集不参与训练
+            inc_model.fit_full(X_inc_train[seen], y_inc_train[seen])
+            print("      🔄 已到全量重训周期，完成全量重训")
+    
+    # 对照：在全部训练数据上从头训练
+    reference = IncrementalFraudModel(model_type=model_type, checkpoint_dir=None)
+    reference_time = reference.fit_full(X_inc_train, y_inc_train)
+    print(f"      📊 对照（全量从头训练）: {reference_time:.3f}s，"
+          f"AUC {roc_auc_score(y_inc_val, reference.predict_proba(X_inc_val)[:, 1]):.4f}")
+profiler.end()
+
 # =============================================================================
 # 4. 结果分析和总结
 # =============================================================================
@@ -545,11 +700,14 @@ print("=" * 60)
 
 # 模型性能总结
 print("\n📈 模型性能总结:")
-print("   在保险欺诈检测任务中，我们训练了4个不同的机器学习模型：")
+print(f"   在保险欺诈检测任务中，我们训练了{len(model_results)}个不同的机器学习模型：")
 print("   • Random Forest (随机森林)")
 print("   • Gradient Boosting (梯度提升)")
 print("   • Logistic Regression (逻辑回归)")
-print("   • SVM (支持向量机)")
+if 'SVM' in model_results:
+    print("   • SVM (支持向量机)")
+if 'SVM (Nystroem)' in model_results:
+    print("   • SVM (Nystroem) (近似核支持向量机，线性时间训练)")
 
 print(f"\n🏆 最佳模型: {best_model_name}")
 print(f"   • AUC: {model_results[best_model_name]['auc']:.4f} - 模型区分能力良好")
@@ -634,6 +792,32 @@ print("• 描述1-3: 正常的事故描述，符合常见事故模式")
 print("• 描述4: 可疑描述，'神奇地消失'等词汇暗示可能的欺诈")
 print("• 描述5: 高度可疑，事故时机与保险额度增加时间吻合")
 
+# =============================================================================
+# 7. 性能剖析报告
+# =============================================================================
+print("\n" + "=" * 60)
+print("⏱️ 性能剖析报告")
+print("=" * 60)
+
+n_rows = len(train_df)
+report_path = PROFILE_DIR / f'fraud_pipeline_{n_rows}.json'
+profile_report = profiler.save_report(report_path, n_rows=n_rows, n_features=len(numeric_features), svm_mode=SVM_MODE)
+print(f"\n📄 报告已保存: {report_path}（总耗时 {profile_report['total']['wall_s']:.2f}s，"
+      f"RSS峰值 {profile_report['total']['rss_peak_mb']:.1f}MB）")
+print("\n📊 各阶段耗时与内存（按耗时排序）:")
+print(profiler.summary().head(10).round(3).to_string(index=False))
+
+stack_samples = profiler.save_collapsed_stacks(PROFILE_DIR / f'fraud_pipeline_{n_rows}.folded')
+if stack_samples:
+    print(f"\n🔥 折叠栈已保存（{stack_samples} 个采样），可用 flamegraph.pl 或 speedscope 生成火焰图")
+profiler.close()
+
+# 已有多个数据规模的报告时，输出各阶段耗时的扩展曲线和扩展指数
+report_files = sorted(PROFILE_DIR.glob('fraud_pipeline_*.json'))
+if len(report_files) > 1:
+    print("\n📈 不同数据规模下各阶段耗时（秒），scaling_exponent ≈ 1 为线性增长:")
+    print(compare_reports(report_files, size_key='n_rows', metric='wall_s').round(3).to_string())
+
 print("\n" + "=" * 60)
 print("✅ 保险反欺诈案例研究完成")
 print("=" * 60) 
\ No newline at end of file
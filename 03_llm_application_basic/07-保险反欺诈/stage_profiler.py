@@ -0,0 +1,361 @@
+"""
+反欺诈流水线的分阶段性能剖析
+============================
+
+脚本里各阶段（特征编码、特征工程、标准化、各模型训练……）随数据量增长的表现不同，
+只看总耗时无法判断瓶颈在哪里。StageProfiler 按阶段记录:
+1. 墙钟时间（perf_counter）和 CPU 时间（process_time），两者之比反映多线程利用率
+2. 进程 RSS 峰值：Linux 下每个阶段开始时重置 VmHWM（/proc/self/clear_refs），读取阶段内的真实峰值；
+   其他平台用后台线程定时采样 RSS 的最大值
+3. Python 分配峰值（tracemalloc，每阶段 reset_peak）：默认关闭。tracemalloc 会拖慢分配密集的阶段，
+   打开后报告里的耗时不再可信，需要分配峰值时单独运行一次（meta 中的 trace_python_alloc 标明了运行方式）
+4. 阶段内登记的 DataFrame 内存占用（memory_usage(deep=True)）
+
+输出:
+1. JSON 报告：元信息（数据行数等）+ 每个阶段一条记录，不同数据规模的报告可以直接对比
+2. 可选的折叠栈文件（collapsed stacks）：后台线程定时采样主线程调用栈，每行 "阶段;模块:函数;... 次数"，
+   可直接交给 flamegraph.pl 或 speedscope 生成火焰图
+
+compare_reports() 把多份报告按数据规模拼成一张表，并用对数-对数拟合估计每个阶段的扩展指数
+（1 表示线性增长，2 表示平方增长）。
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+
+
+def _current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return 0
+
+
+def _reset_peak_rss():
+    """重置 Linux 的 RSS 峰值计数（VmHWM），成功返回 True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_peak_rss():
+    """读取 /proc/self/status 中的 VmHWM（字节），无法获取时返回0"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def frame_memory_mb(df):
+    """DataFrame / Series / ndarray 的内存占用（MB），包含 object 列的实际字符串"""
+    if isinstance(df, pd.DataFrame):
+        return float(df.memory_usage(deep=True).sum()) / MB
+    if isinstance(df, pd.Series):
+        return float(df.memory_usage(deep=True)) / MB
+    return float(np.asarray(df).nbytes) / MB
+
+
+class _Sampler(threading.Thread):
+    """后台采样线程：记录 RSS 最大值，可选地采样主线程调用栈"""
+
+    def __init__(self, interval, sample_stacks, target_thread_id):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.sample_stacks = sample_stacks
+        self.target_thread_id = target_thread_id
+        self.stage = None
+        self.rss_peak = 0
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start_stage(self, name):
+        with self._lock:
+            self.stage = name
+            self.rss_peak = _current_rss()
+
+    def stop_stage(self):
+        with self._lock:
+            self.stage = None
+            return self.rss_peak
+
+    def _sample_stack(self, stage):
+        frame = sys._current_frames().get(self.target_thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+            frame = frame.f_back
+        # 折叠栈格式：根在前，分号分隔；阶段名作为最外层
+        self.stacks[';'.join([stage] + names[::-1])] += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                if self.stage is None:
+                    continue
+                self.rss_peak = max(self.rss_peak, _current_rss())
+                if self.sample_stacks:
+                    self._sample_stack(self.stage)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    """
+    分阶段的耗时和内存剖析器
+
+    用法（二选一）:
+        with profiler.stage('特征工程'):
+            ...
+        profiler.begin('特征编码')   # 线性脚本中使用：开始新阶段时自动结束上一个阶段
+        ...
+        profiler.end()
+
+    参数:
+        trace_python_alloc (bool): 是否用 tracemalloc 记录 Python 分配峰值；分配密集的阶段会明显变慢，
+            耗时和分配峰值应分两次运行分别测量
+        sample_stacks (bool): 是否采样调用栈以生成火焰图
+        interval (float): 后台采样间隔（秒）
+        meta (dict): 写入报告的元信息，如数据行数
+    """
+
+    def __init__(self, trace_python_alloc=False, sample_stacks=False, interval=0.005, meta=None):
+        self.trace_python_alloc = trace_python_alloc
+        self.sample_stacks = sample_stacks
+        self.meta = dict(meta or {})
+        self.records = []
+        self._current = None
+        self._started_at = datetime.now().isoformat(timespec='seconds')
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._owns_tracemalloc = False
+        self._sampler = _Sampler(interval, sample_stacks, threading.get_ident())
+        self._sampler.start()
+
+    def begin(self, name):
+        """开始一个新阶段（如有未结束的阶段，先结束它）"""
+        if self._current is not None:
+            self.end()
+        if self.trace_python_alloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            tracemalloc.reset_peak()
+        kernel_reset = _reset_peak_rss()
+        self._current = {
+            'name': name,
+            'frames_mb': {},
+            '_kernel_reset': kernel_reset,
+            '_rss_start': _current_rss(),
+            '_wall': time.perf_counter(),
+            '_cpu': time.process_time(),
+        }
+        self._sampler.start_stage(name)
+
+    def note_frames(self, **frames):
+        """登记当前阶段产生的 DataFrame（按关键字名记录内存占用）"""
+        if self._current is None:
+            raise RuntimeError("没有正在进行的阶段，请先调用 begin()")
+        for name, df in frames.items():
+            self._current['frames_mb'][name] = round(frame_memory_mb(df), 3)
+
+    def end(self, **frames):
+        """
+        结束当前阶段
+
+        参数:
+            **frames: 可选，结束前登记的 DataFrame
+
+        返回:
+            dict: 该阶段的记录
+        """
+        if self._current is None:
+            return None
+        if frames:
+            self.note_frames(**frames)
+        wall = time.perf_counter() - self._current.pop('_wall')
+        cpu = time.process_time() - self._current.pop('_cpu')
+        sampled_peak = self._sampler.stop_stage()
+        rss_start = self._current.pop('_rss_start')
+        rss_end = _current_rss()
+        rss_peak = max(sampled_peak, rss_end)
+        if self._current.pop('_kernel_reset'):
+            rss_peak = max(rss_peak, _kernel_peak_rss())
+
+        record = self._current
+        record.update({
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'cpu_utilization': round(cpu / wall, 3) if wall > 0 else None,
+            'rss_start_mb': round(rss_start / MB, 3),
+            'rss_end_mb': round(rss_end / MB, 3),
+            'rss_peak_mb': round(rss_peak / MB, 3),
+            'rss_peak_delta_mb': round((rss_peak - rss_start) / MB, 3),
+        })
+        if self.trace_python_alloc and tracemalloc.is_tracing():
+            record['py_alloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / MB, 3)
+        self.records.append(record)
+        self._current = None
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        """以上下文管理器的形式包裹一个阶段"""
+        self.begin(name)
+        try:
+            yield self
+        finally:
+            self.end()
+
+    def report(self, **meta):
+        """
+        生成报告
+
+        参数:
+            **meta: 追加的元信息（如 n_rows），用于跨数据规模对比
+
+        返回:
+            dict: 包含 meta、stages 和 total 的报告
+        """
+        total_wall = time.perf_counter() - self._wall_start
+        staged_wall = sum(record['wall_s'] for record in self.records)
+        return {
+            'meta': {
+                **self.meta,
+                **meta,
+                'started_at': self._started_at,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'trace_python_alloc': self.trace_python_alloc,
+            },
+            'stages': self.records,
+            'total': {
+                'wall_s': round(total_wall, 6),
+                'cpu_s': round(time.process_time() - self._cpu_start, 6),
+                'unprofiled_wall_s': round(total_wall - staged_wall, 6),
+                'rss_peak_mb': round(max([r['rss_peak_mb'] for r in self.records] or [0.0]), 3),
+            },
+        }
+
+    def summary(self):
+        """各阶段记录的对比表（按耗时从高到低）"""
+        columns = ['name', 'wall_s', 'cpu_s', 'cpu_utilization', 'rss_peak_mb', 'rss_peak_delta_mb', 'py_alloc_peak_mb']
+        df = pd.DataFrame(self.records).reindex(columns=columns)
+        df['wall_share'] = df['wall_s'] / df['wall_s'].sum()
+        return df.sort_values('wall_s', ascending=False).reset_index(drop=True)
+
+    def save_report(self, path, **meta):
+        """把报告写入 JSON 文件，返回报告"""
+        if self._current is not None:
+            self.end()
+        report = self.report(**meta)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        return report
+
+    def save_collapsed_stacks(self, path):
+        """
+        把采样到的调用栈写成折叠栈格式（flamegraph.pl / speedscope 可直接读取）
+
+        返回:
+            int: 写入的采样总数；未开启 sample_stacks 时返回0且不写文件
+        """
+        if not self.sample_stacks:
+            return 0
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._sampler._lock:
+            stacks = dict(self._sampler.stacks)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return sum(stacks.values())
+
+    def close(self):
+        """结束未完成的阶段并停止后台采样"""
+        if self._current is not None:
+            self.end()
+        self._sampler.stop()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+
+def compare_reports(reports, size_key='n_rows', metric='wall_s'):
+    """
+    按数据规模对比多份报告
+
+    参数:
+        reports (list): 报告字典或 JSON 文件路径
+        size_key (str): meta 中表示数据规模的字段
+        metric (str): 对比的指标，如 'wall_s'、'rss_peak_mb'、'py_alloc_peak_mb'
+
+    返回:
+        DataFrame: 行为阶段，列为数据规模，最后一列 scaling_exponent 为
+                   log(指标) 对 log(规模) 的拟合斜率（至少两个规模时才有值）
+    """
+    loaded = []
+    for report in reports:
+        if not isinstance(report, dict):
+            report = json.loads(Path(report).read_text(encoding='utf-8'))
+        loaded.append(report)
+
+    rows = []
+    for report in loaded:
+        size = report['meta'].get(size_key)
+        if size is None:
+            raise ValueError(f"报告的 meta 中缺少 {size_key}")
+        for record in report['stages']:
+            rows.append({'stage': record['name'], 'size': size, metric: record.get(metric)})
+    if not rows:
+        return pd.DataFrame()
+
+    # 同一报告内同名阶段（如重复执行）累加；阶段按首次出现的顺序排列
+    df = pd.DataFrame(rows)
+    stage_order = list(dict.fromkeys(df['stage']))
+    table = df.pivot_table(index='stage', columns='size', values=metric, aggfunc='sum').reindex(stage_order)
+
+    sizes = np.log(np.asarray(table.columns, dtype=np.float64))
+    exponents = []
+    for _, values in table.iterrows():
+        values = values.to_numpy(dtype=np.float64)
+        valid = np.isfinite(values) & (values > 0)
+        if valid.sum() >= 2 and np.ptp(sizes[valid]) > 0:
+            exponents.append(float(np.polyfit(sizes[valid], np.log(values[valid]), 1)[0]))
+        else:
+            exponents.append(np.nan)
+    table['scaling_exponent'] = exponents
+    return table
@@ -0,0 +1,703 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+三角形区域内的多小球物理引擎（NumPy 向量化，无界面）
+todolist.md 中的网页只模拟一个小球，逐个小球用 Python 循环计算时，几百个小球就已经跑不动了。
+本引擎把所有小球的位置、速度、半径放在 NumPy 数组里，一次计算全部小球:
+1. 运动：重力加速度，先更新速度再更新位置（半隐式欧拉）
+2. 边界碰撞：三角形的三条边各是一个半平面 n·p >= c（n 为指向内部的单位法向量），
+   对所有小球同时计算到三条边的有向距离，穿出边界的小球沿法向投影回三角形内
+3. 小球之间的碰撞：均匀网格空间哈希，网格边长取最大直径，每个小球只和本格及相邻格中的小球比较；
+   按网格编号排序后用格子起点表找出相邻格的小球区间，成对计算重叠量，np.bincount 汇总修正量。
+   找到的小球对放进邻居列表（Verlet list，多留出 skin 的距离）跨步复用，半径和、质量系数随列表一起算好；
+   小球离开建表时的位置超过 skin / 2 才重新查找它的邻居，小球运动太快、列表用不了几步时退回每步重建
+4. 速度：2、3 只修正位置（position based dynamics），速度由修正后的位移导出，
+   再按碰撞前的法向速度施加反弹，切向速度按摩擦系数衰减；法向速度很小时视为静止接触，
+   不再反弹，只保留切向速度，小球落到底边后会继续滚动而不是原地垂直弹跳
+
+坐标系：原点在左下角，y 轴向上，长度单位为像素，时间单位为秒。
+导出的帧数据（export_frames）由同目录下的 index.html 播放。
+
+穿透（todolist.md Task 3 "小球弹了之后，弹出去了"）：离散步进只在步末检查边界，步长大、速度快时
+一步的位移超过小球直径，小球会从角落穿出去，以前只能靠缩小步长解决。现在默认开启连续碰撞检测（ccd）:
+1. 本步位移够得到边界的小球才做扫掠圆检测，求出碰撞时刻，在碰撞点反弹后用剩余时间继续移动（子步），
+   远离边界的绝大多数小球仍然一次整步移动
+2. advance() 按固定步长 fixed_dt 推进，帧率波动不影响模拟结果
+
+性能与实时性：网页不是边算边画，而是播放 export 预先算好的帧（60 帧/秒，每帧 4 步，dt = 1/240）。
+能否实时模拟看实时倍数 = 每秒步数 × dt（每秒墙钟时间推进的模拟秒数），bench 会一起输出。
+在开发机上单线程测得（dt = 1/240）：1000 个小球约 590 步/秒（2.4 倍实时），2000 个约 280 步/秒（1.2 倍），
+5000 个约 120 步/秒（0.5 倍），10000 个约 54 步/秒（0.23 倍），50000 个约 10 步/秒（0.04 倍）；
+dt = 1/60 时步数少了 4 倍，但小球堆积更紧、每步的接触和扫掠更多，10000 个也只有 0.18 倍。
+邻居列表在小球落堆之后效果明显（1000~2000 个小球整体快 15%~20%），但小球刚抛出、运动剧烈时每步都要重建，
+和以前一样；上万个小球时每步的主要开销是位置约束的迭代求解而不是找小球对，10000 个只快了约 5%。
+也就是说"上万个小球实时模拟"的目标没有达到：10000 个仍只有约 0.2 倍实时，还差 5 倍左右；
+目前只有 2000 个左右以内的小球能实时模拟，上万个小球只能离线导出后回放。
+
+命令行:
+    python triangle_physics.py export --balls 2000 --seconds 10      # 导出 frames.json，供 index.html 播放
+    python triangle_physics.py bench --balls 1000,10000,50000        # 测试每秒步数和实时倍数（默认 dt = 1/240）
+    python triangle_physics.py tunnel --balls 2000 --dts 240,60,30,15  # 大步长下离散步进与连续碰撞检测的逃逸数对比
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+
+import numpy as np
+
+# 小球与边界的距离在该范围内视为接触（像素）
+CONTACT_SLOP = 1e-6
+
+# 带缓冲的邻居列表用不到 SKIN_MIN_LIFETIME 步就要整体重建时（小球运动太快，缓冲不划算），
+# 接下来 SKIN_BACKOFF_STEPS 次重建不加缓冲
+SKIN_MIN_LIFETIME = 4
+SKIN_BACKOFF_STEPS = 8
+
+# 默认三角形：底边 800 像素的等边三角形，顶点按逆时针顺序
+DEFAULT_TRIANGLE = ((0.0, 0.0), (800.0, 0.0), (400.0, 800.0 * np.sqrt(3) / 2))
+
+
+def edge_half_planes(vertices):
+    """
+    计算三角形三条边的半平面
+    参数：
+        vertices: 三个顶点 [(x, y), ...]，顺时针或逆时针均可
+    返回：
+        (normals, offsets)：normals 为 (3, 2) 的内法向量（单位向量），
+        点 p 在第 i 条边内侧的距离为 normals[i]·p - offsets[i]
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    centroid = vertices.mean(axis=0)
+    normals, offsets = [], []
+    for i in range(3):
+        a, b = vertices[i], vertices[(i + 1) % 3]
+        edge = b - a
+        normal = np.array([-edge[1], edge[0]]) / np.linalg.norm(edge)
+        if normal @ (centroid - a) < 0:
+            normal = -normal
+        normals.append(normal)
+        offsets.append(normal @ a)
+    return np.array(normals), np.array(offsets)
+
+
+def build_grid(positions, cell_size):
+    """
+    均匀网格：按格子编号排序的小球下标，以及查找每个格子中小球区间所需的信息
+    参数：
+        positions: (N, 2) 小球位置（N >= 1）
+        cell_size: 网格边长
+    返回：
+        dict: origin、cell_size、n_cols、n_rows、order（按格子排序的小球下标）、sorted_keys、
+        starts（稠密的格子起点表，网格过大时为 None）、max_per_cell
+    """
+    origin = positions.min(axis=0)
+    cells = np.floor((positions - origin) / cell_size).astype(np.int64)
+    n_cols = int(cells[:, 0].max()) + 1
+    n_rows = int(cells[:, 1].max()) + 3
+    # 行方向留出边界，保证 (cx, cy±1) 不会与其他列的编号混淆
+    keys = cells[:, 0] * n_rows + cells[:, 1] + 1
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    grid = {'origin': origin, 'cell_size': cell_size, 'n_cols': n_cols, 'n_rows': n_rows,
+            'order': order, 'sorted_keys': sorted_keys, 'starts': None}
+    # 网格不太大时用稠密的格子起点表直接查小球区间，比 searchsorted 快；
+    # 小球飞出很远（关闭 ccd 时可能逃逸）导致网格过大时退回 searchsorted
+    n_keys = (n_cols + 1) * n_rows + 1
+    if n_keys <= 8 * len(positions) + 4096:
+        per_key = np.bincount(sorted_keys, minlength=n_keys)
+        grid['starts'] = np.concatenate([[0], np.cumsum(per_key)])
+        grid['max_per_cell'] = int(per_key.max())
+    else:
+        grid['max_per_cell'] = int(np.max(np.unique(sorted_keys, return_counts=True)[1]))
+    return grid
+
+
+def _cell_range(grid, keys):
+    """格子编号对应的小球在 grid['order'] 中的区间 [lo, hi)"""
+    if grid['starts'] is not None:
+        return grid['starts'][keys], grid['starts'][keys + 1]
+    sorted_keys = grid['sorted_keys']
+    return np.searchsorted(sorted_keys, keys, side='left'), np.searchsorted(sorted_keys, keys, side='right')
+
+
+def spatial_hash_pairs(positions, cell_size):
+    """
+    用均匀网格空间哈希找出可能相交的小球对
+    参数：
+        positions: (N, 2) 小球位置
+        cell_size: 网格边长（不小于最大直径时，相交的小球一定在同一格或相邻格）
+    返回：
+        (i, j)：候选小球对的下标数组，i < j 不保证，但每对只出现一次
+    """
+    if len(positions) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return grid_pairs(build_grid(positions, cell_size))
+
+
+def grid_pairs(grid):
+    """
+    网格中同一格或相邻格的小球对
+    参数：
+        grid: build_grid() 的结果
+    返回：
+        (i, j)：小球对的下标数组，每对只出现一次
+    """
+    order, sorted_keys, n_rows = grid['order'], grid['sorted_keys'], grid['n_rows']
+
+    pairs_i, pairs_j = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    # 同一格内：排序后同一格的小球相邻，与后面第 k 个比较
+    for k in range(1, grid['max_per_cell']):
+        same = sorted_keys[:-k] == sorted_keys[k:]
+        pairs_i.append(order[:-k][same])
+        pairs_j.append(order[k:][same])
+    # 相邻格只看一半方向（右、上、右上、右下），每对只生成一次
+    for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        lo, hi = _cell_range(grid, sorted_keys + dx * n_rows + dy)
+        counts = hi - lo
+        for k in range(int(counts.max()) if len(counts) else 0):
+            has = counts > k
+            pairs_i.append(order[has])
+            pairs_j.append(order[lo[has] + k])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def grid_query(grid, points):
+    """
+    查找每个查询点所在格及相邻 8 格中的小球
+    参数：
+        grid: build_grid() 的结果
+        points: (M, 2) 查询点，可以在网格范围之外
+    返回：
+        (q, b)：查询点下标和小球下标
+    """
+    cells = np.floor((points - grid['origin']) / grid['cell_size']).astype(np.int64)
+    n_cols, n_rows = grid['n_cols'], grid['n_rows']
+    found_q, found_b = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            cx, cy = cells[:, 0] + dx, cells[:, 1] + dy
+            q = np.flatnonzero((cx >= 0) & (cx < n_cols) & (cy >= 0) & (cy <= n_rows - 3))
+            lo, hi = _cell_range(grid, cx[q] * n_rows + cy[q] + 1)
+            counts = hi - lo
+            for k in range(int(counts.max()) if len(counts) else 0):
+                has = counts > k
+                found_q.append(q[has])
+                found_b.append(grid['order'][lo[has] + k])
+    return np.concatenate(found_q), np.concatenate(found_b)
+
+
+class TriangleBallWorld:
+    """
+    三角形区域内的小球系统
+    参数：
+        vertices: 三角形顶点
+        gravity: 重力加速度（像素/秒²，方向向下）
+        restitution: 小球与边界碰撞的恢复系数（弹力，越接近1反弹越高）
+        friction: 与边界碰撞时的摩擦系数（切向速度的衰减与法向冲量成正比）
+        ball_restitution: 小球之间碰撞的恢复系数
+        rest_speed: 法向速度低于该值时视为静止接触，不再反弹（避免落地后持续微小抖动）
+        solver_iterations: 每步位置约束的迭代次数，小球堆积越多需要越多次
+        relaxation: 每次迭代修正重叠量的比例（按接触数平均后，取 1~1.5 收敛较快）
+        ccd: 是否对靠近边界的小球做连续碰撞检测（扫掠圆），关闭时只在步末把穿出的小球投影回来
+        max_bounces: 连续碰撞检测中一步内最多处理的反弹次数（小球卡在角落里时的上限）
+        fixed_dt: advance() 使用的固定步长（秒）
+        skin: 邻居列表的缓冲距离（像素），None 时取最大半径的一半；越大重新查找越少，但每步要筛选的候选对越多
+        rebuild_fraction: 重新锚定过的小球超过该比例时整体重建邻居列表
+    """
+
+    def __init__(self, vertices=DEFAULT_TRIANGLE, gravity=980.0, restitution=0.85, friction=0.05,
+                 ball_restitution=0.9, rest_speed=20.0, solver_iterations=4, relaxation=1.25,
+                 ccd=True, max_bounces=4, fixed_dt=1 / 240, skin=None, rebuild_fraction=0.05):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.normals, self.offsets = edge_half_planes(self.vertices)
+        self.gravity = np.array([0.0, -gravity])
+        self.restitution = restitution
+        self.friction = friction
+        self.ball_restitution = ball_restitution
+        self.rest_speed = rest_speed
+        self.solver_iterations = solver_iterations
+        self.relaxation = relaxation
+        self.ccd = ccd
+        self.max_bounces = max_bounces
+        self.fixed_dt = fixed_dt
+        self.skin = skin
+        self.rebuild_fraction = rebuild_fraction
+        self._accumulator = 0.0
+        self._neighbors = None
+        self._skin_backoff = 0
+        self.neighbor_rebuilds = 0
+        self.positions = np.empty((0, 2))
+        self.velocities = np.empty((0, 2))
+        self.radii = np.empty(0)
+        self.time = 0.0
+        self.steps = 0
+
+    # ---------- 初始化 ----------
+
+    def spawn(self, n, radius=(3.0, 6.0), speed=(300.0, 900.0), seed=None):
+        """
+        在三角形内随机放置 n 个小球，每个小球朝随机方向抛出
+        参数：
+            n: 小球数量
+            radius: 半径范围（像素）
+            speed: 初速度大小范围（像素/秒）
+            seed: 随机种子，None 时每次运行都不同
+        """
+        rng = np.random.default_rng(seed)
+        radii = rng.uniform(*radius, size=n)
+        positions = np.empty((n, 2))
+        filled = 0
+        while filled < n:
+            # 重心坐标均匀采样，再剔除离边界太近的点
+            u, v = rng.random((2, 2 * (n - filled)))
+            flip = u + v > 1
+            u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+            a, b, c = self.vertices
+            candidates = a + u[:, None] * (b - a) + v[:, None] * (c - a)
+            ok = np.all(candidates @ self.normals.T - self.offsets >= radius[1], axis=1)
+            accepted = candidates[ok][:n - filled]
+            positions[filled:filled + len(accepted)] = accepted
+            filled += len(accepted)
+        angles = rng.uniform(0, 2 * np.pi, size=n)
+        speeds = rng.uniform(*speed, size=n)
+        velocities = np.stack([np.cos(angles), np.sin(angles)], axis=1) * speeds[:, None]
+
+        self.positions = np.concatenate([self.positions, positions])
+        self.velocities = np.concatenate([self.velocities, velocities])
+        self.radii = np.concatenate([self.radii, radii])
+        self._neighbors = None
+        return self
+
+    @property
+    def masses(self):
+        """质量与面积成正比"""
+        return self.radii ** 2
+
+    # ---------- 模拟 ----------
+
+    def advance(self, elapsed, max_steps=8):
+        """
+        固定步长推进：把实际经过的时间累加起来，按 fixed_dt 整步模拟
+        帧率波动时每步的步长不变，模拟结果与帧率无关
+        参数：
+            elapsed: 距上次调用经过的时间（秒）
+            max_steps: 本次最多模拟的步数，卡顿后不会为了追赶时间越算越慢，多出的时间直接丢弃
+        返回：
+            int: 本次模拟的步数
+        """
+        self._accumulator += elapsed
+        steps = min(int(self._accumulator / self.fixed_dt + 1e-9), max_steps)
+        for _ in range(steps):
+            self.step(self.fixed_dt)
+        self._accumulator = max(self._accumulator - steps * self.fixed_dt, 0.0)
+        if steps == max_steps:
+            self._accumulator = min(self._accumulator, self.fixed_dt)
+        return steps
+
+    def step(self, dt):
+        """
+        前进一个时间步
+        1. 预测：速度加上重力，位置按新速度前进（半隐式欧拉）；
+           开启 ccd 时，本步可能碰到边界的小球沿运动轨迹求出碰撞时刻，在碰撞点反弹后走完剩余时间
+        2. 约束：迭代 solver_iterations 次，推开重叠的小球、把穿出边界的小球投影回三角形内
+        3. 速度：由约束产生的位移修正速度，再按碰撞前的法向速度施加反弹和摩擦
+        位置约束只修正位置、速度由位移导出（position based dynamics），堆积的小球也不会凭空获得能量
+        参数：
+            dt: 时间步长（秒）
+        """
+        self.velocities += self.gravity * dt
+        if self.ccd:
+            self._sweep_edges(dt)
+        else:
+            self.positions += self.velocities * dt
+        pre_velocities = self.velocities.copy()
+        predicted = self.positions.copy()
+
+        pairs = self._candidate_pairs()
+        for _ in range(self.solver_iterations):
+            if pairs is not None and len(pairs['i']):
+                self._separate_balls(pairs)
+            self._project_edges()
+
+        self.velocities += (self.positions - predicted) / dt
+        if pairs is not None and len(pairs['i']):
+            self._ball_restitution(pairs, pre_velocities)
+        self._edge_response(pre_velocities)
+        self.time += dt
+        self.steps += 1
+
+    def _sweep_edges(self, dt):
+        """
+        扫掠圆与三角形三条边的连续碰撞检测，只处理本步位移可能够到边界的小球
+        圆心到边的距离减去半径就是圆心到"内缩三角形"的距离，扫掠圆与边相交等价于圆心的线段与内缩边相交，
+        碰撞时刻 t = 距离 / 接近边的法向速度；内缩三角形是凸的，t 最小的边就是先碰到的边。
+        小球移动到碰撞点后反弹，用剩余时间继续移动，最多处理 max_bounces 次（角落里可能连续碰到两条边），
+        用完次数的小球停在最后一个碰撞点，保证无论步长多大都不会穿出三角形
+        """
+        clearance = np.min(self.positions @ self.normals.T - self.offsets, axis=1) - self.radii
+        reach = np.sqrt(np.einsum('ij,ij->i', self.velocities, self.velocities)) * dt
+        near = clearance < reach + CONTACT_SLOP
+        self.positions[~near] += self.velocities[~near] * dt
+        if not near.any():
+            return
+
+        index = np.flatnonzero(near)
+        positions, velocities = self.positions[index], self.velocities[index]
+        radii = self.radii[index]
+        remaining = np.full(len(index), dt)
+        active = np.arange(len(index))
+        for _ in range(self.max_bounces):
+            p, v = positions[active], velocities[active]
+            gap = p @ self.normals.T - self.offsets - radii[active, None]
+            vn = v @ self.normals.T
+            # 只有朝边界运动的边才会碰到；已经略微穿入的（gap < 0）视为在 t=0 时碰撞
+            approaching = vn < -1e-9
+            toi = np.full(gap.shape, np.inf)
+            toi[approaching] = np.maximum(gap[approaching], 0.0) / -vn[approaching]
+            edge = np.argmin(toi, axis=1)
+            t = toi[np.arange(len(active)), edge]
+            hit = t < remaining[active]
+
+            free = active[~hit]
+            positions[free] += velocities[free] * remaining[free, None]
+            remaining[free] = 0.0
+            active, t, edge = active[hit], t[hit], edge[hit]
+            if not len(active):
+                break
+            positions[active] += velocities[active] * t[:, None]
+            remaining[active] -= t
+            for k, normal in enumerate(self.normals):
+                on_edge = active[edge == k]
+                if len(on_edge):
+                    v = velocities[on_edge]
+                    velocities[on_edge] = self._bounce(v, v @ normal, normal)
+
+        self.positions[index] = positions
+        self.velocities[index] = velocities
+
+    def _candidate_pairs(self):
+        """
+        本步可能接触的小球对（及按质量分摊的系数），从邻居列表（Verlet list）中筛选
+        邻居列表保存每个小球的锚点位置，以及锚点距离在 (半径和 × 1.05 + skin) 以内的所有小球对；
+        只要每个小球离自己的锚点不超过 skin / 2，本步接触的小球对一定都在列表里，不需要每步重建空间哈希。
+        离锚点超过 skin / 2 的小球（通常是少数弹得很快的小球）在原位置重新锚定，只重新查找它们的邻居；
+        重新锚定过的小球累计超过 rebuild_fraction 时整体重建。
+        刚抛出的小球运动很快，列表用不了几步（SKIN_MIN_LIFETIME）就失效，缓冲只会白白增加候选对，
+        这时接下来 SKIN_BACKOFF_STEPS 次重建不加缓冲（每步重建，与不用邻居列表相同），之后再试
+        """
+        if len(self.radii) < 2:
+            return None
+        neighbors = self._neighbors
+        if neighbors is None or neighbors['skin'] == 0:
+            neighbors = self._build_neighbors()
+            if neighbors['skin'] == 0:
+                # 没有缓冲时列表就是本步的候选对，不用再筛选
+                return {key: neighbors[key] for key in ('i', 'j', 'radius_sum', 'inv_mi', 'inv_mj', 'inv_sum')}
+        else:
+            moved = self.positions - neighbors['anchor']
+            stale = np.einsum('ij,ij->i', moved, moved) > (neighbors['skin'] / 2) ** 2
+            if stale.any():
+                if np.count_nonzero(stale | neighbors['relocated']) > self.rebuild_fraction * len(self.radii):
+                    if self.steps - neighbors['built_at'] < SKIN_MIN_LIFETIME:
+                        self._skin_backoff = SKIN_BACKOFF_STEPS
+                    neighbors = self._build_neighbors()
+                else:
+                    self._relocate_neighbors(neighbors, stale)
+        i, j = neighbors['i'], neighbors['j']
+        # 推开过程中距离会变化，候选对放宽一点筛选，迭代时只在这些对上重新计算
+        delta = self.positions[j] - self.positions[i]
+        near = np.einsum('ij,ij->i', delta, delta) < neighbors['contact_sq']
+        return {key: neighbors[key][near] for key in ('i', 'j', 'radius_sum', 'inv_mi', 'inv_mj', 'inv_sum')}
+
+    def _build_neighbors(self):
+        """空间哈希重建邻居列表，以当前位置为所有小球的锚点；网格保留下来供重新锚定时查找"""
+        skin = self.radii.max() * 0.5 if self.skin is None else self.skin
+        if self._skin_backoff:
+            skin = 0.0
+            self._skin_backoff -= 1
+        anchor = self.positions.copy()
+        grid = build_grid(anchor, 2 * self.radii.max() * 1.05 + skin)
+        self._neighbors = {'anchor': anchor, 'grid': grid, 'skin': skin, 'inv_mass': 1 / self.masses,
+                           'relocated': np.zeros(len(self.radii), dtype=bool), 'built_at': self.steps}
+        self._neighbors.update(self._neighbor_pairs(*grid_pairs(grid)))
+        self.neighbor_rebuilds += 1
+        return self._neighbors
+
+    def _neighbor_pairs(self, i, j):
+        """保留锚点距离在 (半径和 × 1.05 + skin) 以内的小球对，半径和与质量系数一并算好"""
+        neighbors = self._neighbors
+        delta = neighbors['anchor'][j] - neighbors['anchor'][i]
+        radius_sum = self.radii[i] + self.radii[j]
+        keep = np.einsum('ij,ij->i', delta, delta) < (radius_sum * 1.05 + neighbors['skin']) ** 2
+        i, j, radius_sum = i[keep], j[keep], radius_sum[keep]
+        inv_mi, inv_mj = neighbors['inv_mass'][i], neighbors['inv_mass'][j]
+        return {'i': i, 'j': j, 'radius_sum': radius_sum, 'inv_mi': inv_mi, 'inv_mj': inv_mj,
+                'inv_sum': inv_mi + inv_mj, 'contact_sq': (radius_sum * 1.05) ** 2}
+
+    def _relocate_neighbors(self, neighbors, stale):
+        """
+        离锚点超过 skin / 2 的小球重新锚定到当前位置，删掉它们原来的邻居对，重新查找邻居：
+        锚点没变过的小球仍在建网格时的格子里，用网格查找；重新锚定过的小球不多，直接两两比较
+        """
+        moved = np.flatnonzero(stale)
+        neighbors['anchor'][moved] = self.positions[moved]
+        relocated = neighbors['relocated']
+        relocated[moved] = True
+        keep = ~(stale[neighbors['i']] | stale[neighbors['j']])
+
+        q, b = grid_query(neighbors['grid'], neighbors['anchor'][moved])
+        fixed = ~relocated[b]
+        others = np.flatnonzero(relocated)
+        qq, bb = np.repeat(moved, len(others)), np.tile(others, len(moved))
+        # 两端都是本次重新锚定的小球时会出现两次，只保留一次
+        once = (qq != bb) & ~(stale[bb] & (qq > bb))
+        added = self._neighbor_pairs(np.concatenate([moved[q[fixed]], qq[once]]),
+                                     np.concatenate([b[fixed], bb[once]]))
+        for key, values in added.items():
+            neighbors[key] = np.concatenate([neighbors[key][keep], values])
+
+    def _separate_balls(self, pairs):
+        """
+        推开重叠的小球（一次迭代），按质量反比分摊重叠量
+        所有接触对同时求解（Jacobi），一个小球同时接触多个小球时修正量按接触数平均，
+        否则堆积的小球会被重复推开
+        """
+        i, j, inv_mi, inv_mj, inv_sum = pairs['i'], pairs['j'], pairs['inv_mi'], pairs['inv_mj'], pairs['inv_sum']
+        n_balls = len(self.radii)
+        normal, overlap = self._pair_geometry(i, j, pairs['radius_sum'])
+        touching = overlap > 0
+        contacts = np.maximum(np.bincount(i[touching], minlength=n_balls) +
+                              np.bincount(j[touching], minlength=n_balls), 1)
+        correction = np.maximum(overlap, 0.0) / inv_sum * self.relaxation
+        self._scatter(self.positions, i, -normal * (correction * inv_mi / contacts[i])[:, None], n_balls)
+        self._scatter(self.positions, j, normal * (correction * inv_mj / contacts[j])[:, None], n_balls)
+
+    def _project_edges(self):
+        """三条边的半平面测试：穿出边界的小球沿内法向投影回三角形内（所有小球一次向量化计算）"""
+        distance = self.positions @ self.normals.T - self.offsets
+        penetration = np.maximum(self.radii[:, None] - distance, 0.0)
+        self.positions += penetration @ self.normals
+
+    def _ball_restitution(self, pairs, pre_velocities):
+        """
+        小球之间的反弹：碰撞前相互接近得足够快的接触对，把相对法向速度修正为 -恢复系数 × 碰撞前的值
+        （位置约束已经消除了接近速度，这里只补上弹开的部分）
+        """
+        i, j, inv_mi, inv_mj, inv_sum = pairs['i'], pairs['j'], pairs['inv_mi'], pairs['inv_mj'], pairs['inv_sum']
+        n_balls = len(self.radii)
+        normal, overlap = self._pair_geometry(i, j, pairs['radius_sum'])
+        touching = overlap > -CONTACT_SLOP
+        pre_vn = np.einsum('ij,ij->i', pre_velocities[j] - pre_velocities[i], normal)
+        bouncing = touching & (pre_vn < -self.rest_speed)
+        if not bouncing.any():
+            return
+        i, j, normal = i[bouncing], j[bouncing], normal[bouncing]
+        inv_mi, inv_mj, inv_sum = inv_mi[bouncing], inv_mj[bouncing], inv_sum[bouncing]
+        rel_vn = np.einsum('ij,ij->i', self.velocities[j] - self.velocities[i], normal)
+        impulse = np.maximum(-self.ball_restitution * pre_vn[bouncing] - rel_vn, 0.0) / inv_sum
+        contacts = np.bincount(i, minlength=n_balls) + np.bincount(j, minlength=n_balls)
+        self._scatter(self.velocities, i, -normal * (impulse * inv_mi / contacts[i])[:, None], n_balls)
+        self._scatter(self.velocities, j, normal * (impulse * inv_mj / contacts[j])[:, None], n_balls)
+
+    def _edge_response(self, pre_velocities):
+        """
+        贴着边界的小球：法向速度按碰撞前的值反弹，切向速度按摩擦衰减
+        碰撞前法向速度很小时视为静止接触，不反弹，只保留切向速度（小球在底边上滚动）
+        """
+        distance = self.positions @ self.normals.T - self.offsets
+        for k, normal in enumerate(self.normals):
+            hit = distance[:, k] - self.radii < CONTACT_SLOP
+            if not hit.any():
+                continue
+            self.velocities[hit] = self._bounce(self.velocities[hit], pre_velocities[hit] @ normal, normal)
+
+    def _bounce(self, v, pre_vn, normal):
+        """
+        一条边上的碰撞速度响应
+        参数：
+            v: (M, 2) 当前速度
+            pre_vn: (M,) 碰撞前的法向速度（负数表示朝边界运动）
+            normal: 边的内法向量
+        返回：
+            (M, 2) 碰撞后的速度
+        """
+        vn = v @ normal
+        tangent_v = v - vn[:, None] * normal
+        new_vn = np.where(pre_vn < -self.rest_speed, -self.restitution * pre_vn, np.maximum(vn, 0.0))
+        # 库仑摩擦：切向速度的衰减量与法向速度的变化成正比，最多衰减到0
+        impulse = np.abs(new_vn - pre_vn)
+        tangent_speed = np.linalg.norm(tangent_v, axis=1)
+        scale = np.clip(1 - self.friction * impulse / np.maximum(tangent_speed, 1e-12), 0.0, 1.0)
+        return tangent_v * scale[:, None] + new_vn[:, None] * normal
+
+    def _pair_geometry(self, i, j, radius_sum):
+        """小球对的单位法向量（i 指向 j）和重叠量"""
+        delta = self.positions[j] - self.positions[i]
+        dist = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        normal = delta / np.maximum(dist, 1e-12)[:, None]
+        return normal, radius_sum - dist
+
+    @staticmethod
+    def _scatter(target, index, values, n):
+        """target[index] += values（index 可重复），用 bincount 汇总比 np.add.at 快得多"""
+        target[:, 0] += np.bincount(index, weights=values[:, 0], minlength=n)
+        target[:, 1] += np.bincount(index, weights=values[:, 1], minlength=n)
+
+    # ---------- 统计 ----------
+
+    def escaped(self, tolerance=1e-6):
+        """跑到三角形外面（圆心在任意一条边外侧）的小球掩码"""
+        return np.any(self.positions @ self.normals.T - self.offsets < -tolerance, axis=1)
+
+    def kinetic_energy(self):
+        return float(0.5 * np.sum(self.masses * np.einsum('ij,ij->i', self.velocities, self.velocities)))
+
+    # ---------- 导出 ----------
+
+    def export_frames(self, path, seconds=10.0, fps=60, steps_per_frame=4, max_balls=5000):
+        """
+        模拟并导出帧数据，供 index.html 播放
+        参数：
+            path: 输出文件（JSON）
+            seconds: 模拟时长（秒）
+            fps: 帧率
+            steps_per_frame: 每帧的模拟步数（步长 = 1 / (fps × steps_per_frame)）
+            max_balls: 最多导出的小球数（模拟全部小球，只导出前 max_balls 个）
+        返回：
+            dict: 导出的小球数、帧数、模拟耗时、实时倍数（模拟时长 / 模拟耗时）
+        """
+        dt = 1.0 / (fps * steps_per_frame)
+        n_frames = int(seconds * fps)
+        n_export = min(max_balls, len(self.radii))
+        # 位置量化为 0.1 像素的 int16（三角形边长在 3000 像素以内），体积只有浮点 JSON 的几十分之一
+        frames = np.empty((n_frames, n_export, 2), dtype='<i2')
+        start = time.perf_counter()
+        for frame in range(n_frames):
+            frames[frame] = np.round(self.positions[:n_export] * 10)
+            for _ in range(steps_per_frame):
+                self.step(dt)
+        elapsed = time.perf_counter() - start
+        data = {
+            'triangle': self.vertices.tolist(),
+            'radii': np.round(self.radii[:n_export], 2).tolist(),
+            'fps': fps,
+            'n_frames': n_frames,
+            'n_balls': n_export,
+            'scale': 0.1,
+            'positions': base64.b64encode(frames.tobytes()).decode('ascii'),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        return {'balls': n_export, 'frames': n_frames, 'simulate_s': round(elapsed, 3),
+                'realtime_factor': round(n_frames / fps / elapsed, 2) if elapsed else None}
+
+
+def benchmark(ball_counts=(1000, 10000, 50000), steps=200, dt=1 / 240, seed=0):
+    """
+    无界面测试每秒步数和实时倍数
+    参数：
+        ball_counts: 依次测试的小球数量
+        steps: 每轮模拟步数
+        dt: 步长（秒），默认与 export 导出网页帧数据时相同（60 帧/秒 × 每帧 4 步）
+        seed: 随机种子
+    返回：
+        list: 每个小球数量的 {balls, steps_per_s, ball_steps_per_s, realtime_factor, escaped}，
+        realtime_factor = steps_per_s × dt，大于等于 1 才能实时模拟
+    """
+    rows = []
+    for n in ball_counts:
+        # 小球越多半径越小，保持总面积占三角形的一小部分
+        radius = min(6.0, 250.0 / np.sqrt(n))
+        world = TriangleBallWorld().spawn(n, radius=(0.5 * radius, radius), seed=seed)
+        world.step(dt)   # 预热
+        start = time.perf_counter()
+        for _ in range(steps):
+            world.step(dt)
+        elapsed = time.perf_counter() - start
+        rows.append({'balls': n, 'steps_per_s': round(steps / elapsed, 1),
+                     'ball_steps_per_s': round(n * steps / elapsed),
+                     'realtime_factor': round(steps * dt / elapsed, 2), 'escaped': int(world.escaped().sum())})
+    return rows
+
+
+def tunneling_benchmark(n_balls=2000, ball_steps=2_000_000, dts=(1 / 240, 1 / 60, 1 / 30, 1 / 15),
+                        speed=(1500.0, 3000.0), seed=0):
+    """
+    无界面测试大步长下的穿透：分别用离散步进和连续碰撞检测模拟同样的小球，统计每秒步数和逃逸数
+    小球初速度取得很大，大步长时一步的位移超过小球直径，离散步进会有小球从角落穿出去
+    参数：
+        n_balls: 小球数量
+        ball_steps: 每组配置模拟的总"小球×步数"
+        dts: 依次测试的步长（秒）
+        speed: 初速度大小范围（像素/秒）
+        seed: 随机种子
+    返回：
+        list: 每个 (步长, 是否ccd) 的 {dt, ccd, steps, steps_per_s, ball_steps_per_s, escaped, escape_events}，
+        escaped 为曾经在步末跑到三角形外面的小球数，escape_events 为逃逸的 (小球, 步) 次数
+    """
+    steps = max(ball_steps // n_balls, 1)
+    rows = []
+    for dt in dts:
+        for ccd in (False, True):
+            world = TriangleBallWorld(ccd=ccd).spawn(n_balls, radius=(2.5, 5.0), speed=speed, seed=seed)
+            ever = np.zeros(n_balls, dtype=bool)
+            events = 0
+            start = time.perf_counter()
+            for _ in range(steps):
+                world.step(dt)
+                outside = world.escaped()
+                ever |= outside
+                events += int(outside.sum())
+            elapsed = time.perf_counter() - start
+            rows.append({'dt': dt, 'ccd': ccd, 'steps': steps, 'steps_per_s': round(steps / elapsed, 1),
+                         'ball_steps_per_s': round(n_balls * steps / elapsed),
+                         'escaped': int(ever.sum()), 'escape_events': events})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='三角形区域内的多小球物理引擎')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help='模拟并导出帧数据，供 index.html 播放')
+    export_parser.add_argument('--balls', type=int, default=2000)
+    export_parser.add_argument('--seconds', type=float, default=10.0)
+    export_parser.add_argument('--fps', type=int, default=60)
+    export_parser.add_argument('--seed', type=int, default=None, help='随机种子，默认每次不同')
+    export_parser.add_argument('--out', default='frames.json')
+    bench_parser = sub.add_parser('bench', help='测试每秒步数')
+    bench_parser.add_argument('--balls', default='1000,10000,50000', help='小球数量，逗号分隔')
+    bench_parser.add_argument('--steps', type=int, default=200)
+    bench_parser.add_argument('--hz', type=float, default=240, help='步长的倒数（每秒步数），默认与 export 相同')
+    tunnel_parser = sub.add_parser('tunnel', help='对比离散步进和连续碰撞检测在大步长下的逃逸数和每秒步数')
+    tunnel_parser.add_argument('--balls', type=int, default=2000)
+    tunnel_parser.add_argument('--ball-steps', type=int, default=2_000_000, help='每组配置模拟的总小球×步数')
+    tunnel_parser.add_argument('--dts', default='240,60,30,15', help='步长的倒数（每秒步数），逗号分隔')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        radius = min(6.0, 250.0 / np.sqrt(args.balls))
+        world = TriangleBallWorld().spawn(args.balls, radius=(0.5 * radius, radius), seed=args.seed)
+        result = world.export_frames(args.out, seconds=args.seconds, fps=args.fps)
+        print(f"已导出 {args.out}: {result}")
+    elif args.command == 'tunnel':
+        rows = tunneling_benchmark(args.balls, args.ball_steps, dts=[1 / float(hz) for hz in args.dts.split(',')])
+        print(f"{'dt':>8} {'mode':>8} {'steps':>7} {'steps/s':>9} {'ball-steps/s':>14} {'escaped':>8} {'events':>8}")
+        for row in rows:
+            print(f"{'1/' + str(round(1 / row['dt'])):>8} {'ccd' if row['ccd'] else 'discrete':>8} {row['steps']:>7} "
+                  f"{row['steps_per_s']:>9} {row['ball_steps_per_s']:>14} {row['escaped']:>8} {row['escape_events']:>8}")
+    else:
+        print(f"dt = 1/{args.hz:g}")
+        print(f"{'balls':>8} {'steps/s':>9} {'ball-steps/s':>14} {'realtime':>9} {'escaped':>8}")
+        for row in benchmark([int(n) for n in args.balls.split(',')], steps=args.steps, dt=1 / args.hz):
+            print(f"{row['balls']:>8} {row['steps_per_s']:>9} {row['ball_steps_per_s']:>14} "
+                  f"{row['realtime_factor']:>8}x {row['escaped']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,35 +6,77 @@
 
 import json
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-import dashscope
-from dashscope.api_entities.dashscope_response import Role
+from lazy_import import lazy_module
+# dashscope 延迟到第一次调用模型时才导入，缩短脚本启动时间
+dashscope = lazy_module('dashscope')
+from model_router import ModelRouter
+from sentiment_fastpath import SentimentFastPath, parse_sentiment_label
+from semantic_cache import SemanticCache
+from prompt_cache import PromptPrefix, CacheStats
 
 # 从环境变量中，获取 DASHSCOPE_API_KEY
 env_file = Path('../.env')
 if env_file.exists():
     load_dotenv(env_file)
-    api_key = os.environ.get('DASHSCOPE_API_KEY')
+api_key = os.environ.get('DASHSCOPE_API_KEY')
 dashscope.api_key = api_key
 
+# 模型路由：一个词的情感标注属于 sentiment 任务，优先使用便宜、快速的模型，
+# 超时或限流时自动切换到同类模型（原先固定使用 deepseek-v3）
+router = ModelRouter()
+
+# 固定前缀：系统提示词每次调用逐字节一致，评论追加在最后。
+# 这个前缀只有几十个 token，远低于上下文缓存的最小长度（prompt_cache.MIN_CACHEABLE_TOKENS），
+# 不会命中服务端缓存；情感分析省调用靠的是语义缓存和本地快速通道，cache_stats 只用来核对这一点
+SENTIMENT_PROMPT = PromptPrefix("你是一名舆情分析师，帮我判断产品口碑的正负向，回复请用一个词语：正向 或者 负向")
+cache_stats = CacheStats()
+
 # 封装模型响应函数
 def get_response(messages):
-    response = dashscope.Generation.call(
-        model='deepseek-v3',
-        messages=messages,
-        result_format='message'  # 将输出设置为message形式
-    )
+    start = time.perf_counter()
+    model, response = router.call('sentiment', messages)
+    cached_tokens = cache_stats.record(response, time.perf_counter() - start)
+    print(f"路由模型: {model}（缓存命中 {cached_tokens} tokens）")
     return response
     
-review = '这款音效特别好 给你意想不到的音质。'
-messages=[
-    {"role": "system", "content": "你是一名舆情分析师，帮我判断产品口碑的正负向，回复请用一个词语：正向 或者 负向"},
-    {"role": "user", "content": review}
-  ]
-
-response = get_response(messages)
-result = response.output.choices[0].message.content
-print(f"评论: {review}")
-print(f"情感分析结果: {result}")
+# 大模型标注函数：只有本地分类器不确定时才会被调用
+def llm_label(review):
+    messages = SENTIMENT_PROMPT.build(review)
+    response = get_response(messages)
+    return parse_sentiment_label(response.output.choices[0].message.content)
+
+# 语义缓存：情感分析只在归一化后文本完全相同时命中（一个"不"字就会让结论反转），
+# 命中的结果直接返回，不写回标签缓存，避免缓存结果被当成大模型标签用于训练
+SEMANTIC_CACHE_SNAPSHOT = 'cache/semantic_cache_sentiment'
+semantic_cache = SemanticCache()
+semantic_cache.load_snapshot(SEMANTIC_CACHE_SNAPSHOT)
+
+# 本地快速通道：用缓存的大模型标签训练本地分类器，高置信度评论直接本地判定
+fastpath = SentimentFastPath('cache/sentiment_labels.jsonl')
+
+def classify_review(review):
+    """情感分析入口：返回 (标签, 来源, 置信度)，来源为 cache / local / llm"""
+    cached_label = semantic_cache.get('sentiment', review)
+    if cached_label is not None:
+        print("命中语义缓存")
+        return cached_label, 'cache', 1.0
+    label, source, confidence = fastpath.classify(review, llm_label)
+    if source == 'llm' and label is not None:
+        semantic_cache.put('sentiment', review, label)
+    return label, source, confidence
+
+SOURCE_NAMES = {'cache': '语义缓存', 'local': '本地分类器', 'llm': '大模型'}
+
+if __name__ == "__main__":
+    review = '这款音效特别好 给你意想不到的音质。'
+    result, source, confidence = classify_review(review)
+    semantic_cache.save_snapshot(SEMANTIC_CACHE_SNAPSHOT)
+    print(f"评论: {review}")
+    print(f"情感分析结果: {result}（来源: {SOURCE_NAMES[source]}，置信度: {confidence:.2f}）")
+    if cache_stats.requests:
+        print(f"上下文缓存: {cache_stats.summary()}（前缀约 {SENTIMENT_PROMPT.estimated_tokens} tokens，"
+              f"{'可以' if SENTIMENT_PROMPT.cacheable() else '达不到最小长度，不会'}命中缓存）")
 
@@ -19,14 +19,42 @@ Function Calling（函数调用）是什么？
 # ==================== 导入必要的库 ====================
 import json
 import os
-import dashscope
-from dashscope.api_entities.dashscope_response import Role
+from lazy_import import lazy_module
+# dashscope 延迟到第一次调用模型时才导入，缩短脚本启动时间
+dashscope = lazy_module('dashscope')
+from trace_recorder import TraceRecorder
+from city_gazetteer import CityGazetteer
 
 # ==================== API密钥配置 ====================
 # 从环境变量中获取API密钥，确保安全性
 api_key = os.environ.get('DASHSCOPE_API_KEY')
 dashscope.api_key = api_key
 
+# 对话轨迹文件（追加写入，可用 trace_recorder.load_traces() 读取并离线回放）
+TRACE_FILE = 'traces/weather_conversation.jsonl'
+
+# ==================== 城市地名索引 ====================
+# 启动时建好一次：中文名、拼音、英文别名 -> 规范城市ID，解析耗时与城市数量无关
+GAZETTEER = CityGazetteer()
+
+# 模拟天气数据（实际应用中应该调用天气API），按规范城市ID索引
+SIMULATED_TEMPERATURES = {
+    'dalian': 10,
+    'shanghai': 36,
+    'shenzhen': 37,
+}
+
+def _weather_info(location, city, unit):
+    """构建单个城市的天气信息字典；city 为 None 表示未识别出城市"""
+    return {
+        "location": location,        # 原始地点描述
+        "city_id": city['id'] if city else None,   # 规范城市ID
+        "city": city['name'] if city else None,    # 规范城市名
+        "temperature": SIMULATED_TEMPERATURES.get(city['id'], -1) if city else -1,  # 温度，未知为-1
+        "unit": unit,               # 温度单位
+        "forecast": ["晴天", "微风"], # 天气状况
+    }
+
 # ==================== 自定义函数定义 ====================
 # 这个函数将被大模型调用，用于获取天气信息
 # 注意：这里使用模拟数据，实际应用中应该调用真实的天气API
@@ -34,33 +62,43 @@ def get_current_weather(location, unit="摄氏度"):
     """
     获取指定城市的天气信息
     参数：
-        location: 城市名称
+        location: 城市名称（支持中文名、拼音和英文别名，如 大连市 / Dalian）
         unit: 温度单位（摄氏度/华氏度）
     返回：
         JSON格式的天气信息
     """
-    # 模拟天气数据（实际应用中应该调用天气API）
-    temperature = -1  # 默认温度
-    
-    # 根据城市名称返回对应的模拟温度
-    if '大连' in location or 'Dalian' in location:
-        temperature = 10
-    if '上海' in location or 'Shanghai' in location:
-        temperature = 36
-    if '深圳' in location or 'Shenzhen' in location:
-        temperature = 37
-    
-    # 构建天气信息字典
-    weather_info = {
-        "location": location,        # 城市名称
-        "temperature": temperature,  # 温度
-        "unit": unit,               # 温度单位
-        "forecast": ["晴天", "微风"], # 天气状况
-    }
-    
+    weather_info = _weather_info(location, GAZETTEER.resolve(location or ''), unit)
     # 返回JSON字符串，便于模型解析
     return json.dumps(weather_info, ensure_ascii=False)
 
+def get_weather_batch(locations, unit="摄氏度"):
+    """
+    批量获取多个城市的天气信息，多城市问题只需要一次函数调用
+    参数：
+        locations: 城市名称列表；单个字符串中包含多个城市（如 "上海和深圳"）时也会逐个识别
+        unit: 温度单位（摄氏度/华氏度）
+    返回：
+        JSON格式的天气信息列表（同一城市的不同写法只返回一次）
+    """
+    if isinstance(locations, str):
+        locations = [locations]
+    results, seen = [], set()
+    for location in locations or []:
+        cities = GAZETTEER.resolve_all(location) or [None]
+        for city in cities:
+            if city and city['id'] in seen:
+                continue
+            if city:
+                seen.add(city['id'])
+            results.append(_weather_info(location, city, unit))
+    return json.dumps(results, ensure_ascii=False)
+
+# 函数注册表：函数名 -> 本地函数
+FUNCTION_REGISTRY = {
+    'get_current_weather': get_current_weather,
+    'get_weather_batch': get_weather_batch,
+}
+
 # ==================== 大模型API调用封装 ====================
 def get_response(messages):
     """
@@ -84,93 +122,115 @@ def get_response(messages):
         return None
 
 # ==================== 核心对话流程 ====================
-def run_conversation():
+def run_conversation(query="大连的天气怎样", recorder=None):
     """
     执行完整的Function Calling对话流程
     这是整个脚本的核心函数，展示了Function Calling的完整工作流程
+    参数：
+        query: 用户的问题
+        recorder: 轨迹录制器（TraceRecorder），回放时传入 TracePlayer；为None时不记录
     """
-    # 用户的问题
-    query = "大连的天气怎样"
     print(f"用户问题: {query}")
     
-    # 初始化对话历史，包含用户的问题
-    messages = [{"role": "user", "content": query}]
+    # 录制模式下，模型调用和函数调用都经过录制器
+    call_model = get_response
+    function_registry = FUNCTION_REGISTRY
+    if recorder:
+        recorder.start_trace("weather_conversation", {"query": query})
+        call_model = lambda msgs: recorder.call_model(get_response, msgs)
+        function_registry = {name: recorder.wrap_tool(name, fn) for name, fn in FUNCTION_REGISTRY.items()}
     
-    # ========== 第一步：第一次调用模型 ==========
-    print("\n=== 第一步：模型分析用户问题 ===")
-    response = get_response(messages)
+    # 无论正常返回、模型调用失败提前返回还是抛异常，都要结束轨迹，
+    # 否则 JSONL 中留下没有 trace_end 的轨迹，load_traces/TracePlayer 会把它和下一条轨迹混在一起
+    try:
+        # 初始化对话历史，包含用户的问题
+        messages = [{"role": "user", "content": query}]
     
-    # 检查API调用是否成功
-    if not response or not response.output:
-        print("获取响应失败")
-        return None
+        # ========== 第一步：第一次调用模型 ==========
+        print("\n=== 第一步：模型分析用户问题 ===")
+        response = call_model(messages)
+    
+        # 检查API调用是否成功
+        if not response or not response.output:
+            print("获取响应失败")
+            return None
         
-    print('API响应:', response)
+        print('API响应:', response)
     
-    # 提取模型的回复
-    message = response.output.choices[0].message
-    messages.append(message)  # 将模型回复加入对话历史
-    print('模型回复:', message)
+        # 提取模型的回复
+        message = response.output.choices[0].message
+        messages.append(message)  # 将模型回复加入对话历史
+        print('模型回复:', message)
     
-    # ========== 第二步：检查是否需要调用函数 ==========
-    print("\n=== 第二步：检查是否需要调用函数 ===")
+        # ========== 第二步：检查是否需要调用函数 ==========
+        print("\n=== 第二步：检查是否需要调用函数 ===")
     
-    # 检查模型是否要求调用函数
-    # 注意：这里使用字典方式安全访问，避免KeyError
-    if isinstance(message, dict) and 'function_call' in message and message['function_call']:
-        print("检测到函数调用请求！")
+        # 检查模型是否要求调用函数
+        # 注意：这里使用字典方式安全访问，避免KeyError
+        if isinstance(message, dict) and 'function_call' in message and message['function_call']:
+            print("检测到函数调用请求！")
         
-        # 提取函数调用信息
-        function_call = message['function_call']
-        tool_name = function_call['name']  # 函数名称
-        print(f"需要调用的函数: {tool_name}")
+            # 提取函数调用信息
+            function_call = message['function_call']
+            tool_name = function_call['name']  # 函数名称
+            print(f"需要调用的函数: {tool_name}")
         
-        # ========== 第三步：执行函数调用 ==========
-        print("\n=== 第三步：执行函数调用 ===")
+            # ========== 第三步：执行函数调用 ==========
+            print("\n=== 第三步：执行函数调用 ===")
         
-        # 解析函数参数（JSON字符串转字典）
-        arguments = json.loads(function_call['arguments'])
-        print('函数参数:', arguments)
+            # 解析函数参数（JSON字符串转字典）
+            arguments = json.loads(function_call['arguments'])
+            print('函数参数:', arguments)
         
-        # 根据函数名称调用对应的函数
-        if tool_name == 'get_current_weather':
-            tool_response = get_current_weather(
-                location=arguments.get('location'),  # 城市名称
-                unit=arguments.get('unit'),          # 温度单位
-            )
+            # 根据函数名称调用对应的函数
+            if tool_name == 'get_current_weather':
+                tool_response = function_registry[tool_name](
+                    location=arguments.get('location'),  # 城市名称
+                    unit=arguments.get('unit'),          # 温度单位
+                )
+            elif tool_name == 'get_weather_batch':
+                tool_response = function_registry[tool_name](
+                    locations=arguments.get('locations'),  # 城市名称列表
+                    unit=arguments.get('unit'),            # 温度单位
+                )
+            else:
+                tool_response = json.dumps({"error": f"未知函数: {tool_name}"}, ensure_ascii=False)
         
-        # 将函数执行结果包装成消息格式
-        tool_info = {
-            "role": "function",           # 角色：函数
-            "name": tool_name,            # 函数名称
-            "content": tool_response      # 函数返回结果
-        }
-        print('函数执行结果:', tool_info)
+            # 将函数执行结果包装成消息格式
+            tool_info = {
+                "role": "function",           # 角色：函数
+                "name": tool_name,            # 函数名称
+                "content": tool_response      # 函数返回结果
+            }
+            print('函数执行结果:', tool_info)
         
-        # 将函数结果加入对话历史
-        messages.append(tool_info)
-        print('更新后的对话历史:', messages)
+            # 将函数结果加入对话历史
+            messages.append(tool_info)
+            print('更新后的对话历史:', messages)
         
-        # ========== 第四步：第二次调用模型 ==========
-        print("\n=== 第四步：模型基于函数结果生成最终回答 ===")
+            # ========== 第四步：第二次调用模型 ==========
+            print("\n=== 第四步：模型基于函数结果生成最终回答 ===")
         
-        # 再次调用模型，这次模型会基于函数返回的真实数据生成回答
-        response = get_response(messages)
+            # 再次调用模型，这次模型会基于函数返回的真实数据生成回答
+            response = call_model(messages)
         
-        # 检查第二次调用是否成功
-        if not response or not response.output:
-            print("获取第二次响应失败")
-            return None
+            # 检查第二次调用是否成功
+            if not response or not response.output:
+                print("获取第二次响应失败")
+                return None
             
-        print('最终API响应:', response)
+            print('最终API响应:', response)
         
-        # 提取最终回答
-        message = response.output.choices[0].message
-        return message
+            # 提取最终回答
+            message = response.output.choices[0].message
+            return message
     
-    # 如果没有函数调用，直接返回第一次的回答
-    print("无需调用函数，直接返回模型回答")
-    return message
+        # 如果没有函数调用，直接返回第一次的回答
+        print("无需调用函数，直接返回模型回答")
+        return message
+    finally:
+        if recorder:
+            recorder.end_trace()
 
 # ==================== 函数定义配置 ====================
 # 这个配置告诉大模型有哪些函数可以调用，以及如何调用
@@ -192,6 +252,25 @@ functions = [
             },
             'required': ['location']                     # 必需参数：只有location是必需的
         }
+    },
+    {
+        'name': 'get_weather_batch',
+        'description': 'Get the current weather for several locations in one call. Use this when the question mentions more than one city.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'locations': {                           # 城市列表
+                    'type': 'array',
+                    'items': {'type': 'string'},
+                    'description': 'City names, e.g. ["上海", "Shenzhen"]'
+                },
+                'unit': {
+                    'type': 'string',
+                    'enum': ['celsius', 'fahrenheit']
+                }
+            },
+            'required': ['locations']
+        }
     }
 ]
 
@@ -200,8 +279,11 @@ if __name__ == "__main__":
     print("开始执行天气查询Function Calling示例...")
     print("=" * 50)
     
-    # 执行对话流程
-    result = run_conversation()
+    # 执行对话流程，并把完整对话轨迹追加写入 TRACE_FILE
+    os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    recorder = TraceRecorder(TRACE_FILE)
+    result = run_conversation(recorder=recorder)
+    recorder.close()
     
     # 输出最终结果
     if result:
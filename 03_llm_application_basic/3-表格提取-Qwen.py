@@ -6,8 +6,9 @@
 
 import json
 import os
-import dashscope
-from dashscope.api_entities.dashscope_response import Role
+from lazy_import import lazy_module
+# dashscope 延迟到第一次调用模型时才导入，缩短脚本启动时间
+dashscope = lazy_module('dashscope')
 # 从环境变量中，获取 DASHSCOPE_API_KEY
 api_key = os.environ.get('DASHSCOPE_API_KEY')
 dashscope.api_key = api_key
@@ -13,8 +13,15 @@
 import json
 import os
 import random
-import dashscope
-from dashscope.api_entities.dashscope_response import Role
+import time
+from lazy_import import lazy_module
+# dashscope 延迟到第一次调用模型时才导入，缩短脚本启动时间
+dashscope = lazy_module('dashscope')
+from tool_prefetch import ToolPrefetcher, load_prefetch_rules
+from trace_recorder import TraceRecorder
+from semantic_cache import SemanticCache
+from metric_triage import MetricTriage
+from prompt_cache import PromptPrefix, CacheStats
 
 # 从环境变量中，获取 DASHSCOPE_API_KEY
 api_key = os.environ.get('DASHSCOPE_API_KEY')
@@ -45,12 +52,14 @@ def get_response(messages):
     调用大模型API，支持工具调用
     """
     try:
+        start = time.perf_counter()
         response = dashscope.Generation.call(
             model='qwen-turbo',
             messages=messages,
-            tools=tools,
-            result_format='message'  # 将输出设置为message形式
+            result_format='message',  # 将输出设置为message形式
+            **OPS_PROMPT.call_kwargs()  # 规范化后的工具定义，与系统提示词一起构成固定前缀
         )
+        cache_stats.record(response, time.perf_counter() - start)
         return response
     except Exception as e:
         print(f"API调用出错: {str(e)}")
@@ -69,23 +78,94 @@ tools = [
     }
 ]
 
-def run_ops_analysis():
+# 固定前缀：系统提示词和工具定义只在这里规范化一次，之后每次调用逐字节一致；
+# 告警、预筛摘要和工具结果都追加在前缀之后，多轮分析和重复告警都能命中服务端上下文缓存
+OPS_PROMPT = PromptPrefix(
+    "我是运维分析师，用户会告诉我们告警内容。我会基于告警内容，判断当前的异常情况（告警对象、异常模式），并提供分析和处置建议。",
+    tools=tools)
+cache_stats = CacheStats()
+
+# 工具注册表：工具名 -> 本地函数
+TOOL_REGISTRY = {
+    "get_current_status": get_current_status,
+}
+
+# 预取规则文件（不存在时使用默认规则）
+PREFETCH_RULES_FILE = 'prefetch_rules.json'
+
+# 对话轨迹文件（追加写入，可用 trace_recorder.load_traces() 读取并离线回放）
+TRACE_FILE = 'traces/ops_analysis.jsonl'
+
+# 语义缓存快照：只有时间不同的重复告警直接复用之前的分析结论
+SEMANTIC_CACHE_SNAPSHOT = 'cache/semantic_cache_ops'
+
+def run_ops_analysis(query=None, prefetch_mode='inject', recorder=None, semantic_cache=None, triage=None):
     """
     执行运维事件分析流程
+    参数：
+        query: 告警信息，默认使用示例告警
+        prefetch_mode: 工具预取模式
+            'inject' - 第一次调用模型前并行执行预取工具，结果直接注入对话，省掉一次模型往返
+            'serve'  - 与第一次模型调用并行执行预取工具，模型请求时立即返回结果
+            None     - 不预取
+        recorder: 轨迹录制器（TraceRecorder），回放时传入 TracePlayer；为None时不记录
+        semantic_cache: 语义缓存（SemanticCache），命中时直接返回缓存的分析结论
+        triage: 告警预筛器（MetricTriage），指标已恢复或属于抖动的告警直接自动关闭，不调用大模型
     """
     print("=== 运维事件处置系统启动 ===")
     
     # 告警信息
-    query = """告警：数据库连接数超过设定阈值
+    if query is None:
+        query = """告警：数据库连接数超过设定阈值
 时间：2024-08-03 15:30:00
 """
     print(f"收到告警信息：\n{query}")
     
     # 初始化对话
-    messages = [
-        {"role": "system", "content": "我是运维分析师，用户会告诉我们告警内容。我会基于告警内容，判断当前的异常情况（告警对象、异常模式），并提供分析和处置建议。"},
-        {"role": "user", "content": query}
-    ]
+    messages = OPS_PROMPT.build(query)
+    
+    # 录制模式下，所有工具调用都经过录制器
+    tool_registry = TOOL_REGISTRY
+    if recorder:
+        recorder.start_trace("ops_analysis", {"query": query, "prefetch_mode": prefetch_mode})
+        tool_registry = {name: recorder.wrap_tool(name, fn) for name, fn in TOOL_REGISTRY.items()}
+    
+    # 告警预筛：先看当前指标，已恢复或属于抖动的告警直接关闭
+    if triage:
+        status = tool_registry["get_current_status"]()
+        result = triage.triage(query, status)
+        print(f"告警预筛: {result['decision']}（{result['reason']}，耗时 {result['elapsed_us']}μs）")
+        if result['decision'] != 'anomaly':
+            messages.append({"role": "assistant", "content": f"告警已自动关闭：{result['reason']}"})
+            if recorder:
+                recorder.end_trace()
+            return messages
+        # 确认异常：把数值摘要附在告警后面；本次分析中的状态查询都复用这份快照，与摘要保持一致
+        messages[-1]["content"] = f"{query}\n{MetricTriage.summarize(result)}"
+        tool_registry = {**tool_registry, "get_current_status": lambda: status}
+    
+    # 近似重复的告警直接返回缓存的分析结论
+    if semantic_cache:
+        cached_answer = semantic_cache.get('ops', query)
+        if cached_answer is not None:
+            print(f"命中语义缓存，复用分析结论: {cached_answer}")
+            messages.append({"role": "assistant", "content": cached_answer})
+            if recorder:
+                recorder.end_trace()
+            return messages
+    
+    # 根据告警类型启动工具预取
+    prefetcher = None
+    if prefetch_mode:
+        prefetcher = ToolPrefetcher(tool_registry, rules=load_prefetch_rules(PREFETCH_RULES_FILE))
+        prefetched = prefetcher.start(query)
+        print(f"预取工具: {prefetched if prefetched else '无'}")
+        if prefetch_mode == 'inject':
+            injected = prefetcher.build_injected_messages()
+            messages.extend(injected)
+            for msg in injected:
+                if msg['role'] == 'tool':
+                    print(f"预取结果已注入: {msg['name']} -> {msg['content']}")
     
     print("\n=== 开始分析流程 ===")
     
@@ -98,7 +178,7 @@ def run_ops_analysis():
         print(f"\n--- 第{iteration}轮分析 ---")
         
         # 调用模型
-        response = get_response(messages)
+        response = recorder.call_model(get_response, messages) if recorder else get_response(messages)
         if not response or not response.output:
             print("获取响应失败")
             break
@@ -130,9 +210,12 @@ def run_ops_analysis():
                 # 解析参数
                 arguments_json = json.loads(fn_arguments) if fn_arguments else {}
                 
-                # 调用对应的函数
-                if fn_name == 'get_current_status':
-                    tool_response = get_current_status()
+                # 优先使用预取结果，没有时再实时调用对应的函数
+                tool_response = prefetcher.get(fn_name, arguments_json) if prefetcher else None
+                if tool_response is not None:
+                    print("命中预取结果")
+                elif fn_name in tool_registry:
+                    tool_response = tool_registry[fn_name]()
                 
                 # 将工具响应加入对话
                 tool_info = {
@@ -147,12 +230,30 @@ def run_ops_analysis():
             print("无需调用工具，分析完成")
             break
     
+    if prefetcher:
+        print(f"预取命中: {prefetcher.hits} 次，未命中: {prefetcher.misses} 次")
+        prefetcher.shutdown()
+    if recorder:
+        recorder.end_trace()
+    
+    # 缓存最终的分析结论
+    final_message = messages[-1]
+    if semantic_cache and final_message['role'] == 'assistant' and final_message.get('content'):
+        semantic_cache.put('ops', query, final_message['content'])
+    
     print("\n=== 分析流程结束 ===")
     return messages
 
 if __name__ == "__main__":
-    # 执行运维分析
-    result = run_ops_analysis()
+    # 执行运维分析，并把完整对话轨迹追加写入 TRACE_FILE
+    os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    recorder = TraceRecorder(TRACE_FILE)
+    semantic_cache = SemanticCache()
+    semantic_cache.load_snapshot(SEMANTIC_CACHE_SNAPSHOT)
+    triage = MetricTriage()
+    result = run_ops_analysis(recorder=recorder, semantic_cache=semantic_cache, triage=triage)
+    semantic_cache.save_snapshot(SEMANTIC_CACHE_SNAPSHOT)
+    recorder.close()
     
     print("\n=== 最终分析结果 ===")
     for i, msg in enumerate(result):
@@ -160,4 +261,6 @@ if __name__ == "__main__":
             print(f"第{i+1}轮回复: {msg['content']}")
         elif msg['role'] == 'tool':
             print(f"工具调用结果: {msg['content']}")
+    if cache_stats.requests:
+        print(f"\n上下文缓存: {cache_stats.summary()}")
 
@@ -4,9 +4,11 @@
 # In[1]:
 
 
-import dashscope
-from dashscope.api_entities.dashscope_response import Role
+from lazy_import import lazy_module
+# dashscope 延迟到第一次调用模型时才导入，缩短脚本启动时间
+dashscope = lazy_module('dashscope')
 import os
+from sentiment_fastpath import SentimentFastPath, parse_sentiment_label
 # 从环境变量中，获取 DASHSCOPE_API_KEY
 api_key = os.environ.get('DASHSCOPE_API_KEY')
 dashscope.api_key = api_key
@@ -28,3 +30,22 @@ messages = [
 response = get_response(messages)
 print(response.output.choices[0].message.content)
 
+
+# In[2]:
+
+
+# 情感分析：本地分类器高置信度时直接判定，否则交给 deepseek-r1，标签写入共享的标签缓存
+def llm_label(review):
+    messages = [
+        {"role": "system", "content": "你是一名舆情分析师，帮我判断产品口碑的正负向，回复请用一个词语：正向 或者 负向"},
+        {"role": "user", "content": review}
+    ]
+    response = get_response(messages)
+    return parse_sentiment_label(response.output.choices[0].message.content)
+
+fastpath = SentimentFastPath('cache/sentiment_labels.jsonl')
+review = '这款音效特别好 给你意想不到的音质。'
+result, source, confidence = fastpath.classify(review, llm_label, source='deepseek-r1')
+print(f"评论: {review}")
+print(f"情感分析结果: {result}（来源: {'本地分类器' if source == 'local' else '大模型'}，置信度: {confidence:.2f}）")
+
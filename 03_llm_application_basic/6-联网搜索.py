@@ -5,7 +5,9 @@
 
 
 import os
+from pathlib import Path
 from openai import OpenAI
+from local_retrieval import LocalIndex, build_context, answer_locally
 # 从环境变量中，获取 DASHSCOPE_API_KEY
 api_key = os.environ.get('DASHSCOPE_API_KEY')
 
@@ -14,14 +16,61 @@ client = OpenAI(
     api_key=api_key, 
     base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",  # 填写DashScope服务的base_url
 )
-completion = client.chat.completions.create(
-    model="qwen-plus",  # 此处以qwen-plus为例，可按需更换模型名称。模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
-    messages=[
-        {'role': 'system', 'content': 'You are a helpful assistant.'},
-        {'role': 'user', 'content': '中国队在巴黎奥运会获得了多少枚金牌'}],
-    extra_body={
-        "enable_search": True
-    }
-    )
+
+
+# In[2]:
+
+
+# 本地文档索引：首次运行时全量构建，之后只处理新增或修改过的文件
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DOC_DIRS = [ROOT_DIR / '01_ai_concepts' / '知乎', ROOT_DIR / '00_env_settings']
+local_index = LocalIndex('cache/local_index')
+print("本地索引:", local_index.build(DOC_DIRS))
+
+
+def ask(question, k=3):
+    """
+    先检索本地文档，answer_locally 判定文档能回答时把段落注入提示词；否则才开启联网搜索
+    参数：
+        question: 用户问题
+        k: 注入的段落数
+    返回：
+        (completion, 回答来源 'local' / 'web', 检索置信度)
+    """
+    hits, confidence = local_index.search(question, k=k)
+    if answer_locally(hits, confidence):
+        source = 'local'
+        messages = [
+            {'role': 'system', 'content': 'You are a helpful assistant. 请优先根据参考资料回答，并注明引用的编号。'},
+            {'role': 'user', 'content': f"参考资料：\n{build_context(hits)}\n\n问题：{question}"}]
+        extra_body = {}
+    else:
+        source = 'web'
+        messages = [
+            {'role': 'system', 'content': 'You are a helpful assistant.'},
+            {'role': 'user', 'content': question}]
+        extra_body = {"enable_search": True}
+    completion = client.chat.completions.create(
+        model="qwen-plus",  # 此处以qwen-plus为例，可按需更换模型名称。模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
+        messages=messages,
+        extra_body=extra_body
+        )
+    return completion, source, confidence
+
+
+# In[3]:
+
+
+# 本地文档中没有答案，置信度低，回退到联网搜索
+completion, source, confidence = ask('中国队在巴黎奥运会获得了多少枚金牌')
+print(f"回答来源: {source}（检索置信度 {confidence}）")
 print(completion.model_dump_json())
 
+
+# In[4]:
+
+
+# 本地文档可以回答，直接注入检索段落，不开启联网搜索
+completion, source, confidence = ask('什么是混合精度训练')
+print(f"回答来源: {source}（检索置信度 {confidence}）")
+print(completion.choices[0].message.content)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+城市地名索引（Aho-Corasick 多模式匹配）
+get_current_weather 原先用 `'大连' in location or 'Dalian' in location` 这样的子串判断逐个城市比对，
+城市越多越慢，也识别不了别名（大连市、dalian、Xi'an……）。
+
+CityGazetteer 在启动时把所有城市的中文名、拼音和英文别名建成一个 Aho-Corasick 自动机，
+每个别名映射到规范的城市ID:
+1. 一次扫描文本即可找出其中出现的所有城市，耗时只与文本长度和命中数有关，与城市数量无关
+2. 多个匹配重叠时取最左、最长的一个（如 "上海口岸" 识别为上海而不是海口）
+3. 拉丁字母别名不区分大小写、忽略撇号（Xi'an = xian），并要求前后不是字母，避免 "xian" 命中 "xiangtan"
+"""
+
+from collections import deque
+
+# 城市表：规范ID -> (中文名, 别名列表)；别名包含拼音和常见英文写法
+DEFAULT_CITIES = {
+    'beijing': ('北京', ['北京市', 'beijing', 'peking']),
+    'shanghai': ('上海', ['上海市', 'shanghai']),
+    'guangzhou': ('广州', ['广州市', 'guangzhou', 'canton']),
+    'shenzhen': ('深圳', ['深圳市', 'shenzhen']),
+    'tianjin': ('天津', ['天津市', 'tianjin']),
+    'chongqing': ('重庆', ['重庆市', 'chongqing', 'chungking']),
+    'dalian': ('大连', ['大连市', 'dalian']),
+    'hangzhou': ('杭州', ['杭州市', 'hangzhou']),
+    'nanjing': ('南京', ['南京市', 'nanjing', 'nanking']),
+    'chengdu': ('成都', ['成都市', 'chengdu']),
+    'wuhan': ('武汉', ['武汉市', 'wuhan']),
+    'xian': ('西安', ['西安市', 'xian']),
+    'suzhou': ('苏州', ['苏州市', 'suzhou']),
+    'qingdao': ('青岛', ['青岛市', 'qingdao', 'tsingtao']),
+    'xiamen': ('厦门', ['厦门市', 'xiamen', 'amoy']),
+    'shenyang': ('沈阳', ['沈阳市', 'shenyang']),
+    'harbin': ('哈尔滨', ['哈尔滨市', 'haerbin', 'harbin']),
+    'changsha': ('长沙', ['长沙市', 'changsha']),
+    'zhengzhou': ('郑州', ['郑州市', 'zhengzhou']),
+    'jinan': ('济南', ['济南市', 'jinan']),
+    'kunming': ('昆明', ['昆明市', 'kunming']),
+    'fuzhou': ('福州', ['福州市', 'fuzhou']),
+    'hefei': ('合肥', ['合肥市', 'hefei']),
+    'nanchang': ('南昌', ['南昌市', 'nanchang']),
+    'changchun': ('长春', ['长春市', 'changchun']),
+    'shijiazhuang': ('石家庄', ['石家庄市', 'shijiazhuang']),
+    'taiyuan': ('太原', ['太原市', 'taiyuan']),
+    'nanning': ('南宁', ['南宁市', 'nanning']),
+    'guiyang': ('贵阳', ['贵阳市', 'guiyang']),
+    'lanzhou': ('兰州', ['兰州市', 'lanzhou']),
+    'urumqi': ('乌鲁木齐', ['乌鲁木齐市', 'wulumuqi', 'urumqi']),
+    'lhasa': ('拉萨', ['拉萨市', 'lasa', 'lhasa']),
+    'haikou': ('海口', ['海口市', 'haikou']),
+    'sanya': ('三亚', ['三亚市', 'sanya']),
+    'ningbo': ('宁波', ['宁波市', 'ningbo']),
+    'wuxi': ('无锡', ['无锡市', 'wuxi']),
+    'hongkong': ('香港', ['hong kong', 'hongkong', 'xianggang']),
+    'macau': ('澳门', ['macau', 'macao', 'aomen']),
+    'taipei': ('台北', ['台北市', 'taipei', 'taibei']),
+}
+
+
+def _normalize(text):
+    """小写化并去掉撇号（Xi'an -> xian）"""
+    return text.lower().replace("'", '').replace('’', '')
+
+
+def _is_latin(ch):
+    return 'a' <= ch <= 'z'
+
+
+class CityGazetteer:
+    """
+    城市地名索引
+    参数：
+        cities: {城市ID: (中文名, 别名列表)}，默认使用 DEFAULT_CITIES
+    """
+
+    def __init__(self, cities=None):
+        self.cities = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for city_id, (name, aliases) in (cities or DEFAULT_CITIES).items():
+            self.cities[city_id] = {'id': city_id, 'name': name, 'aliases': list(aliases)}
+            for alias in [name] + list(aliases):
+                self._insert(_normalize(alias), city_id)
+        self._build_failure_links()
+
+    def _insert(self, alias, city_id):
+        node = 0
+        for ch in alias:
+            if ch not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][ch] = len(self._goto) - 1
+            node = self._goto[node][ch]
+        self._output[node].append((len(alias), city_id))
+
+    def _build_failure_links(self):
+        """按层 BFS 计算失败指针，并把失败指针所指节点的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _scan(self, text):
+        """返回所有匹配 (起点, 终点, 城市ID)，终点不含"""
+        matches = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, city_id in self._output[node]:
+                start, end = i + 1 - length, i + 1
+                # 拉丁字母别名要求前后不是字母（整词匹配）
+                if _is_latin(text[start]) and (
+                        (start > 0 and _is_latin(text[start - 1])) or (end < len(text) and _is_latin(text[end]))):
+                    continue
+                matches.append((start, end, city_id))
+        return matches
+
+    def resolve_all(self, text):
+        """
+        找出文本中提到的所有城市（按出现顺序去重）
+        参数：
+            text: 地点描述，如 "上海和Shenzhen"、"大连市"
+        返回：
+            list: 城市记录列表，每项包含 id、name 和命中的别名 matched（小写化后）
+        """
+        if not text:
+            return []
+        normalized = _normalize(text)
+        # 重叠的匹配取最左最长
+        matches = sorted(self._scan(normalized), key=lambda m: (m[0], -(m[1] - m[0])))
+        results, seen, covered_until = [], set(), 0
+        for start, end, city_id in matches:
+            if start < covered_until:
+                continue
+            covered_until = end
+            if city_id not in seen:
+                seen.add(city_id)
+                results.append({'id': city_id, 'name': self.cities[city_id]['name'], 'matched': normalized[start:end]})
+        return results
+
+    def resolve(self, text):
+        """返回文本中第一个城市的记录，没有时返回 None"""
+        results = self.resolve_all(text)
+        return results[0] if results else None
+
+    def __len__(self):
+        return len(self.cities)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+重量级依赖的延迟导入
+各个脚本只在真正调用大模型时才用到 dashscope，但模块顶部的 import 会在启动时
+把 dashscope 及其依赖（requests、aiohttp 等）全部加载一遍，短任务的大部分时间花在这里。
+
+lazy_module() 返回一个代理对象，第一次访问属性时才真正导入模块:
+1. 读取属性（如 dashscope.Generation）时导入，之后直接转发，不再有额外开销
+2. 导入前设置的属性（如 dashscope.api_key = ...）先暂存，导入时再写回真实模块，
+   因此脚本顶部的 api_key 配置不会触发导入
+3. 同一个模块名只有一个代理：脚本和 model_router 等公共模块拿到的是同一个对象，
+   脚本在代理上设置的 api_key 无论由谁触发导入都会生效
+
+用法:
+    from lazy_import import lazy_module
+    dashscope = lazy_module('dashscope')
+    dashscope.api_key = api_key                 # 不触发导入
+    dashscope.Generation.call(...)              # 第一次调用时导入
+
+用 python -X importtime 脚本名.py 可以对比启动阶段的导入耗时。
+"""
+
+import importlib
+import threading
+
+_proxies = {}
+_proxies_lock = threading.Lock()
+
+
+class LazyModule:
+    """
+    模块代理：第一次访问属性时导入真实模块
+    参数：
+        name: 模块名，如 'dashscope'
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+        object.__setattr__(self, '_pending', {})
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                module = importlib.import_module(self._name)
+                # 把导入前暂存的属性写回真实模块
+                for key, value in self._pending.items():
+                    setattr(module, key, value)
+                self._pending.clear()
+                object.__setattr__(self, '_module', module)
+        return self._module
+
+    @property
+    def is_loaded(self):
+        """真实模块是否已经导入"""
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        pending = object.__getattribute__(self, '_pending')
+        if self._module is None and attr in pending:
+            return pending[attr]
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._pending[attr] = value
+                    return
+        setattr(self._module, attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """
+    返回延迟导入的模块代理（同名模块共用一个代理）
+    参数：
+        name: 模块名
+    返回：
+        LazyModule: 第一次访问属性时才导入的模块代理
+    """
+    with _proxies_lock:
+        if name not in _proxies:
+            _proxies[name] = LazyModule(name)
+        return _proxies[name]
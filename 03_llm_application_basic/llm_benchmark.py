@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+准确率 - 延迟基准测试（情感分析、表格提取）
+1-情感分析-Qwen.py 用 deepseek-v3，5-情感分析-Deepseek-阿里代理.py 用 deepseek-r1，路由器又优先 qwen-turbo，
+但没有任何地方把准确率和速度记录在一起，无法判断换模型是赚是亏。
+
+本模块在带标签、带版本的数据集上运行各个模型和提示词方式，输出一张 Pareto 表:
+1. 数据集：benchmarks/datasets/ 下的 JSONL 文件，manifest.json 记录每个版本的文件和 sha256，
+   文件内容与登记的哈希不一致时拒绝运行，保证不同时间的结果可以比较
+2. 提示词方式:
+    single    每次请求一条记录
+    packed    一次请求打包多条记录（仅情感分析），按编号返回 JSON 数组
+    streamed  每次请求一条记录，流式输出，额外记录首 token 延迟
+3. 指标：准确率 / F1（情感分析为宏平均F1，表格提取为单元格级F1）、每条记录的延迟 p50/p99、
+   请求延迟 p50、吞吐量（条/秒）、首 token 延迟、每条记录的 token 数和成本（价格取自 model_router.MODEL_CATALOG）。
+   packed 一次请求处理 pack_size 条记录，请求延迟不能和 single/streamed 直接比较：
+   每条记录的延迟 = 请求延迟 / 该请求的记录数，吞吐量 = 记录数 / 全部请求耗时之和（逐个请求串行发送）
+4. Pareto 表：F1 越高、每条记录的 p50 延迟越低、成本越低越好，不被其他组合同时在三项上占优的组合标记为 ★
+
+录制与回放：每次真实调用的回复文本、耗时和 usage 追加写入 benchmarks/recordings/<数据集>.<版本>.jsonl，
+按 (模型, 方式, 记录ID, 提示词哈希) 索引；离线模式（默认）只读录制内容，不需要网络，结果可复现。
+提示词改动后哈希随之变化，旧录制不会被误用。
+
+模拟录制：SimulatedModel 是一个离线的 call_fn，按数据集标签和各模型设定的错误率、首 token 延迟、输出速度
+确定性地生成回复，在虚拟时钟上计时（不真实等待）。--simulate 用它录制到 benchmarks/recordings/simulated/，
+仓库里提交了一份 v1 的模拟录制，没有真实录制时默认回放它，用来演示和检查整个流程；
+表中数字来自模拟参数，不代表真实模型的表现，比较模型要用 --record 录制真实结果。
+
+命令行:
+    python llm_benchmark.py sentiment --record            # 真实调用并录制（需要 DASHSCOPE_API_KEY）
+    python llm_benchmark.py sentiment                     # 离线回放录制内容，输出 Pareto 表
+    python llm_benchmark.py sentiment --simulate          # 用模拟模型重新生成模拟录制
+    python llm_benchmark.py table_extraction --models qwen-turbo,qwen-max --variants single,streamed
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from model_router import MODEL_CATALOG, dashscope_call
+from sentiment_fastpath import LABELS, parse_sentiment_label
+
+BENCHMARK_DIR = Path(__file__).resolve().parent / 'benchmarks'
+DATASET_DIR = BENCHMARK_DIR / 'datasets'
+RECORDING_DIR = BENCHMARK_DIR / 'recordings'
+SIMULATED_RECORDING_DIR = RECORDING_DIR / 'simulated'
+
+SENTIMENT_SYSTEM = "你是一名舆情分析师，帮我判断产品口碑的正负向，回复请用一个词语：正向 或者 负向"
+SENTIMENT_PACKED_SYSTEM = ("你是一名舆情分析师，帮我判断下面每条产品评论的正负向。"
+                           "只返回一个JSON数组，按编号顺序给出每条评论的结果，每个元素为 \"正向\" 或 \"负向\"，不要包含任何额外文本。")
+TABLE_SYSTEM = ("这是一段从文档中复制出来的表格文本，帮我提取里面的内容，输出JSON格式："
+                "一个JSON数组，每行一个对象，键使用表头原文，值使用单元格原文（字符串），不要包含表格标题和任何额外文本。")
+
+# 任务配置：数据集、默认模型和适用的提示词方式
+TASKS = {
+    'sentiment': {
+        'dataset': 'sentiment_reviews',
+        'models': ['qwen-turbo', 'qwen-plus', 'deepseek-v3', 'deepseek-r1'],
+        'variants': ['single', 'packed', 'streamed'],
+    },
+    'table_extraction': {
+        'dataset': 'table_extraction',
+        'models': ['qwen-turbo', 'qwen-plus', 'qwen-max'],
+        'variants': ['single', 'streamed'],
+    },
+}
+
+
+# ==================== 数据集 ====================
+
+def _sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def load_dataset(name, version=None):
+    """
+    读取登记过的数据集
+    参数：
+        name: 数据集名，如 'sentiment_reviews'
+        version: 版本号，如 'v1'；为 None 时使用 manifest 中的最新版本
+    返回：
+        (版本号, 记录列表)
+    """
+    manifest = json.loads((DATASET_DIR / 'manifest.json').read_text(encoding='utf-8'))
+    versions = manifest[name]
+    version = version or max(versions, key=lambda v: int(v.lstrip('v')))
+    entry = versions[version]
+    path = DATASET_DIR / entry['file']
+    if _sha256(path) != entry['sha256']:
+        raise ValueError(f"数据集 {name} {version} 的内容与 manifest 登记的哈希不一致，修改数据集请登记新版本")
+    items = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+    return version, items
+
+
+# ==================== 请求构造与解析 ====================
+
+def build_requests(task, variant, items, pack_size=10):
+    """
+    把数据集记录组织成请求
+    参数：
+        task: 任务名
+        variant: 'single' / 'packed' / 'streamed'
+        items: 数据集记录
+        pack_size: packed 方式每次请求的记录数
+    返回：
+        [(记录ID列表, messages), ...]
+    """
+    if task == 'sentiment' and variant == 'packed':
+        requests = []
+        for start in range(0, len(items), pack_size):
+            batch = items[start:start + pack_size]
+            numbered = "\n".join(f"{i}. {item['review']}" for i, item in enumerate(batch, start=1))
+            requests.append(([item['id'] for item in batch], [
+                {"role": "system", "content": SENTIMENT_PACKED_SYSTEM},
+                {"role": "user", "content": numbered}]))
+        return requests
+    if task == 'sentiment':
+        return [([item['id']], [{"role": "system", "content": SENTIMENT_SYSTEM},
+                                {"role": "user", "content": item['review']}]) for item in items]
+    return [([item['id']], [{"role": "system", "content": TABLE_SYSTEM},
+                            {"role": "user", "content": item['text']}]) for item in items]
+
+
+def prompt_hash(messages):
+    """请求内容的哈希，作为录制索引的一部分"""
+    return hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _extract_json(text):
+    """从回复中截取第一个 JSON 数组或对象（兼容 ```json 代码块）"""
+    if not text:
+        return None
+    starts = [i for i in (text.find('['), text.find('{')) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = text.rfind(']' if text[start] == '[' else '}') + 1
+    try:
+        return json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_response(task, variant, text, n_items):
+    """
+    把回复文本解析为每条记录的预测
+    返回：
+        长度为 n_items 的预测列表，无法解析的位置为 None
+    """
+    if task == 'sentiment' and variant == 'packed':
+        labels = _extract_json(text)
+        if not isinstance(labels, list):
+            return [None] * n_items
+        labels = [parse_sentiment_label(str(label)) for label in labels[:n_items]]
+        return labels + [None] * (n_items - len(labels))
+    if task == 'sentiment':
+        return [parse_sentiment_label(text)]
+    rows = _extract_json(text)
+    if isinstance(rows, dict):
+        # 兼容 {"表格": [...]} 这样包了一层的输出
+        rows = next((value for value in rows.values() if isinstance(value, list)), [rows])
+    return [rows if isinstance(rows, list) else None]
+
+
+# ==================== 评分 ====================
+
+def _normalize_cell(value):
+    return re.sub(r'\s+', '', str(value)).lower()
+
+
+def _table_cells(rows):
+    """表格的单元格多重集合：(表头, 取值)"""
+    cells = {}
+    for row in rows or []:
+        if not isinstance(row, dict):
+            continue
+        for column, value in row.items():
+            key = (_normalize_cell(column), _normalize_cell(value))
+            cells[key] = cells.get(key, 0) + 1
+    return cells
+
+
+def score_sentiment(items, predictions):
+    """准确率和宏平均F1（无法解析的预测计为错误）"""
+    gold = [item['label'] for item in items]
+    accuracy = float(np.mean([p == g for p, g in zip(predictions, gold)]))
+    f1s = []
+    for label in LABELS:
+        tp = sum(p == label and g == label for p, g in zip(predictions, gold))
+        fp = sum(p == label and g != label for p, g in zip(predictions, gold))
+        fn = sum(p != label and g == label for p, g in zip(predictions, gold))
+        f1s.append(2 * tp / (2 * tp + fp + fn) if tp else 0.0)
+    return {'accuracy': accuracy, 'f1': float(np.mean(f1s))}
+
+
+def score_tables(items, predictions):
+    """单元格级F1（所有表格合计）和整表完全正确的比例"""
+    tp = fp = fn = exact = 0
+    for item, rows in zip(items, predictions):
+        gold, pred = _table_cells(item['rows']), _table_cells(rows)
+        matched = sum(min(count, pred.get(cell, 0)) for cell, count in gold.items())
+        tp += matched
+        fp += sum(pred.values()) - matched
+        fn += sum(gold.values()) - matched
+        exact += gold == pred
+    f1 = 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+    return {'accuracy': exact / len(items) if items else 0.0, 'f1': f1}
+
+
+SCORERS = {'sentiment': score_sentiment, 'table_extraction': score_tables}
+
+
+# ==================== 录制与调用 ====================
+
+class ResponseStore:
+    """
+    录制的回复（追加写 JSONL），同一个索引以最后一次录制为准
+    参数：
+        path: 录制文件路径
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = {}
+        if self.path.exists():
+            for line in self.path.read_text(encoding='utf-8').splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    self.records[self._key(record['model'], record['variant'], record['item_ids'],
+                                           record['prompt_hash'])] = record
+
+    @staticmethod
+    def _key(model, variant, item_ids, digest):
+        return model, variant, tuple(item_ids), digest
+
+    def get(self, model, variant, item_ids, digest):
+        return self.records.get(self._key(model, variant, item_ids, digest))
+
+    def add(self, record):
+        self.records[self._key(record['model'], record['variant'], record['item_ids'], record['prompt_hash'])] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def call_live(model, messages, stream=False, call_fn=dashscope_call, clock=time.perf_counter):
+    """
+    真实调用一次模型并计时
+    参数：
+        clock: 计时函数，默认 time.perf_counter；模拟模型传入自己的虚拟时钟
+    返回：
+        dict: text、latency_s、ttft_s（仅流式）、input_tokens、output_tokens
+    """
+    start = clock()
+    if not stream:
+        response = call_fn(model, messages)
+        if getattr(response, 'status_code', 200) != 200:
+            raise RuntimeError(f"{model} 调用失败，状态码: {response.status_code}")
+        text = response.output.choices[0].message.content
+        usage = response.usage
+        return {'text': text, 'latency_s': clock() - start, 'ttft_s': None,
+                'input_tokens': usage.get('input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)}
+
+    parts, ttft_s, usage = [], None, {}
+    for chunk in call_fn(model, messages, stream=True, incremental_output=True):
+        if getattr(chunk, 'status_code', 200) != 200:
+            raise RuntimeError(f"{model} 调用失败，状态码: {chunk.status_code}")
+        content = chunk.output.choices[0].message.content
+        if content and ttft_s is None:
+            ttft_s = clock() - start
+        parts.append(content or '')
+        usage = chunk.usage or usage
+    return {'text': ''.join(parts), 'latency_s': clock() - start, 'ttft_s': ttft_s,
+            'input_tokens': usage.get('input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)}
+
+
+# ==================== 模拟模型 ====================
+
+# 模拟参数：错误率、首 token 延迟（秒）、输出速度（token/秒）、每千个输入 token 的预填充耗时（秒）
+SIMULATED_PROFILES = {
+    'qwen-turbo':  {'error_rate': 0.10, 'ttft_s': 0.35, 'tokens_per_s': 90, 'prefill_s_per_1k': 0.05},
+    'qwen-plus':   {'error_rate': 0.06, 'ttft_s': 0.6,  'tokens_per_s': 60, 'prefill_s_per_1k': 0.1},
+    'qwen-max':    {'error_rate': 0.04, 'ttft_s': 1.2,  'tokens_per_s': 35, 'prefill_s_per_1k': 0.2},
+    'deepseek-v3': {'error_rate': 0.05, 'ttft_s': 1.0,  'tokens_per_s': 40, 'prefill_s_per_1k': 0.2},
+    'deepseek-r1': {'error_rate': 0.03, 'ttft_s': 8.0,  'tokens_per_s': 30, 'prefill_s_per_1k': 0.3},
+}
+
+
+class SimulatedModel:
+    """
+    模拟的模型调用函数（与 dashscope_call 的调用方式相同），用于离线演示基准测试流程
+    回复由数据集标签生成，按 (模型, 输入) 的哈希确定性地以 error_rate 的概率出错
+    （情感分析翻转标签，表格提取丢掉最后一行）；耗时在虚拟时钟上推进，不真实等待
+    参数：
+        items: 数据集记录（情感分析的 review/label，或表格提取的 text/rows）
+        profiles: 各模型的模拟参数，默认 SIMULATED_PROFILES
+    """
+
+    def __init__(self, items, profiles=None):
+        self.profiles = profiles or SIMULATED_PROFILES
+        self.labels = {item['review']: item['label'] for item in items if 'review' in item}
+        self.tables = {item['text']: item['rows'] for item in items if 'text' in item}
+        self.now = 0.0
+
+    def clock(self):
+        """虚拟时钟，传给 call_live 计时"""
+        return self.now
+
+    @staticmethod
+    def _draw(*parts):
+        """由输入确定的 [0, 1) 均匀数"""
+        digest = hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) / 16 ** 8
+
+    def _label(self, model, review, variant):
+        label = self.labels[review]
+        if self._draw(model, variant, review) < self.profiles[model]['error_rate']:
+            label = LABELS[1 - LABELS.index(label)]
+        return label
+
+    def _answer(self, model, system, user):
+        if system == SENTIMENT_PACKED_SYSTEM:
+            reviews = [re.sub(r'^\d+\.\s*', '', line) for line in user.splitlines()]
+            return json.dumps([self._label(model, review, 'packed') for review in reviews], ensure_ascii=False)
+        if system == SENTIMENT_SYSTEM:
+            return self._label(model, user, 'single')
+        rows = self.tables[user]
+        if self._draw(model, 'table', user) < self.profiles[model]['error_rate'] * 3:
+            rows = rows[:-1]
+        return json.dumps(rows, ensure_ascii=False)
+
+    def __call__(self, model, messages, stream=False, **kwargs):
+        profile = self.profiles[model]
+        text = self._answer(model, messages[0]['content'], messages[-1]['content'])
+        # 中文文本约每字一个 token
+        usage = {'input_tokens': sum(len(message['content']) for message in messages), 'output_tokens': len(text)}
+        first_token_s = profile['ttft_s'] + usage['input_tokens'] / 1000 * profile['prefill_s_per_1k']
+
+        def response(content, chunk_usage):
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(status_code=200, usage=chunk_usage,
+                                   output=SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+
+        if not stream:
+            self.now += first_token_s + usage['output_tokens'] / profile['tokens_per_s']
+            return response(text, usage)
+
+        def chunks(step=8):
+            self.now += first_token_s
+            for start in range(0, len(text), step):
+                piece = text[start:start + step]
+                self.now += len(piece) / profile['tokens_per_s']
+                yield response(piece, usage if start + step >= len(text) else None)
+        return chunks()
+
+
+# ==================== 基准测试 ====================
+
+def run_benchmark(task, models=None, variants=None, version=None, record=False, pack_size=10, call_fn=dashscope_call,
+                  clock=time.perf_counter, recording_dir=RECORDING_DIR):
+    """
+    运行一个任务的全部 (模型, 方式) 组合
+    参数：
+        task: 'sentiment' 或 'table_extraction'
+        models / variants: 默认使用 TASKS 中的配置
+        version: 数据集版本，默认最新
+        record: 为 True 时对没有录制的请求真实调用并录制；为 False 时只回放（离线）
+        pack_size: packed 方式每次请求的记录数
+        call_fn: 模型调用函数，默认 model_router.dashscope_call
+        clock: 计时函数，默认 time.perf_counter
+        recording_dir: 录制文件目录，模拟录制使用 SIMULATED_RECORDING_DIR
+    返回：
+        list: 每个组合一行结果
+    """
+    config = TASKS[task]
+    version, items = load_dataset(config['dataset'], version)
+    items_by_id = {item['id']: item for item in items}
+    store = ResponseStore(Path(recording_dir) / f"{config['dataset']}.{version}.jsonl")
+
+    rows = []
+    for model in models or config['models']:
+        for variant in variants or config['variants']:
+            if variant not in config['variants']:
+                continue
+            predictions, request_latencies, item_latencies, ttfts, tokens, cost, missing = {}, [], [], [], 0, 0.0, 0
+            for item_ids, messages in build_requests(task, variant, items, pack_size):
+                digest = prompt_hash(messages)
+                recorded = store.get(model, variant, item_ids, digest)
+                if recorded is None and record:
+                    recorded = {'model': model, 'variant': variant, 'item_ids': item_ids, 'prompt_hash': digest,
+                                **call_live(model, messages, stream=variant == 'streamed', call_fn=call_fn, clock=clock),
+                                'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+                    store.add(recorded)
+                if recorded is None:
+                    missing += len(item_ids)
+                    continue
+                for item_id, prediction in zip(item_ids, parse_response(task, variant, recorded['text'], len(item_ids))):
+                    predictions[item_id] = prediction
+                # packed 一次请求处理多条记录：请求耗时均摊到每条记录上，才能和逐条请求的方式比较
+                request_latencies.append(recorded['latency_s'])
+                item_latencies.extend([recorded['latency_s'] / len(item_ids)] * len(item_ids))
+                if recorded.get('ttft_s') is not None:
+                    ttfts.append(recorded['ttft_s'])
+                tokens += recorded['input_tokens'] + recorded['output_tokens']
+                price = MODEL_CATALOG.get(model, {'input_price': 0.0, 'output_price': 0.0})
+                cost += (recorded['input_tokens'] * price['input_price'] +
+                         recorded['output_tokens'] * price['output_price']) / 1000
+
+            if not predictions:
+                continue
+            scored = [items_by_id[item_id] for item_id in predictions]
+            metrics = SCORERS[task](scored, list(predictions.values()))
+            rows.append({
+                'model': model,
+                'variant': variant,
+                'n': len(predictions),
+                'missing': missing,
+                'accuracy': round(metrics['accuracy'], 4),
+                'f1': round(metrics['f1'], 4),
+                'item_p50_s': round(float(np.percentile(item_latencies, 50)), 3),
+                'item_p99_s': round(float(np.percentile(item_latencies, 99)), 3),
+                'request_p50_s': round(float(np.percentile(request_latencies, 50)), 3),
+                'items_per_s': round(len(item_latencies) / sum(request_latencies), 2) if sum(request_latencies) else None,
+                'ttft_p50_s': round(float(np.percentile(ttfts, 50)), 3) if ttfts else None,
+                'tokens_per_item': round(tokens / len(predictions), 1),
+                'cost_per_1k_items': round(cost / len(predictions) * 1000, 4),
+            })
+    mark_pareto(rows)
+    return rows
+
+
+def mark_pareto(rows):
+    """标记 Pareto 最优的组合：没有其他组合在 F1、每条记录的 p50 延迟、成本上同时不差且至少一项更好"""
+    def objectives(row):
+        return -row['f1'], row['item_p50_s'], row['cost_per_1k_items']
+
+    for row in rows:
+        mine = objectives(row)
+        row['pareto'] = not any(
+            all(o <= m for o, m in zip(objectives(other), mine)) and objectives(other) != mine
+            for other in rows if other is not row)
+    return rows
+
+
+def format_table(rows):
+    """按 F1 从高到低输出 Pareto 表（p50/p99 为每条记录的延迟，req50 为请求延迟，条/秒为串行吞吐量）"""
+    header = (f"{'':2}{'model':<13}{'variant':<10}{'n':>4}{'acc':>8}{'F1':>8}{'p50(s)':>9}{'p99(s)':>9}"
+              f"{'req50':>9}{'条/秒':>8}{'ttft50':>9}{'tok/item':>10}{'元/千条':>10}")
+    lines = [header, '-' * len(header)]
+    for row in sorted(rows, key=lambda r: (-r['f1'], r['item_p50_s'])):
+        ttft = f"{row['ttft_p50_s']:.3f}" if row['ttft_p50_s'] is not None else '-'
+        throughput = f"{row['items_per_s']:.2f}" if row['items_per_s'] is not None else '-'
+        lines.append(f"{'★' if row['pareto'] else '':2}{row['model']:<13}{row['variant']:<10}{row['n']:>4}"
+                     f"{row['accuracy']:>8.3f}{row['f1']:>8.3f}{row['item_p50_s']:>9.3f}{row['item_p99_s']:>9.3f}"
+                     f"{row['request_p50_s']:>9.3f}{throughput:>8}{ttft:>9}{row['tokens_per_item']:>10}"
+                     f"{row['cost_per_1k_items']:>10.4f}")
+        if row['missing']:
+            lines[-1] += f"  （{row['missing']} 条无录制）"
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='准确率 - 延迟基准测试')
+    parser.add_argument('task', choices=sorted(TASKS))
+    parser.add_argument('--models', default='', help='模型列表，逗号分隔，默认使用任务配置')
+    parser.add_argument('--variants', default='', help='提示词方式，逗号分隔：single,packed,streamed')
+    parser.add_argument('--version', default=None, help='数据集版本，默认最新')
+    parser.add_argument('--record', action='store_true', help='对没有录制的请求真实调用并录制（需要网络）')
+    parser.add_argument('--simulate', action='store_true',
+                        help='用模拟模型录制到 benchmarks/recordings/simulated/（离线，结果不代表真实模型）')
+    parser.add_argument('--pack-size', type=int, default=10, help='packed 方式每次请求的记录数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        import os
+        import dashscope
+        dashscope.api_key = os.environ.get('DASHSCOPE_API_KEY')
+    options = dict(models=[m for m in args.models.split(',') if m] or None,
+                   variants=[v for v in args.variants.split(',') if v] or None,
+                   version=args.version, pack_size=args.pack_size)
+    if args.simulate:
+        simulated = SimulatedModel(load_dataset(TASKS[args.task]['dataset'], args.version)[1])
+        rows = run_benchmark(args.task, record=True, call_fn=simulated, clock=simulated.clock,
+                             recording_dir=SIMULATED_RECORDING_DIR, **options)
+    else:
+        rows = run_benchmark(args.task, record=args.record, **options)
+        if not rows and not args.record:
+            rows = run_benchmark(args.task, recording_dir=SIMULATED_RECORDING_DIR, **options)
+            if rows:
+                print("没有真实录制，回放模拟录制（benchmarks/recordings/simulated/）：只用来演示流程，"
+                      "数字来自模拟参数，不代表真实模型；加 --record 录制真实结果", file=sys.stderr)
+    if not rows:
+        print("没有可用的录制结果，请先加 --record 运行一次", file=sys.stderr)
+        return 1
+    print(json.dumps(rows, ensure_ascii=False, indent=2) if args.json else format_table(rows))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+本地知识检索（联网搜索之前的本地通道）
+6-联网搜索.py 的每个问题都开启 enable_search 联网搜索，但很多问题在项目自带的文档
+（01_ai_concepts/知乎、00_env_settings 下的 Markdown 笔记）里就有答案，联网搜索既慢又贵。
+LocalIndex 先在本地文档中检索，置信度足够时把段落注入提示词，不够时才回退到联网搜索:
+1. 分块：按 Markdown 标题切节，过长的节再按固定长度滑窗切分（相邻块有重叠）
+2. BM25：英文/数字按词、中文按相邻两字切词，倒排表以 CSR 数组保存
+3. 向量：默认使用 semantic_cache.HashingEmbedder，可通过 embed_fn 换成真正的嵌入模型
+4. 混合打分：归一化的 BM25 分数与余弦相似度加权求和
+5. 置信度：最佳段落对查询词的覆盖率（按 IDF 加权）与余弦相似度的平均值
+6. 本地回答的条件（answer_locally）：置信度达到 CONFIDENCE_THRESHOLD，且最佳段落的 BM25 原始分数达到 MIN_BM25。
+   只看置信度时，"训练一个模型需要多少数据"这类与文档共用"训练""模型""数据"等常见词的文档外问题
+   置信度也能到 0.28；两个阈值由 calibrate() 在登记过的校准问题集
+   （benchmarks/datasets/retrieval_queries，文档内外各20条）上选出：不放过任何文档外问题，
+   在此前提下文档内问题的召回尽量高。文档或切词方式变化后重新运行 python local_retrieval.py calibrate
+
+索引保存在 index_dir 下，manifest.json 记录每个文件的修改时间、大小和内容哈希，
+重建时未变化的文件直接复用原有分块和向量，只对新增或修改过的文件重新分块、向量化。
+向量矩阵和倒排表保存为 .npy，加载时以 mmap_mode='r' 只读映射，多个进程共享同一份页缓存。
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from semantic_cache import HashingEmbedder
+
+# 本地回答的阈值，来自 calibrate() 在 retrieval_queries v1 上的结果（项目文档，272 个段落）：
+# 文档外问题置信度最高 0.310（"帮我写一首关于秋天的诗"），校准边界为置信度 0.312、BM25 9.35，
+# 文档内召回 75%；这里把置信度取整到 0.32 多留一点余量（召回 70%），BM25 下限取 9.0
+CONFIDENCE_THRESHOLD = 0.32
+MIN_BM25 = 9.0
+
+_HEADING = re.compile(r'^#{1,6}\s+(.+?)\s*#*\s*$', re.M)
+_LATIN_TOKEN = re.compile(r'[a-z0-9]+(?:[._-][a-z0-9]+)*')
+_CJK_RUN = re.compile(r'[一-鿿]+')
+
+
+def tokenize(text):
+    """
+    BM25 切词：英文/数字按词，中文按相邻两个字（单字成段时保留单字）
+    参数：
+        text: 文本
+    返回：
+        词列表
+    """
+    text = text.lower()
+    tokens = _LATIN_TOKEN.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def chunk_markdown(text, max_chars=500, overlap=100):
+    """
+    把 Markdown 文本切分为检索段落
+    参数：
+        text: Markdown 全文
+        max_chars: 每个段落的最大字符数
+        overlap: 长段落滑窗切分时相邻段落的重叠字符数
+    返回：
+        [(所属标题, 段落文本), ...]
+    """
+    # 按标题切节，标题之前的内容归入空标题
+    sections = []
+    positions = [(m.start(), m.group(1)) for m in _HEADING.finditer(text)]
+    starts = [0] + [pos for pos, _ in positions]
+    headings = [''] + [heading for _, heading in positions]
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        body = text[start:end].strip()
+        if body:
+            sections.append((headings[i], body))
+
+    chunks = []
+    step = max(1, max_chars - overlap)
+    for heading, body in sections:
+        if len(body) <= max_chars:
+            chunks.append((heading, body))
+            continue
+        for offset in range(0, len(body), step):
+            piece = body[offset:offset + max_chars].strip()
+            if piece:
+                chunks.append((heading, piece))
+            if offset + max_chars >= len(body):
+                break
+    return chunks
+
+
+def _file_digest(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+class LocalIndex:
+    """
+    本地文档检索索引（BM25 + 向量，增量构建，内存映射加载）
+    """
+
+    def __init__(self, index_dir, embed_fn=None, embedder_name='hashing-512', dim=512,
+                 max_chars=500, overlap=100, k1=1.5, b=0.75, bm25_weight=0.5):
+        """
+        参数：
+            index_dir: 索引文件目录
+            embed_fn: 向量化函数 embed_fn(text) -> 已归一化的向量，默认 HashingEmbedder
+            embedder_name: 向量化方法名，写入 manifest；更换嵌入模型时需同时修改，触发全量重建
+            dim: 向量维度（需与 embed_fn 输出一致）
+            max_chars / overlap: 分块参数
+            k1 / b: BM25 参数
+            bm25_weight: 混合打分中 BM25 的权重（余弦相似度权重为 1 - bm25_weight）
+        """
+        self.index_dir = Path(index_dir)
+        self.embed_fn = embed_fn or HashingEmbedder(dim)
+        self.embedder_name = embedder_name
+        self.dim = dim
+        self.max_chars = max_chars
+        self.overlap = overlap
+        self.k1 = k1
+        self.b = b
+        self.bm25_weight = bm25_weight
+        self.manifest = None
+        self.chunks = []
+        self.vocab = {}
+        self.stats = {'reused_files': 0, 'embedded_files': 0, 'removed_files': 0}
+        self.load()
+
+    # ---------- 持久化 ----------
+
+    def _path(self, name):
+        return self.index_dir / name
+
+    def load(self):
+        """以内存映射方式加载已有索引，索引不存在时保持为空"""
+        manifest_path = self._path('manifest.json')
+        if not manifest_path.exists():
+            return False
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        if manifest.get('embedder') != self.embedder_name or manifest.get('dim') != self.dim:
+            return False
+        self.manifest = manifest
+        self.chunks = [json.loads(line) for line in
+                       self._path('chunks.jsonl').read_text(encoding='utf-8').splitlines() if line]
+        self.vocab = json.loads(self._path('vocab.json').read_text(encoding='utf-8'))
+        self.vectors = np.load(self._path('vectors.npy'), mmap_mode='r')
+        self.doc_len = np.load(self._path('doc_len.npy'), mmap_mode='r')
+        self.postings_indptr = np.load(self._path('postings_indptr.npy'), mmap_mode='r')
+        self.postings_docs = np.load(self._path('postings_docs.npy'), mmap_mode='r')
+        self.postings_tf = np.load(self._path('postings_tf.npy'), mmap_mode='r')
+        self.idf = np.load(self._path('idf.npy'), mmap_mode='r')
+        return True
+
+    def _save_array(self, name, array):
+        # 先写临时文件再替换，已经映射旧文件的进程不受影响
+        tmp_path = self._path(name + '.tmp.npy')
+        np.save(tmp_path, array)
+        os.replace(tmp_path, self._path(name))
+
+    def _save_text(self, name, text):
+        tmp_path = self._path(name + '.tmp')
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, self._path(name))
+
+    # ---------- 构建 ----------
+
+    def build(self, doc_dirs, pattern='**/*.md'):
+        """
+        增量构建索引：未变化的文件复用已有分块和向量，只处理新增或修改过的文件
+        参数：
+            doc_dirs: 文档目录（字符串或列表）
+            pattern: 文件匹配模式
+        返回：
+            构建统计 {'reused_files', 'embedded_files', 'removed_files', 'chunks'}
+        """
+        if isinstance(doc_dirs, (str, Path)):
+            doc_dirs = [doc_dirs]
+        files = sorted({str(path) for doc_dir in doc_dirs for path in Path(doc_dir).glob(pattern) if path.is_file()})
+
+        old_files = (self.manifest or {}).get('files', {})
+        old_chunks_by_file = {}
+        for i, chunk in enumerate(self.chunks):
+            old_chunks_by_file.setdefault(chunk['path'], []).append(i)
+
+        new_chunks, new_vectors, file_entries = [], [], {}
+        stats = {'reused_files': 0, 'embedded_files': 0, 'removed_files': len(set(old_files) - set(files))}
+        for path in files:
+            stat = Path(path).stat()
+            entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+            old_entry = old_files.get(path)
+            # 修改时间和大小一致时直接复用；不一致时再比较内容哈希（避免 touch 等只改时间的操作触发重算）
+            reuse = old_entry is not None and path in old_chunks_by_file and (
+                (old_entry['mtime'], old_entry['size']) == (entry['mtime'], entry['size'])
+                or old_entry['sha1'] == _file_digest(path))
+            if reuse:
+                entry['sha1'] = old_entry['sha1']
+                for i in old_chunks_by_file[path]:
+                    new_chunks.append(self.chunks[i])
+                    new_vectors.append(np.asarray(self.vectors[i]))
+                stats['reused_files'] += 1
+            else:
+                entry['sha1'] = _file_digest(path)
+                text = Path(path).read_text(encoding='utf-8', errors='ignore')
+                for heading, body in chunk_markdown(text, self.max_chars, self.overlap):
+                    new_chunks.append({'path': path, 'heading': heading, 'text': body})
+                    new_vectors.append(self.embed_fn(f"{heading} {body}"))
+                stats['embedded_files'] += 1
+            file_entries[path] = entry
+
+        self._write_index(new_chunks, new_vectors, file_entries)
+        self.load()
+        stats['chunks'] = len(self.chunks)
+        self.stats = stats
+        return stats
+
+    def _write_index(self, chunks, vectors, file_entries):
+        """写出分块、向量和 BM25 倒排表（倒排表由分块文本重新统计，代价远小于向量化）"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        vocab, postings, doc_len = {}, {}, []
+        for doc_id, chunk in enumerate(chunks):
+            tokens = tokenize(f"{chunk['heading']} {chunk['text']}")
+            doc_len.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_id = vocab.setdefault(token, len(vocab))
+                postings.setdefault(term_id, []).append((doc_id, tf))
+
+        # CSR 倒排表：term_id 的文档列表为 docs[indptr[t]:indptr[t+1]]
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        docs, tfs = [], []
+        for term_id in range(len(vocab)):
+            term_postings = postings[term_id]
+            indptr[term_id + 1] = indptr[term_id] + len(term_postings)
+            docs.extend(doc_id for doc_id, _ in term_postings)
+            tfs.extend(tf for _, tf in term_postings)
+        df = np.diff(indptr).astype(np.float64)
+        n_docs = max(len(chunks), 1)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        self._save_array('vectors.npy', np.asarray(vectors, dtype=np.float32).reshape(len(chunks), self.dim))
+        self._save_array('doc_len.npy', np.asarray(doc_len, dtype=np.float32))
+        self._save_array('postings_indptr.npy', indptr)
+        self._save_array('postings_docs.npy', np.asarray(docs, dtype=np.int32))
+        self._save_array('postings_tf.npy', np.asarray(tfs, dtype=np.float32))
+        self._save_array('idf.npy', idf.astype(np.float32))
+        self._save_text('vocab.json', json.dumps(vocab, ensure_ascii=False))
+        self._save_text('chunks.jsonl', ''.join(json.dumps(chunk, ensure_ascii=False) + '\n' for chunk in chunks))
+        # manifest 最后写入：中途失败时旧 manifest 与新文件不一致，下次 load 会读到完整的新文件或重新构建
+        self._save_text('manifest.json', json.dumps({
+            'embedder': self.embedder_name,
+            'dim': self.dim,
+            'files': file_entries,
+        }, ensure_ascii=False, indent=2))
+
+    # ---------- 检索 ----------
+
+    def _bm25_scores(self, term_ids):
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 1.0
+        for term_id in term_ids:
+            start, end = self.postings_indptr[term_id], self.postings_indptr[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / avg_len)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, k=3):
+        """
+        混合检索
+        参数：
+            query: 问题
+            k: 返回的段落数
+        返回：
+            (段落列表, 置信度)：段落包含 path、heading、text、score（混合分数）、bm25（BM25 原始分数）；
+            置信度 = 0.5 × 最佳段落的 IDF 加权查询词覆盖率 + 0.5 × 最佳段落的余弦相似度
+        """
+        if not self.chunks:
+            return [], 0.0
+        tokens = list(dict.fromkeys(tokenize(query)))
+        term_ids = [self.vocab[token] for token in tokens if token in self.vocab]
+
+        bm25 = self._bm25_scores(term_ids)
+        cosine = np.asarray(self.vectors @ self.embed_fn(query), dtype=np.float32)
+        bm25_norm = bm25 / bm25.max() if bm25.max() > 0 else bm25
+        hybrid = self.bm25_weight * bm25_norm + (1 - self.bm25_weight) * cosine
+
+        top = np.argsort(-hybrid)[:k]
+        hits = [{**self.chunks[i], 'score': round(float(hybrid[i]), 4), 'bm25': round(float(bm25[i]), 4)}
+                for i in top]
+
+        # 覆盖率：查询词（未登录词按最大 IDF 计）中有多少出现在最佳段落里
+        best_tokens = set(tokenize(f"{self.chunks[top[0]]['heading']} {self.chunks[top[0]]['text']}"))
+        max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        weights = [float(self.idf[self.vocab[token]]) if token in self.vocab else max_idf for token in tokens]
+        covered = sum(weight for token, weight in zip(tokens, weights) if token in best_tokens)
+        coverage = covered / sum(weights) if weights else 0.0
+        confidence = 0.5 * coverage + 0.5 * float(cosine[top[0]])
+        return hits, round(confidence, 4)
+
+
+def answer_locally(hits, confidence, threshold=CONFIDENCE_THRESHOLD, min_bm25=MIN_BM25):
+    """
+    是否用本地段落回答：置信度和最佳段落的 BM25 原始分数都要达到阈值
+    参数：
+        hits: search() 返回的段落列表
+        confidence: search() 返回的置信度
+        threshold: 置信度阈值
+        min_bm25: 最佳段落的 BM25 原始分数下限
+    """
+    return bool(hits) and confidence >= threshold and hits[0]['bm25'] >= min_bm25
+
+
+def calibrate(index, queries):
+    """
+    在标注过的问题上校准 (置信度阈值, BM25 下限)
+    候选值取自各问题的实际分数；先保证没有文档外问题被判为本地回答，再让文档内问题通过得最多，
+    同样多时取阈值更高的一组（离文档外问题更远）
+    参数：
+        index: 已构建的 LocalIndex
+        queries: [{"query": 问题, "in_domain": 是否能由文档回答}, ...]
+    返回：
+        {"threshold", "min_bm25", "in_domain_recall", "off_domain_passed", "rows": 每个问题的分数}
+    """
+    rows = []
+    for item in queries:
+        hits, confidence = index.search(item['query'], k=1)
+        rows.append({'query': item['query'], 'in_domain': bool(item['in_domain']),
+                     'confidence': confidence, 'bm25': hits[0]['bm25'] if hits else 0.0})
+    confidences = np.array([row['confidence'] for row in rows])
+    bm25 = np.array([row['bm25'] for row in rows])
+    in_domain = np.array([row['in_domain'] for row in rows])
+
+    best = None
+    for threshold in np.unique(confidences):
+        for min_bm25 in np.unique(bm25):
+            passed = (confidences >= threshold) & (bm25 >= min_bm25)
+            key = (-int((passed & ~in_domain).sum()), int((passed & in_domain).sum()), threshold, min_bm25)
+            if best is None or key > best:
+                best = key
+    off_passed, in_passed, threshold, min_bm25 = best
+    return {'threshold': float(threshold), 'min_bm25': float(min_bm25),
+            'in_domain_recall': round(in_passed / max(int(in_domain.sum()), 1), 3),
+            'off_domain_passed': -off_passed, 'rows': rows}
+
+
+def build_context(hits, max_chars=1500):
+    """
+    把检索到的段落拼成注入提示词的参考资料
+    参数：
+        hits: search() 返回的段落列表
+        max_chars: 参考资料的最大总长度
+    返回：
+        参考资料文本（每段注明来源文件和标题）
+    """
+    parts, total = [], 0
+    for i, hit in enumerate(hits, start=1):
+        source = Path(hit['path']).name + (f" · {hit['heading']}" if hit['heading'] else '')
+        part = f"[{i}] 来源：{source}\n{hit['text']}"
+        if total + len(part) > max_chars and parts:
+            break
+        parts.append(part)
+        total += len(part)
+    return "\n\n".join(parts)
+
+
+def main(argv=None):
+    import argparse
+    from llm_benchmark import load_dataset
+
+    root = Path(__file__).resolve().parent.parent
+    parser = argparse.ArgumentParser(description='本地知识检索')
+    sub = parser.add_subparsers(dest='command', required=True)
+    calibrate_parser = sub.add_parser('calibrate', help='在校准问题集上选出本地回答的阈值')
+    calibrate_parser.add_argument('--index', default='cache/local_index')
+    calibrate_parser.add_argument('--docs', nargs='*', default=[str(root / '01_ai_concepts' / '知乎'),
+                                                                 str(root / '00_env_settings')])
+    calibrate_parser.add_argument('--version', default=None, help='校准问题集版本，默认最新')
+    args = parser.parse_args(argv)
+
+    index = LocalIndex(args.index)
+    index.build([Path(d) for d in args.docs])
+    version, queries = load_dataset('retrieval_queries', args.version)
+    result = calibrate(index, queries)
+    for row in sorted(result['rows'], key=lambda row: -row['confidence']):
+        passed = answer_locally([{'bm25': row['bm25']}], row['confidence'], result['threshold'], result['min_bm25'])
+        print(f"{'文档内' if row['in_domain'] else '文档外'} {row['confidence']:.3f} {row['bm25']:7.2f} "
+              f"{'本地' if passed else '联网'}  {row['query']}")
+    print(f"retrieval_queries {version}: 置信度阈值 {result['threshold']:.3f}，BM25 下限 {result['min_bm25']:.2f}，"
+          f"文档内召回 {result['in_domain_recall']:.0%}，误判的文档外问题 {result['off_domain_passed']} 条")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
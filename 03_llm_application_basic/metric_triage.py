@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+告警指标预筛（调用大模型之前的流式异常检测）
+每条告警都会调用一次大模型，但很多告警到达时指标已经恢复正常，或者只是指标在阈值附近
+来回抖动（flapping）。MetricTriage 在调用大模型之前先看一眼当前指标:
+1. 每个指标维护一个定长环形缓冲区（最近 window 个观测值）和 EWMA 均值/方差
+2. 用中位数和 MAD 计算稳健 z 分数：z = (x - 中位数) / (1.4826 × MAD)，不受偶发尖峰影响
+3. 判定结果:
+    'resolved' - 告警指标当前已回到阈值以内，自动关闭，不调用大模型
+    'noise'    - 当前值越限，但 EWMA 平滑后仍在阈值以内且稳健 z 分数不高，
+                 说明指标平时就在阈值附近波动，属于抖动告警，自动关闭
+    'anomaly'  - 确认异常（或无法判断），交给大模型，并附上一行紧凑的数值摘要
+每次判定只涉及几十个数的中位数计算，耗时在微秒级。
+"""
+
+import json
+import re
+import time
+
+import numpy as np
+
+# 指标规则：告警关键词、告警阈值（超过即越限）
+DEFAULT_METRIC_RULES = {
+    "连接数": {"keywords": ["连接数", "connection"], "limit": 80},
+    "CPU使用率": {"keywords": ["CPU", "cpu"], "limit": 85},
+    "内存使用率": {"keywords": ["内存", "memory"], "limit": 90},
+}
+
+
+def parse_status(status):
+    """
+    把 get_current_status 的返回值解析为 {指标名: 数值}
+    参数：
+        status: JSON 字符串或字典，取值可带百分号，如 "45.2%"
+    返回：
+        dict: 指标名到浮点数的映射（无法解析的取值跳过）
+    """
+    if isinstance(status, str):
+        status = json.loads(status)
+    values = {}
+    for name, value in status.items():
+        match = re.search(r'-?\d+(?:\.\d+)?', str(value))
+        if match:
+            values[name] = float(match.group())
+    return values
+
+
+class MetricStream:
+    """
+    单个指标的环形缓冲区 + EWMA 统计
+    参数：
+        window: 环形缓冲区长度
+        alpha: EWMA 平滑系数，越大越看重最新观测
+    """
+
+    def __init__(self, window=120, alpha=0.3):
+        self.buffer = np.zeros(window)
+        self.alpha = alpha
+        self.count = 0
+        self.ewma = None
+        self.ewm_var = 0.0
+
+    def update(self, value):
+        """加入一个观测值，同时更新 EWMA 均值和方差"""
+        self.buffer[self.count % len(self.buffer)] = value
+        self.count += 1
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            diff = value - self.ewma
+            self.ewma += self.alpha * diff
+            self.ewm_var = (1 - self.alpha) * (self.ewm_var + self.alpha * diff * diff)
+
+    def history(self):
+        """缓冲区中的有效观测值（不保证时间顺序）"""
+        return self.buffer[:min(self.count, len(self.buffer))]
+
+    def robust_z(self, value):
+        """
+        value 相对历史观测的稳健 z 分数
+
+        MAD 为0（历史值几乎不变）时退回 EWMA 标准差，仍为0时返回 None
+        """
+        history = self.history()
+        if len(history) == 0:
+            return None
+        median = np.median(history)
+        scale = 1.4826 * np.median(np.abs(history - median))
+        if scale <= 0:
+            scale = np.sqrt(self.ewm_var)
+        if scale <= 0:
+            return None
+        return float((value - median) / scale)
+
+    def crossings(self, limit):
+        """缓冲区中越限的观测次数"""
+        return int((self.history() > limit).sum())
+
+
+class MetricTriage:
+    """
+    告警预筛器：决定一条告警是自动关闭还是交给大模型
+    参数：
+        rules: 指标规则，默认使用 DEFAULT_METRIC_RULES
+        window: 每个指标的环形缓冲区长度
+        alpha: EWMA 平滑系数
+        z_threshold: 稳健 z 分数超过该值视为真实异常
+        min_history: 判定抖动告警所需的最少历史观测数
+    """
+
+    def __init__(self, rules=None, window=120, alpha=0.3, z_threshold=3.5, min_history=10):
+        self.rules = rules or DEFAULT_METRIC_RULES
+        self.window = window
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_history = min_history
+        self.streams = {}
+        self.decisions = {'resolved': 0, 'noise': 0, 'anomaly': 0}
+        self.last_result = None
+
+    def _stream(self, metric):
+        if metric not in self.streams:
+            self.streams[metric] = MetricStream(self.window, self.alpha)
+        return self.streams[metric]
+
+    def match_metric(self, alert):
+        """根据告警文本中的关键词找到对应的指标，找不到时返回 None"""
+        for metric, rule in self.rules.items():
+            if any(keyword in alert for keyword in rule['keywords']):
+                return metric
+        return None
+
+    def observe(self, status):
+        """
+        记录一次指标快照（不做判定），用于在告警之间持续积累历史
+        返回：
+            dict: 解析后的 {指标名: 数值}
+        """
+        values = parse_status(status)
+        for metric, value in values.items():
+            self._stream(metric).update(value)
+        return values
+
+    def triage(self, alert, status):
+        """
+        对一条告警做预筛
+        参数：
+            alert: 告警文本
+            status: 当前指标快照（get_current_status 的返回值）
+        返回：
+            dict: decision（'resolved' / 'noise' / 'anomaly'）、metric、reason、
+                  metrics（各指标的当前值、EWMA、稳健z分数、越限次数）和 elapsed_us
+        """
+        start = time.perf_counter()
+        values = parse_status(status)
+        # 先用历史计算 z 分数，再把当前值加入历史
+        metrics = {}
+        for name, value in values.items():
+            stream = self._stream(name)
+            z = stream.robust_z(value)
+            stream.update(value)
+            limit = self.rules.get(name, {}).get('limit')
+            metrics[name] = {
+                'value': value,
+                'ewma': round(stream.ewma, 2),
+                'z': None if z is None else round(z, 2),
+                'limit': limit,
+                'crossings': stream.crossings(limit) if limit is not None else None,
+                'history': min(stream.count, self.window),
+            }
+
+        metric = self.match_metric(alert)
+        info = metrics.get(metric)
+        if info is None or info['limit'] is None:
+            decision, reason = 'anomaly', '无法从告警中识别指标，交给大模型分析'
+        elif info['value'] <= info['limit']:
+            decision, reason = 'resolved', f"{metric}当前为{info['value']:g}，已回到阈值{info['limit']:g}以内"
+        elif (info['history'] > self.min_history and info['ewma'] <= info['limit']
+              and info['z'] is not None and info['z'] < self.z_threshold):
+            decision, reason = 'noise', (f"{metric}当前为{info['value']:g}，但平滑值{info['ewma']:g}未越限、"
+                                         f"稳健z分数{info['z']:g}，属于阈值附近的抖动")
+        else:
+            decision, reason = 'anomaly', f"{metric}当前为{info['value']:g}，超过阈值{info['limit']:g}"
+
+        self.decisions[decision] += 1
+        self.last_result = {
+            'decision': decision,
+            'metric': metric,
+            'reason': reason,
+            'metrics': metrics,
+            'elapsed_us': round((time.perf_counter() - start) * 1e6, 1),
+        }
+        return self.last_result
+
+    @staticmethod
+    def summarize(result):
+        """
+        把预筛结果压缩成一行数值摘要，附在交给大模型的告警后面
+
+        例: 指标摘要: 连接数=92(阈值80,EWMA61.3,z=4.2,近期越限8/60); CPU使用率=35.1(...)
+        """
+        parts = []
+        for name, info in result['metrics'].items():
+            details = [f"阈值{info['limit']:g}"] if info['limit'] is not None else []
+            details.append(f"EWMA{info['ewma']:g}")
+            if info['z'] is not None:
+                details.append(f"z={info['z']:g}")
+            if info['crossings'] is not None:
+                details.append(f"近期越限{info['crossings']}/{info['history']}")
+            parts.append(f"{name}={info['value']:g}({','.join(details)})")
+        return "指标摘要: " + "; ".join(parts)
+
+    def llm_call_rate(self):
+        """交给大模型的告警占比"""
+        total = sum(self.decisions.values())
+        return self.decisions['anomaly'] / total if total else 0.0
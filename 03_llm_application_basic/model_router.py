@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+多模型路由（Qwen / DeepSeek）
+功能：根据任务类型，结合各模型的实时延迟、错误率和调用成本选择模型，
+超时或限流（429）时自动切换到同类模型，并支持对冲请求（hedged request）。
+
+为什么需要路由？
+- 各脚本写死了一个模型：qwen-turbo、qwen-max、qwen-plus、deepseek-v3、deepseek-r1
+- "正向/负向"这种一个词的情感标注，没有必要占用 deepseek-v3 的配额
+- 单一模型偶发的慢请求会直接拉高尾延迟
+
+对冲请求：
+- 第一个模型在其历史 p95 延迟内还没有返回时，同时向下一个候选模型发送同样的请求
+- 谁先成功返回就用谁的结果
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from lazy_import import lazy_module
+
+# 与各脚本共用同一个延迟导入代理，脚本设置的 dashscope.api_key 在这里同样生效
+dashscope = lazy_module('dashscope')
+
+# ==================== 模型目录 ====================
+# 价格为参考价（元/千tokens），以阿里云百炼官网为准；latency_s 为没有统计数据时使用的先验延迟
+MODEL_CATALOG = {
+    'qwen-turbo':  {'input_price': 0.0003, 'output_price': 0.0006, 'latency_s': 0.8},
+    'qwen-plus':   {'input_price': 0.0008, 'output_price': 0.002,  'latency_s': 1.5},
+    'qwen-max':    {'input_price': 0.0024, 'output_price': 0.0096, 'latency_s': 3.0},
+    'deepseek-v3': {'input_price': 0.002,  'output_price': 0.008,  'latency_s': 3.0},
+    'deepseek-r1': {'input_price': 0.004,  'output_price': 0.016,  'latency_s': 15.0},
+}
+
+# 任务类型 -> 候选模型（同类可互相替代的模型）以及每次调用的预估token数
+TASK_PROFILES = {
+    'sentiment':     {'models': ['qwen-turbo', 'qwen-plus', 'deepseek-v3'], 'input_tokens': 100, 'output_tokens': 5},
+    'tool_calling':  {'models': ['qwen-turbo', 'qwen-plus', 'qwen-max'], 'input_tokens': 500, 'output_tokens': 200},
+    'long_analysis': {'models': ['qwen-max', 'deepseek-v3', 'qwen-plus', 'deepseek-r1'], 'input_tokens': 3000, 'output_tokens': 3000},
+}
+
+# 视为可重试（切换到其他模型）的HTTP状态码；其他非200状态码（400/401/403等）换模型也不会成功，直接抛出
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ModelStats:
+    """
+    单个模型的在线统计：延迟（EWMA + 滑动窗口分位数）和错误率（EWMA）
+    """
+
+    def __init__(self, prior_latency_s, window=200, alpha=0.2):
+        self.ewma_latency_s = prior_latency_s
+        self.error_rate = 0.0
+        self.latencies = deque(maxlen=window)
+        self.alpha = alpha
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_s, success):
+        """记录一次调用结果"""
+        with self.lock:
+            self.calls += 1
+            self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (0.0 if success else 1.0)
+            if success:
+                self.latencies.append(latency_s)
+                self.ewma_latency_s = (1 - self.alpha) * self.ewma_latency_s + self.alpha * latency_s
+            else:
+                self.errors += 1
+
+    def percentile(self, q, min_samples=20):
+        """
+        返回延迟分位数（秒），样本不足时返回None
+        参数：
+            q: 分位数，例如 0.95
+            min_samples: 最少样本数
+        """
+        with self.lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def snapshot(self):
+        """返回统计快照，便于打印"""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 4),
+            'ewma_latency_s': round(self.ewma_latency_s, 3),
+            'p95_latency_s': self.percentile(0.95),
+        }
+
+
+def dashscope_call(model, messages, **kwargs):
+    """默认的模型调用函数：dashscope.Generation.call，输出为message格式"""
+    return dashscope.Generation.call(
+        model=model,
+        messages=messages,
+        result_format='message',
+        **kwargs
+    )
+
+
+class NoModelAvailableError(Exception):
+    """所有候选模型都调用失败"""
+
+
+class ModelCallError(Exception):
+    """不可重试的调用错误（参数错误、鉴权失败等非200状态码）"""
+
+    def __init__(self, model, status_code, message=None):
+        super().__init__(f"{model} 调用失败，状态码: {status_code}" + (f"，{message}" if message else ""))
+        self.model = model
+        self.status_code = status_code
+
+
+class _Attempt:
+    """
+    一次模型调用的统计登记：超时放弃和调用返回可能先后发生，只有先到的一方记录统计，
+    避免超时后仍在运行的请求返回时再记录一次
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.started = time.perf_counter()
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def settle(self):
+        """第一次调用返回True，之后都返回False"""
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+            return True
+
+
+class ModelRouter:
+    """
+    成本/延迟感知的多模型路由器
+    """
+
+    def __init__(self, call_fn=dashscope_call, task_profiles=None, catalog=None,
+                 timeout_s=30.0, hedge=True, latency_weight=1.0, cost_weight=0.5,
+                 error_weight=10.0, max_workers=8):
+        """
+        参数：
+            call_fn: 模型调用函数 call_fn(model, messages, **kwargs)，默认调用 dashscope
+            task_profiles: 任务配置，默认 TASK_PROFILES
+            catalog: 模型目录，默认 MODEL_CATALOG
+            timeout_s: 单个模型的超时时间（秒），超时后切换到下一个模型
+            hedge: 是否启用对冲请求
+            latency_weight / cost_weight / error_weight: 打分权重（分数越低越优先）；
+                延迟按秒计，成本按"相对该任务最便宜候选模型的倍数"计，错误率为 0~1
+            max_workers: 并发调用线程数
+        """
+        self.call_fn = call_fn
+        self.task_profiles = task_profiles or TASK_PROFILES
+        self.catalog = catalog or MODEL_CATALOG
+        self.timeout_s = timeout_s
+        self.hedge = hedge
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.error_weight = error_weight
+        self.stats = {model: ModelStats(info['latency_s']) for model, info in self.catalog.items()}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def estimated_cost(self, model, task):
+        """估算某任务在某模型上单次调用的成本（元）"""
+        profile = self.task_profiles[task]
+        info = self.catalog[model]
+        return (profile['input_tokens'] * info['input_price'] +
+                profile['output_tokens'] * info['output_price']) / 1000
+
+    def relative_cost(self, model, task):
+        """
+        成本归一化：单次调用成本除以该任务候选模型中的最低成本（最便宜的模型为1）
+        单次调用的绝对成本只有 1e-5~1e-2 元，直接与秒级延迟相加时成本项几乎不起作用
+        """
+        cheapest = min(self.estimated_cost(candidate, task) for candidate in self.task_profiles[task]['models'])
+        return self.estimated_cost(model, task) / cheapest if cheapest > 0 else 1.0
+
+    def score(self, model, task):
+        """模型打分：延迟 + 相对成本 + 错误率的加权和，越低越好"""
+        stats = self.stats[model]
+        return (self.latency_weight * stats.ewma_latency_s +
+                self.cost_weight * self.relative_cost(model, task) +
+                self.error_weight * stats.error_rate)
+
+    def rank(self, task):
+        """
+        返回某任务的候选模型列表，按打分从优到劣排序
+        参数：
+            task: 任务类型，见 TASK_PROFILES
+        """
+        if task not in self.task_profiles:
+            raise ValueError(f"未知的任务类型: {task}")
+        return sorted(self.task_profiles[task]['models'], key=lambda model: self.score(model, task))
+
+    def _record(self, attempt, latency_s, success):
+        """登记一次调用的统计（同一次调用只记录一次）"""
+        if attempt.settle():
+            self.stats[attempt.model].record(latency_s, success=success)
+
+    def _attempt(self, attempt, messages, kwargs):
+        """
+        调用一次模型并记录统计
+        返回：
+            (response, error)：可重试的失败时 response 为 None、error 为错误描述；
+            不可重试的失败时 error 为 ModelCallError
+        """
+        model = attempt.model
+        try:
+            response = self.call_fn(model, messages, **kwargs)
+        except Exception as e:
+            self._record(attempt, time.perf_counter() - attempt.started, success=False)
+            return None, f"{model} 调用异常: {str(e)}"
+        latency_s = time.perf_counter() - attempt.started
+        status_code = 500 if response is None else getattr(response, 'status_code', 200)
+        if status_code in RETRYABLE_STATUS_CODES:
+            self._record(attempt, latency_s, success=False)
+            return None, f"{model} 调用失败，状态码: {status_code}"
+        if status_code != 200:
+            # 请求本身有问题，不计入模型的错误率
+            attempt.settle()
+            return None, ModelCallError(model, status_code, getattr(response, 'message', None))
+        self._record(attempt, latency_s, success=True)
+        return response, None
+
+    def call(self, task, messages, **kwargs):
+        """
+        按任务类型路由一次模型调用
+        参数：
+            task: 任务类型
+            messages: 对话消息
+            **kwargs: 透传给模型调用函数的参数（例如 tools）
+        返回：
+            (model, response)：实际给出结果的模型名和响应
+        异常：
+            ModelCallError: 返回了不可重试的非200状态码
+            NoModelAvailableError: 所有候选模型都失败或超时
+        """
+        pending = self.rank(task)
+        running = {}
+        errors = []
+        hedged = False
+
+        def launch():
+            attempt = _Attempt(pending.pop(0))
+            running[self.executor.submit(self._attempt, attempt, messages, kwargs)] = attempt
+
+        launch()
+        while running:
+            # 只对第一个模型做一次对冲：等到它的 p95 延迟还没返回，就启动下一个候选模型
+            primary_p95 = None
+            if self.hedge and not hedged and pending and len(running) == 1:
+                primary = next(iter(running.values()))
+                p95 = self.stats[primary.model].percentile(0.95)
+                if p95 is not None:
+                    primary_p95 = max(0.0, p95 - (time.perf_counter() - primary.started))
+
+            oldest_start = min(attempt.started for attempt in running.values())
+            remaining_timeout = max(0.0, self.timeout_s - (time.perf_counter() - oldest_start))
+            wait_s = remaining_timeout if primary_p95 is None else min(primary_p95, remaining_timeout)
+
+            done, _ = wait(list(running), timeout=wait_s, return_when=FIRST_COMPLETED)
+            if not done:
+                if primary_p95 is not None and wait_s < remaining_timeout:
+                    hedged = True
+                    launch()
+                    continue
+                # 超时：放弃运行最久的请求，切换到下一个模型（被放弃的请求之后返回时不再记录统计）
+                for future, attempt in list(running.items()):
+                    if time.perf_counter() - attempt.started >= self.timeout_s:
+                        running.pop(future)
+                        self._record(attempt, self.timeout_s, success=False)
+                        errors.append(f"{attempt.model} 超时（{self.timeout_s}s）")
+                if pending and not running:
+                    launch()
+                continue
+
+            for future in done:
+                model = running.pop(future).model
+                response, error = future.result()
+                if error is None:
+                    return model, response
+                if isinstance(error, ModelCallError):
+                    raise error
+                errors.append(error)
+            if pending and not running:
+                launch()
+
+        raise NoModelAvailableError("所有候选模型均调用失败: " + "; ".join(errors))
+
+    def report(self):
+        """返回所有模型的统计快照"""
+        return {model: stats.snapshot() for model, stats in self.stats.items()}
+
+    def shutdown(self):
+        """释放线程池"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+提示词前缀缓存（服务端上下文缓存）
+百炼的 qwen-max / qwen-plus / qwen-turbo 等模型支持上下文缓存：请求开头与之前请求字节级相同的部分
+（前缀）可以命中缓存，命中部分的输入 token 按折扣计费，首 token 延迟也更低。
+舆情分析师、运维分析师的系统提示词和工具定义每次调用都一样，但只要前缀里混入了一点变化
+（工具定义的键顺序不同、变量数据插在固定指令前面），整个前缀就无法命中。
+
+PromptPrefix 把提示词分成两部分:
+1. 固定前缀：系统提示词、工具定义、few-shot 示例，创建时一次性规范化（工具定义按键排序后重新生成），
+   之后每次调用都复用同一份对象，保证逐字节一致；fingerprint 是前缀的哈希，可用来核对前缀是否变化
+2. 变量内容：评论、告警、数据样本等，一律追加在前缀之后
+显式缓存（explicit_cache=True）时在前缀最后一条消息上加 cache_control 标记，由服务端创建缓存块；
+默认只依赖隐式缓存（前缀一致即可命中），不改变消息格式。
+
+CacheStats 从响应的 usage（prompt_tokens_details.cached_tokens）中统计缓存命中的 token 占比，
+并分别统计命中和未命中请求的平均延迟。
+
+缓存有最小长度：百炼的上下文缓存只对不少于 MIN_CACHEABLE_TOKENS（1024）个 token 的输入生效。
+只有几十个 token 的系统提示词（如情感分析）无论前缀多稳定都不会命中，省下的只有本地的消息组装；
+PromptPrefix.cacheable() 按估算的 token 数提前判断，CacheStats 的 below_min_requests
+按响应里真实的输入 token 数统计有多少请求因为太短而不可能命中。
+为了命中缓存把前缀凑到 1024 个 token 得不偿失：命中部分仍按折扣计费，比原本几十个 token 的输入贵得多。
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+
+# 百炼上下文缓存生效的最小输入长度（token）
+MIN_CACHEABLE_TOKENS = 1024
+
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+
+def canonical_json(obj):
+    """键排序、紧凑分隔符的 JSON 序列化，同样的内容总是得到同样的字节"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def _get(obj, key, default=None):
+    """同时支持字典和属性访问（dashscope 的响应对象两种方式都可以取值）"""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    try:
+        value = obj[key]
+    except (KeyError, TypeError, IndexError):
+        value = getattr(obj, key, default)
+    return default if value is None else value
+
+
+def estimate_tokens(text):
+    """
+    粗略估算 token 数：汉字及全角标点按每字 1 个，其余字符按每 4 个 1 个
+    只用于判断前缀是否远低于缓存的最小长度，准确数字以响应的 usage 为准
+    """
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def usage_tokens(response):
+    """
+    从响应中读取输入 token 数和命中缓存的 token 数
+    参数：
+        response: dashscope 或 OpenAI 兼容接口的响应
+    返回：
+        (输入token数, 缓存命中token数)
+    """
+    usage = _get(response, 'usage')
+    prompt_tokens = _get(usage, 'input_tokens') or _get(usage, 'prompt_tokens') or 0
+    details = _get(usage, 'prompt_tokens_details')
+    cached_tokens = _get(details, 'cached_tokens') or 0
+    return int(prompt_tokens), int(cached_tokens)
+
+
+class PromptPrefix:
+    """
+    固定前缀：系统提示词 + 工具定义 + few-shot 示例
+    参数：
+        system: 系统提示词
+        tools: 工具定义列表（会被规范化为按键排序后的副本）
+        few_shot: few-shot 示例，[(用户输入, 助手回复), ...]
+        explicit_cache: 是否在前缀最后一条消息上加 cache_control 标记（显式缓存）
+    """
+
+    def __init__(self, system, tools=None, few_shot=None, explicit_cache=False):
+        self.tools = json.loads(canonical_json(tools)) if tools else None
+        messages = [{"role": "system", "content": system}]
+        for user_text, assistant_text in few_shot or []:
+            messages.append({"role": "user", "content": user_text})
+            messages.append({"role": "assistant", "content": assistant_text})
+        if explicit_cache:
+            last = messages[-1]
+            last["content"] = [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+        self.messages = messages
+        self.fingerprint = hashlib.sha256(
+            canonical_json({"messages": messages, "tools": self.tools}).encode('utf-8')).hexdigest()[:16]
+        self.estimated_tokens = estimate_tokens(canonical_json({"messages": messages, "tools": self.tools}))
+
+    def cacheable(self, min_tokens=MIN_CACHEABLE_TOKENS):
+        """固定前缀（估算）是否达到缓存的最小长度；达不到时只有加上变量内容后整体够长、且变量内容也重复才可能命中"""
+        return self.estimated_tokens >= min_tokens
+
+    def build(self, *variable_messages):
+        """
+        组装完整的消息列表：固定前缀在前，变量内容在后
+        参数：
+            *variable_messages: 变量消息（字典），或字符串（视为用户消息）
+        返回：
+            list: 新的消息列表（前缀部分为副本，调用方修改列表不会影响前缀）
+        """
+        messages = copy.deepcopy(self.messages)
+        for message in variable_messages:
+            messages.append({"role": "user", "content": message} if isinstance(message, str) else message)
+        return messages
+
+    def call_kwargs(self):
+        """模型调用需要附带的固定参数（规范化后的工具定义）"""
+        return {"tools": self.tools} if self.tools else {}
+
+
+class CacheStats:
+    """
+    缓存命中统计：命中 token 占比、命中/未命中请求的平均延迟
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.below_min_requests = 0
+        self._latency = {True: [0, 0.0], False: [0, 0.0]}
+
+    def record(self, response, latency_s=None):
+        """
+        记录一次调用
+        参数：
+            response: 模型响应
+            latency_s: 调用耗时（秒）
+        返回：
+            int: 这次调用命中缓存的 token 数
+        """
+        prompt_tokens, cached_tokens = usage_tokens(response)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            if 0 < prompt_tokens < MIN_CACHEABLE_TOKENS:
+                self.below_min_requests += 1
+            if latency_s is not None:
+                bucket = self._latency[cached_tokens > 0]
+                bucket[0] += 1
+                bucket[1] += latency_s
+        return cached_tokens
+
+    def cached_ratio(self):
+        """命中缓存的输入 token 占比"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self):
+        """统计摘要"""
+        with self._lock:
+            hit_count, hit_total = self._latency[True]
+            miss_count, miss_total = self._latency[False]
+            return {
+                'requests': self.requests,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                'cached_ratio': round(self.cached_ratio(), 3),
+                'below_min_requests': self.below_min_requests,
+                'avg_latency_hit_s': round(hit_total / hit_count, 3) if hit_count else None,
+                'avg_latency_miss_s': round(miss_total / miss_count, 3) if miss_count else None,
+            }
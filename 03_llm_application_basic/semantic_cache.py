@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+语义缓存（近似重复提示词缓存）
+功能：对归一化后的提示词做本地向量化，放入内存中的近似最近邻索引（NumPy实现的IVF），
+相似度超过任务阈值时直接返回缓存的答案，不再调用大模型。
+
+为什么精确匹配缓存不够？
+- 改写过的评论（"音质特别好" / "音质真的特别好"）字面不同
+- 运维告警只有时间行不同（"时间：2024-08-03 15:30:00"），语义完全一样
+
+实现说明：
+- 归一化：去掉日期时间、统一空白和标点
+- 向量化：默认使用字符n-gram特征哈希（纯CPU、无需下载模型），可通过 embed_fn 替换为其他本地嵌入模型
+- 精确匹配任务：情感分析这类极性任务（EXACT_MATCH_TASKS）只在归一化后的文本完全相同时命中。
+  字符n-gram向量衡量的是字面重合度而不是语义，"非常推荐购买"和"非常不推荐购买"相似度超过0.9，
+  近似命中会直接返回相反的结论
+- 去重：同一任务下归一化文本相同的提示词只保留一个条目，重复写入时更新答案
+- 索引：条目较少时暴力检索；条目增多后用k-means建立倒排列表（IVF），每次只检索 nprobe 个簇的条目
+- 淘汰：LRU，超过 max_entries 时淘汰最久未命中的条目
+- 持久化：save_snapshot()/load_snapshot() 保存向量（.npz）和条目信息（.json）
+"""
+
+import json
+import re
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# 各任务的默认相似度阈值（余弦相似度）
+DEFAULT_THRESHOLDS = {
+    'ops': 0.95,
+}
+
+# 只允许精确命中（归一化文本完全相同）的任务：一个否定词就会让结论反转
+EXACT_MATCH_TASKS = ('sentiment',)
+
+# 日期、时间等易变内容
+_VOLATILE_PATTERNS = [
+    re.compile(r'\d{4}[-/年]\d{1,2}[-/月]\d{1,2}日?'),
+    re.compile(r'\d{1,2}:\d{2}(:\d{2})?'),
+]
+_PUNCTUATION = re.compile(r'[\s，。！？、；：:,.!?;"\'“”‘’（）()【】\[\]]+')
+
+
+def normalize_prompt(text):
+    """
+    提示词归一化：去掉日期时间，统一大小写、空白和标点
+    参数：
+        text: 原始提示词
+    返回：
+        归一化后的文本
+    """
+    for pattern in _VOLATILE_PATTERNS:
+        text = pattern.sub(' ', text)
+    text = _PUNCTUATION.sub(' ', text.lower())
+    return ' '.join(text.split())
+
+
+class HashingEmbedder:
+    """
+    字符n-gram特征哈希向量化（L2归一化），不依赖任何模型文件
+    """
+
+    def __init__(self, dim=512, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def __call__(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        compact = text.replace(' ', '')
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(compact) - n + 1):
+                h = zlib.crc32(compact[i:i + n].encode('utf-8'))
+                # 用最高位决定符号，降低哈希冲突带来的偏差
+                vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """
+    基于向量相似度的语义缓存
+    """
+
+    def __init__(self, thresholds=None, default_threshold=0.92, max_entries=10000,
+                 embed_fn=None, dim=512, ivf_min_entries=2000, nprobe=4, exact_tasks=EXACT_MATCH_TASKS):
+        """
+        参数：
+            thresholds: 各任务的相似度阈值，默认 DEFAULT_THRESHOLDS
+            default_threshold: 未配置任务的阈值
+            exact_tasks: 只允许精确命中的任务，默认 EXACT_MATCH_TASKS
+            max_entries: 最大缓存条目数，超出后按LRU淘汰
+            embed_fn: 向量化函数 embed_fn(text) -> 已归一化的向量，默认 HashingEmbedder
+            dim: 向量维度（需与 embed_fn 输出一致）
+            ivf_min_entries: 条目数达到该值后启用IVF索引
+            nprobe: IVF检索时访问的簇数量
+        """
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.default_threshold = default_threshold
+        self.exact_tasks = set(exact_tasks)
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn or HashingEmbedder(dim)
+        self.dim = dim
+        self.ivf_min_entries = ivf_min_entries
+        self.nprobe = nprobe
+
+        # 向量存储：预分配 max_entries 个槽位，slot 被淘汰后复用
+        self.vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self.valid = np.zeros(max_entries, dtype=bool)
+        self.task_ids = np.full(max_entries, -1, dtype=np.int32)
+        self.list_ids = np.full(max_entries, -1, dtype=np.int32)
+        self.entries = {}               # slot -> {"task", "prompt", "answer"}
+        self.keys = {}                  # (任务名, 归一化文本) -> slot，用于精确命中和去重
+        self.lru = OrderedDict()        # slot -> None，越靠后越新
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.tasks = {}                 # 任务名 -> 任务编号
+
+        # IVF 索引：inverted_lists[k] 为第 k 个簇中的 slot 集合
+        self.centroids = None
+        self.inverted_lists = []
+        self.indexed_size = 0
+
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    # ---------- 内部工具 ----------
+    def _task_id(self, task):
+        if task not in self.tasks:
+            self.tasks[task] = len(self.tasks)
+        return self.tasks[task]
+
+    def _embed(self, normalized):
+        return np.asarray(self.embed_fn(normalized), dtype=np.float32)
+
+    def _assign_list(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_rebuild_index(self):
+        """条目数达到阈值或比上次建索引时翻倍，就重新做一次k-means"""
+        size = int(self.valid.sum())
+        if size < self.ivf_min_entries or (self.centroids is not None and size < 2 * self.indexed_size):
+            return
+        slots = np.flatnonzero(self.valid)
+        data = self.vectors[slots]
+        nlist = max(1, int(np.sqrt(size)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(10):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for k in range(nlist):
+                members = data[assignment == k]
+                if len(members):
+                    center = members.sum(axis=0)
+                    norm = np.linalg.norm(center)
+                    if norm > 0:
+                        centroids[k] = center / norm
+        self.centroids = centroids.astype(np.float32)
+        self.list_ids[slots] = self._assign_list(data)
+        self.inverted_lists = [set() for _ in range(nlist)]
+        for slot, list_id in zip(slots.tolist(), self.list_ids[slots].tolist()):
+            self.inverted_lists[list_id].add(slot)
+        self.indexed_size = size
+
+    def _search(self, task_id, vector):
+        """返回 (最相似的slot, 相似度)，没有候选时返回 (None, -1)"""
+        if self.centroids is not None:
+            # 只取被访问簇的倒排列表，检索量与 nprobe 个簇的大小成正比，不再扫描全部条目
+            probe = np.argsort(self.centroids @ vector)[-self.nprobe:]
+            slots = np.fromiter((slot for k in probe for slot in self.inverted_lists[k]), dtype=np.int64)
+            slots = slots[self.task_ids[slots] == task_id]
+        else:
+            slots = np.flatnonzero(self.valid & (self.task_ids == task_id))
+        if len(slots) == 0:
+            return None, -1.0
+        sims = self.vectors[slots] @ vector
+        best = int(np.argmax(sims))
+        return int(slots[best]), float(sims[best])
+
+    def _store(self, slot, task, normalized, vector, entry):
+        """把条目写入空闲槽位"""
+        self.vectors[slot] = vector
+        self.valid[slot] = True
+        self.task_ids[slot] = self._task_id(task)
+        if self.centroids is not None:
+            list_id = self._assign_list(vector[None, :])[0]
+            self.list_ids[slot] = list_id
+            self.inverted_lists[list_id].add(slot)
+        self.entries[slot] = entry
+        self.keys[(task, normalized)] = slot
+        self.lru[slot] = None
+
+    def _evict(self):
+        slot, _ = self.lru.popitem(last=False)
+        if self.list_ids[slot] >= 0:
+            self.inverted_lists[self.list_ids[slot]].discard(slot)
+        entry = self.entries[slot]
+        del self.keys[(entry['task'], normalize_prompt(entry['prompt']))]
+        self.valid[slot] = False
+        self.task_ids[slot] = -1
+        self.list_ids[slot] = -1
+        del self.entries[slot]
+        self.free_slots.append(slot)
+        self.stats['evictions'] += 1
+
+    # ---------- 对外接口 ----------
+    def get(self, task, prompt):
+        """
+        查询缓存
+        参数：
+            task: 任务名（决定相似度阈值，不同任务的条目互不命中）
+            prompt: 提示词
+        返回：
+            命中时返回缓存的答案，否则返回None
+        """
+        normalized = normalize_prompt(prompt)
+        slot = self.keys.get((task, normalized))
+        if slot is None and task not in self.exact_tasks:
+            slot, similarity = self._search(self._task_id(task), self._embed(normalized))
+            if slot is not None and similarity < self.thresholds.get(task, self.default_threshold):
+                slot = None
+        if slot is not None:
+            self.lru.move_to_end(slot)
+            self.stats['hits'] += 1
+            return self.entries[slot]['answer']
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, task, prompt, answer):
+        """
+        写入缓存
+        参数：
+            task: 任务名
+            prompt: 提示词
+            answer: 答案（需要可JSON序列化，才能保存快照）
+        """
+        normalized = normalize_prompt(prompt)
+        slot = self.keys.get((task, normalized))
+        if slot is not None:
+            # 同一提示词重复写入：更新答案，不新增条目
+            self.entries[slot]['answer'] = answer
+            self.lru.move_to_end(slot)
+            return
+        if not self.free_slots:
+            self._evict()
+        entry = {'task': task, 'prompt': prompt, 'answer': answer}
+        self._store(self.free_slots.pop(), task, normalized, self._embed(normalized), entry)
+        self._maybe_rebuild_index()
+
+    def cached_call(self, task, prompt, fn):
+        """
+        先查缓存，未命中时调用 fn(prompt) 并写入缓存
+        返回：
+            (answer, hit)
+        """
+        answer = self.get(task, prompt)
+        if answer is not None:
+            return answer, True
+        answer = fn(prompt)
+        if answer is not None:
+            self.put(task, prompt, answer)
+        return answer, False
+
+    def hit_rate(self):
+        """命中率"""
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def save_snapshot(self, path):
+        """
+        保存索引快照：path.npz（向量）+ path.json（条目、LRU顺序）
+        参数：
+            path: 快照路径前缀，例如 'cache/semantic_cache'
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        slots = list(self.lru.keys())
+        np.savez_compressed(path.with_suffix('.npz'), vectors=self.vectors[slots])
+        meta = {
+            'dim': self.dim,
+            'entries': [self.entries[slot] for slot in slots],
+        }
+        with open(path.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def load_snapshot(self, path):
+        """
+        加载索引快照（按LRU顺序重新写入，不需要重新向量化）
+        相似度阈值始终以构造函数的配置为准，不从快照中读取
+        参数：
+            path: 快照路径前缀
+        返回：
+            是否加载成功（快照不存在时返回False）
+        """
+        path = Path(path)
+        if not path.with_suffix('.json').exists() or not path.with_suffix('.npz').exists():
+            return False
+        with open(path.with_suffix('.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['dim'] != self.dim:
+            raise ValueError(f"快照向量维度 {meta['dim']} 与当前配置 {self.dim} 不一致")
+        vectors = np.load(path.with_suffix('.npz'))['vectors']
+        self.centroids = None
+        self.list_ids[:] = -1
+        self.inverted_lists = []
+        self.indexed_size = 0
+        for entry, vector in zip(meta['entries'], vectors):
+            normalized = normalize_prompt(entry['prompt'])
+            slot = self.keys.get((entry['task'], normalized))
+            if slot is not None:
+                # 旧快照中的重复条目：后出现的（更新的）为准
+                self.entries[slot]['answer'] = entry['answer']
+                self.lru.move_to_end(slot)
+                continue
+            if not self.free_slots:
+                self._evict()
+            self._store(self.free_slots.pop(), entry['task'], normalized, vector, entry)
+        self._maybe_rebuild_index()
+        return True
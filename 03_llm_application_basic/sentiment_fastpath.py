@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+情感分析本地快速通道
+功能：用大模型标注过的评论（标签缓存）训练一个本地CPU分类器（字符n-gram + 逻辑回归），
+高置信度的评论直接本地判定（微秒级），只有不确定的评论才交给大模型。
+
+工作流程：
+1. 评论 → 本地分类器打分
+2. 置信度 >= 阈值：直接返回本地结果
+3. 置信度不足（或模型尚未训练）：调用大模型，结果写入标签缓存
+4. 新增标签累计到一定数量后，自动用全部缓存重新训练
+
+说明：
+- 训练使用 scikit-learn；训练完成后把权重"编译"成 {n-gram: 权重} 字典，
+  单条预测只需要查字典求和，不再经过 sklearn 的调用开销
+- 训练和预测共用 char_ngrams 提取特征（统一转小写、合并连续空白），编译后会抽查
+  编译结果与 sklearn 的 predict_proba 是否一致，保证两边看到的是同一个模型
+- 标签缓存为追加写 JSONL：{"review": 评论, "label": "正向/负向", "source": 标注来源}
+"""
+
+import json
+import math
+import time
+from pathlib import Path
+
+LABELS = ('负向', '正向')
+
+
+def char_ngrams(text, ngram_range=(1, 3)):
+    """
+    提取字符n-gram（去重），先统一转小写、合并连续空白
+    参数：
+        text: 文本
+        ngram_range: n-gram长度范围（闭区间）
+    返回：
+        n-gram集合
+    """
+    text = ' '.join(text.split()).lower()
+    grams = set()
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+def parse_sentiment_label(text):
+    """
+    从大模型回复中解析情感标签
+    参数：
+        text: 大模型回复
+    返回：
+        '正向'、'负向'，无法解析时返回None
+    """
+    if not text:
+        return None
+    if '负向' in text:
+        return '负向'
+    if '正向' in text:
+        return '正向'
+    return None
+
+
+class SentimentFastPath:
+    """
+    本地情感分类快速通道
+    """
+
+    def __init__(self, cache_path, threshold=0.9, retrain_every=200, min_train=50,
+                 ngram_range=(1, 3), C=1.0):
+        """
+        参数：
+            cache_path: 标签缓存文件路径（JSONL）
+            threshold: 本地直接判定所需的最低置信度
+            retrain_every: 新增多少条标签后重新训练
+            min_train: 训练所需的最少样本数（且两类都要有样本）
+            ngram_range: 字符n-gram长度范围
+            C: 逻辑回归正则化强度的倒数
+        """
+        self.cache_path = Path(cache_path)
+        self.threshold = threshold
+        self.retrain_every = retrain_every
+        self.min_train = min_train
+        self.ngram_range = ngram_range
+        self.C = C
+        self.weights = None
+        self.intercept = 0.0
+        self.labels = {}
+        self.new_labels = 0
+        self.stats = {'local': 0, 'llm': 0, 'retrain': 0}
+        self.load_cache()
+        self.train()
+
+    def load_cache(self):
+        """读取标签缓存，同一条评论以最后一次标注为准"""
+        if not self.cache_path.exists():
+            return
+        with open(self.cache_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get('label') in LABELS:
+                    self.labels[record['review']] = record['label']
+
+    def add_label(self, review, label, source='llm'):
+        """
+        追加一条标签到缓存，累计足够多的新标签后自动重新训练
+        参数：
+            review: 评论
+            label: '正向' 或 '负向'
+            source: 标注来源（例如模型名）
+        """
+        if label not in LABELS:
+            return
+        self.labels[review] = label
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'review': review, 'label': label, 'source': source}, ensure_ascii=False) + '\n')
+        self.new_labels += 1
+        if self.new_labels >= self.retrain_every:
+            self.train()
+
+    def train(self):
+        """
+        用全部缓存标签训练分类器，并编译为n-gram权重字典
+        返回：
+            是否训练成功（样本不足时返回False，保持原模型）
+        """
+        reviews = list(self.labels.keys())
+        y = [LABELS.index(self.labels[review]) for review in reviews]
+        if len(reviews) < self.min_train or len(set(y)) < 2:
+            return False
+
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        # 特征提取直接用 char_ngrams，与 predict() 完全一致（sklearn 自带的 char 分析器会另做小写和空白处理）
+        ngram_range = self.ngram_range
+        vectorizer = CountVectorizer(analyzer=lambda text: char_ngrams(text, ngram_range), binary=True)
+        X = vectorizer.fit_transform(reviews)
+        clf = LogisticRegression(C=self.C, max_iter=1000, class_weight='balanced')
+        clf.fit(X, y)
+
+        coef = clf.coef_[0]
+        self.weights = {gram: float(coef[index]) for gram, index in vectorizer.vocabulary_.items() if coef[index] != 0}
+        self.intercept = float(clf.intercept_[0])
+        self._check_compiled(vectorizer, clf, reviews[:20])
+        self.new_labels = 0
+        self.stats['retrain'] += 1
+        return True
+
+    def _check_compiled(self, vectorizer, clf, reviews, tolerance=1e-6):
+        """
+        抽查编译后的权重字典与 sklearn 模型的预测是否一致，包括大小写混合、多余空白的变体
+        参数：
+            vectorizer: 训练用的 CountVectorizer
+            clf: 训练好的 LogisticRegression
+            reviews: 抽查的评论
+            tolerance: 正向概率允许的误差
+        """
+        samples = []
+        for review in reviews:
+            samples += [review, review.upper(), review.title(), '  ' + '   '.join(review.split()) + ' \n']
+        expected = clf.predict_proba(vectorizer.transform(samples))[:, 1]
+        for sample, p_positive in zip(samples, expected):
+            label, confidence = self.predict(sample)
+            compiled = confidence if label == '正向' else 1.0 - confidence
+            if abs(compiled - p_positive) > tolerance:
+                raise RuntimeError(f"编译后的权重与 sklearn 模型不一致: {sample!r} {compiled:.6f} != {p_positive:.6f}")
+
+    def predict(self, review):
+        """
+        本地预测
+        参数：
+            review: 评论
+        返回：
+            (label, confidence)；模型尚未训练时返回 (None, 0.0)
+        """
+        if self.weights is None:
+            return None, 0.0
+        weights = self.weights
+        z = self.intercept
+        for gram in char_ngrams(review, self.ngram_range):
+            z += weights.get(gram, 0.0)
+        # 数值稳定的sigmoid
+        if z >= 0:
+            p_positive = 1.0 / (1.0 + math.exp(-z))
+        else:
+            e = math.exp(z)
+            p_positive = e / (1.0 + e)
+        if p_positive >= 0.5:
+            return '正向', p_positive
+        return '负向', 1.0 - p_positive
+
+    def classify(self, review, llm_fn, source='llm'):
+        """
+        分类一条评论：高置信度走本地，否则升级到大模型
+        参数：
+            review: 评论
+            llm_fn: 大模型标注函数 llm_fn(review) -> '正向'/'负向'/None
+            source: 写入标签缓存的标注来源
+        返回：
+            (label, source, confidence)，source 为 'local' 或 'llm'；
+            大模型的回复无法解析时返回 (None, 'llm', 0.0)
+        """
+        label, confidence = self.predict(review)
+        if label is not None and confidence >= self.threshold:
+            self.stats['local'] += 1
+            return label, 'local', confidence
+
+        self.stats['llm'] += 1
+        llm_label = llm_fn(review)
+        if llm_label not in LABELS:
+            return None, 'llm', 0.0
+        self.add_label(review, llm_label, source=source)
+        return llm_label, 'llm', 1.0
+
+
+def benchmark_local(fastpath, reviews, repeat=100):
+    """
+    测量本地预测的吞吐
+    参数：
+        fastpath: 已训练的 SentimentFastPath
+        reviews: 评论列表
+        repeat: 重复次数
+    返回：
+        {"predictions": 预测次数, "mean_us": 单条平均耗时(微秒), "per_second": 每秒预测条数}
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for review in reviews:
+            fastpath.predict(review)
+    total_s = time.perf_counter() - start
+    n = repeat * len(reviews)
+    return {
+        'predictions': n,
+        'mean_us': round(total_s / n * 1e6, 3) if n else 0.0,
+        'per_second': round(n / total_s, 1) if total_s > 0 else float('inf'),
+    }
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+工具预取（Speculative Tool Prefetch）
+功能：根据告警类型，预测模型第一轮大概率会调用的工具，在第一次调用模型的同时并行执行这些工具。
+
+为什么需要预取？
+- 对于"数据库连接数"类告警，模型第一轮几乎总是先调用 get_current_status
+- 这意味着在真正开始分析之前，要白白多一次完整的模型往返
+- 预取可以把工具结果提前注入对话（inject），或在模型请求时立即返回（serve），省掉一次往返
+
+两种模式：
+1. inject：在第一次调用模型之前并行执行预取工具，把结果作为工具消息注入对话
+2. serve：与第一次模型调用并行执行预取工具，模型请求该工具时直接返回已完成的结果
+"""
+
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# ==================== 预取规则表 ====================
+# 告警关键字 -> 第一轮可能调用的工具列表
+# 可以通过 load_prefetch_rules() 从JSON文件加载，或用 learn_prefetch_rules() 从历史轨迹中学习
+DEFAULT_PREFETCH_RULES = {
+    "数据库连接数": ["get_current_status"],
+    "CPU使用率": ["get_current_status"],
+    "内存使用率": ["get_current_status"],
+}
+
+
+def extract_alert_type(query):
+    """
+    从告警内容中提取告警类型
+    参数：
+        query: 告警文本，例如 "告警：数据库连接数超过设定阈值\\n时间：..."
+    返回：
+        告警类型字符串（"告警："后的第一行），无法识别时返回去掉首尾空白的第一行
+    """
+    match = re.search(r"告警[:：]\s*(.+)", query)
+    if match:
+        return match.group(1).strip()
+    return query.strip().split("\n")[0].strip()
+
+
+def match_prefetch_tools(query, rules):
+    """
+    根据规则表匹配需要预取的工具
+    参数：
+        query: 告警文本
+        rules: 预取规则表 {关键字: [工具名, ...]}
+    返回：
+        去重后的工具名列表（保持规则表中的顺序）
+    """
+    alert_type = extract_alert_type(query)
+    tools_to_fetch = []
+    for keyword, tool_names in rules.items():
+        if keyword in alert_type:
+            for tool_name in tool_names:
+                if tool_name not in tools_to_fetch:
+                    tools_to_fetch.append(tool_name)
+    return tools_to_fetch
+
+
+def load_prefetch_rules(path):
+    """
+    从JSON文件加载预取规则表，文件不存在时返回默认规则
+    参数：
+        path: 规则文件路径
+    返回：
+        预取规则表
+    """
+    rule_file = Path(path)
+    if not rule_file.exists():
+        return dict(DEFAULT_PREFETCH_RULES)
+    with open(rule_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_prefetch_rules(rules, path):
+    """
+    将预取规则表保存为JSON文件
+    参数：
+        rules: 预取规则表
+        path: 规则文件路径
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+
+
+def learn_prefetch_rules(traces, min_support=0.6, min_count=3):
+    """
+    从历史对话轨迹中学习预取规则
+    参数：
+        traces: 可迭代对象，每个元素为 {"query": 告警文本, "first_tool_calls": [第一轮调用的工具名, ...]}
+        min_support: 某告警类型下，工具在第一轮被调用的最低比例
+        min_count: 某告警类型至少出现的次数，样本太少时不生成规则
+    返回：
+        预取规则表 {告警类型: [工具名, ...]}
+    """
+    type_counts = Counter()
+    tool_counts = defaultdict(Counter)
+    for trace in traces:
+        alert_type = extract_alert_type(trace["query"])
+        type_counts[alert_type] += 1
+        # 同一轮内重复调用同一个工具只计一次
+        for tool_name in set(trace.get("first_tool_calls", [])):
+            tool_counts[alert_type][tool_name] += 1
+
+    rules = {}
+    for alert_type, total in type_counts.items():
+        if total < min_count:
+            continue
+        likely_tools = [
+            tool_name
+            for tool_name, count in tool_counts[alert_type].most_common()
+            if count / total >= min_support
+        ]
+        if likely_tools:
+            rules[alert_type] = likely_tools
+    return rules
+
+
+# ==================== 预取执行器 ====================
+class ToolPrefetcher:
+    """
+    工具预取执行器
+    只预取无参数工具（参数为空时结果与模型请求的调用等价），
+    每个预取结果只会被使用一次，之后的同名调用照常实时执行。
+    """
+
+    def __init__(self, tool_registry, rules=None, max_workers=4):
+        """
+        参数：
+            tool_registry: 工具注册表 {工具名: 可调用对象}
+            rules: 预取规则表，默认使用 DEFAULT_PREFETCH_RULES
+            max_workers: 并行执行工具的线程数
+        """
+        self.tool_registry = tool_registry
+        self.rules = rules if rules is not None else DEFAULT_PREFETCH_RULES
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, query):
+        """
+        根据告警内容启动预取，立即返回，不等待工具执行完成
+        参数：
+            query: 告警文本
+        返回：
+            已启动预取的工具名列表
+        """
+        started = []
+        for tool_name in match_prefetch_tools(query, self.rules):
+            tool_fn = self.tool_registry.get(tool_name)
+            if tool_fn is None:
+                continue
+            with self.lock:
+                if tool_name not in self.futures:
+                    self.futures[tool_name] = self.executor.submit(tool_fn)
+                    started.append(tool_name)
+        return started
+
+    def get(self, tool_name, arguments=None):
+        """
+        获取预取结果（模型请求工具时调用）
+        参数：
+            tool_name: 工具名
+            arguments: 模型给出的参数字典，有参数时不使用预取结果
+        返回：
+            工具结果字符串；没有可用的预取结果时返回None
+        """
+        if arguments:
+            return None
+        with self.lock:
+            future = self.futures.pop(tool_name, None)
+        if future is None:
+            self.misses += 1
+            return None
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"预取工具 {tool_name} 执行出错: {str(e)}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def build_injected_messages(self):
+        """
+        等待所有预取工具完成，并构造注入对话的消息
+        返回：
+            消息列表：一条带 tool_calls 的助手消息，加上对应的工具结果消息；没有预取结果时返回空列表
+        """
+        with self.lock:
+            tool_names = list(self.futures.keys())
+
+        tool_calls = []
+        tool_messages = []
+        for index, tool_name in enumerate(tool_names):
+            result = self.get(tool_name)
+            if result is None:
+                continue
+            tool_calls.append({
+                "id": f"prefetch_{index}",
+                "type": "function",
+                "function": {"name": tool_name, "arguments": "{}"}
+            })
+            tool_messages.append({
+                "role": "tool",
+                "name": tool_name,
+                "content": result
+            })
+
+        if not tool_calls:
+            return []
+        assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+        return [assistant_message] + tool_messages
+
+    def shutdown(self):
+        """释放线程池，未被使用的预取结果直接丢弃"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            self.futures.clear()
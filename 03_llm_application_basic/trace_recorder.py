@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+对话轨迹记录与确定性回放
+功能：把 Function Calling 对话中的每一次模型请求/响应、工具调用/结果以及耗时，
+以紧凑的追加写 JSONL 格式保存下来，并支持离线回放。
+
+轨迹文件格式（每行一个事件）：
+    {"trace_id": "...", "seq": 0, "type": "trace_start", "t_ms": 0.0, "data": {...}}
+事件类型：
+    trace_start     对话开始，data 中包含 name 和 meta（例如用户问题）
+    model_request   模型请求，data 中包含 messages 和调用参数
+    model_response  模型响应，data 中包含 response 和 elapsed_ms
+    tool_call       工具调用，data 中包含 name 和 arguments
+    tool_result     工具结果，data 中包含 name、result 和 elapsed_ms
+    trace_end       对话结束
+
+使用方式：
+1. 录制：把 TraceRecorder 传给 run_conversation()/run_ops_analysis() 的 recorder 参数
+2. 回放：用 load_traces() 读取轨迹，把 TracePlayer 作为 recorder 传入，
+   模型响应和工具结果全部来自录制内容，不需要网络
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from pathlib import Path
+
+
+# ==================== 序列化工具 ====================
+def to_jsonable(obj):
+    """
+    把 dashscope 响应对象等转换为可JSON序列化的基础类型
+    参数：
+        obj: 任意对象（dashscope 的响应对象本身是 dict 的子类）
+    返回：
+        由 dict/list/str/int/float/bool/None 组成的对象
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    if hasattr(obj, "__dict__"):
+        return {k: to_jsonable(v) for k, v in vars(obj).items() if not k.startswith("_")}
+    return str(obj)
+
+
+class AttrDict(dict):
+    """
+    支持属性访问的字典，用于还原录制的响应
+    回放时 response.output.choices[0].message 与 message['content'] 两种写法都可用
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @classmethod
+    def wrap(cls, obj):
+        """递归地把字典转换为 AttrDict"""
+        if isinstance(obj, dict):
+            return cls({k: cls.wrap(v) for k, v in obj.items()})
+        if isinstance(obj, list):
+            return [cls.wrap(v) for v in obj]
+        return obj
+
+
+# ==================== 轨迹录制 ====================
+class TraceRecorder:
+    """
+    轨迹录制器
+    每个事件写一行JSON并立即刷新，进程中途退出也不会丢失已记录的事件
+    写入加锁，预取工具在其他线程中执行时也可以安全记录
+    """
+
+    def __init__(self, path):
+        """
+        参数：
+            path: 轨迹文件路径（追加写入）
+        """
+        self.path = Path(path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.trace_id = None
+        self.seq = 0
+        self.start_time = None
+        self.lock = threading.Lock()
+
+    def _write(self, event_type, data):
+        with self.lock:
+            event = {
+                "trace_id": self.trace_id,
+                "seq": self.seq,
+                "type": event_type,
+                "t_ms": round((time.perf_counter() - self.start_time) * 1000, 3),
+                "data": data,
+            }
+            self.file.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self.file.flush()
+            self.seq += 1
+
+    def start_trace(self, name, meta=None):
+        """
+        开始一段新的对话轨迹
+        参数：
+            name: 轨迹名称，例如 "ops_analysis"
+            meta: 附加信息，例如用户问题
+        返回：
+            trace_id
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.seq = 0
+        self.start_time = time.perf_counter()
+        self._write("trace_start", {"name": name, "meta": to_jsonable(meta or {}), "wall_time": time.time()})
+        return self.trace_id
+
+    def end_trace(self):
+        """结束当前对话轨迹"""
+        self._write("trace_end", {})
+        self.trace_id = None
+
+    def call_model(self, model_fn, messages, **kwargs):
+        """
+        调用模型并记录请求、响应和耗时
+        参数：
+            model_fn: 实际的模型调用函数，例如脚本中的 get_response
+            messages: 对话历史
+        返回：
+            model_fn 的返回值
+        """
+        self._write("model_request", {"messages": to_jsonable(messages), "kwargs": to_jsonable(kwargs)})
+        start = time.perf_counter()
+        response = model_fn(messages, **kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._write("model_response", {"response": to_jsonable(response), "elapsed_ms": round(elapsed_ms, 3)})
+        return response
+
+    def wrap_tool(self, name, tool_fn):
+        """
+        包装工具函数，调用时记录参数、结果和耗时
+        参数：
+            name: 工具名
+            tool_fn: 工具函数
+        返回：
+            包装后的函数，调用方式与 tool_fn 相同
+        """
+        def traced_tool(*args, **kwargs):
+            self._write("tool_call", {"name": name, "arguments": to_jsonable(kwargs)})
+            start = time.perf_counter()
+            result = tool_fn(*args, **kwargs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._write("tool_result", {"name": name, "result": to_jsonable(result), "elapsed_ms": round(elapsed_ms, 3)})
+            return result
+        return traced_tool
+
+    def close(self):
+        """关闭轨迹文件"""
+        self.file.close()
+
+
+# ==================== 轨迹读取 ====================
+def load_traces(path):
+    """
+    读取轨迹文件，按 trace_id 分组
+    参数：
+        path: 轨迹文件路径
+    返回：
+        轨迹列表，每个元素为按 seq 排序的事件列表
+    """
+    traces = defaultdict(list)
+    order = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            trace_id = event["trace_id"]
+            if trace_id not in traces:
+                order.append(trace_id)
+            traces[trace_id].append(event)
+    return [sorted(traces[trace_id], key=lambda e: e["seq"]) for trace_id in order]
+
+
+def trace_meta(trace):
+    """返回轨迹开始事件中的 meta 信息"""
+    for event in trace:
+        if event["type"] == "trace_start":
+            return event["data"].get("meta", {})
+    return {}
+
+
+def extract_prefetch_samples(traces, query_key="query"):
+    """
+    从轨迹中提取预取规则的学习样本（见 tool_prefetch.learn_prefetch_rules）
+    "第一轮工具调用"指第二次模型请求之前发生的所有工具调用
+    参数：
+        traces: load_traces() 的返回值
+        query_key: meta 中保存用户问题的键名
+    返回：
+        [{"query": 用户问题, "first_tool_calls": [工具名, ...]}, ...]
+    """
+    samples = []
+    for trace in traces:
+        query = trace_meta(trace).get(query_key)
+        if not query:
+            continue
+        first_tool_calls = []
+        model_requests = 0
+        for event in trace:
+            if event["type"] == "model_request":
+                model_requests += 1
+                if model_requests >= 2:
+                    break
+            elif event["type"] == "tool_call":
+                first_tool_calls.append(event["data"]["name"])
+        samples.append({"query": query, "first_tool_calls": first_tool_calls})
+    return samples
+
+
+# ==================== 确定性回放 ====================
+class ReplayMismatchError(Exception):
+    """回放时请求与录制内容不一致"""
+
+
+class TracePlayer:
+    """
+    轨迹回放器，与 TraceRecorder 接口相同，可以直接替换 recorder 参数
+    模型响应按录制顺序依次返回；工具结果按工具名分别排队返回（预取工具可能在其他线程中先执行）
+    """
+
+    def __init__(self, trace, strict=False):
+        """
+        参数：
+            trace: load_traces() 返回的单条轨迹
+            strict: 为True时校验每次模型请求的 messages 是否与录制内容一致
+        """
+        self.trace = trace
+        self.strict = strict
+        self.reset()
+
+    def reset(self):
+        """重置回放位置，同一个回放器可以反复回放"""
+        self.requests = deque()
+        self.responses = deque()
+        self.tool_results = defaultdict(deque)
+        for event in self.trace:
+            if event["type"] == "model_request":
+                self.requests.append(event["data"]["messages"])
+            elif event["type"] == "model_response":
+                self.responses.append(event["data"]["response"])
+            elif event["type"] == "tool_result":
+                self.tool_results[event["data"]["name"]].append(event["data"]["result"])
+
+    def start_trace(self, name, meta=None):
+        return None
+
+    def end_trace(self):
+        pass
+
+    def call_model(self, model_fn, messages, **kwargs):
+        """忽略 model_fn，直接返回下一个录制的响应"""
+        if not self.responses:
+            raise ReplayMismatchError("录制的模型响应已用完")
+        recorded_messages = self.requests.popleft() if self.requests else None
+        if self.strict and recorded_messages != to_jsonable(messages):
+            raise ReplayMismatchError("模型请求与录制内容不一致")
+        response = self.responses.popleft()
+        return AttrDict.wrap(response) if response is not None else None
+
+    def wrap_tool(self, name, tool_fn):
+        """返回一个直接给出录制结果的工具函数"""
+        def replayed_tool(*args, **kwargs):
+            if not self.tool_results[name]:
+                raise ReplayMismatchError(f"工具 {name} 的录制结果已用完")
+            return self.tool_results[name].popleft()
+        return replayed_tool
+
+    def close(self):
+        pass
+
+
+def benchmark_replay(trace, agent_fn, repeat=1000):
+    """
+    反复回放同一条轨迹，测量Agent循环本身的开销
+    参数：
+        trace: 单条轨迹
+        agent_fn: 接收 recorder 参数的对话函数，例如 lambda recorder: run_ops_analysis(recorder=recorder)
+        repeat: 回放次数
+    返回：
+        {"repeat": 次数, "total_s": 总耗时, "replays_per_s": 每秒回放次数, "mean_us": 平均每次耗时(微秒)}
+    """
+    player = TracePlayer(trace)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        player.reset()
+        agent_fn(player)
+    total_s = time.perf_counter() - start
+    return {
+        "repeat": repeat,
+        "total_s": round(total_s, 6),
+        "replays_per_s": round(repeat / total_s, 1) if total_s > 0 else float("inf"),
+        "mean_us": round(total_s / repeat * 1e6, 3),
+    }
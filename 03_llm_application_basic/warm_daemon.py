@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+常驻服务（warm daemon）
+每次运行脚本都要重新导入 dashscope / numpy / sklearn、重建客户端、加载缓存和模型，
+对一次只处理一条评论或一条告警的短任务来说，冷启动时间远大于真正的处理时间。
+
+常驻模式把这些都留在内存里，通过本地 Unix socket 提供服务:
+1. 服务进程启动时（或第一次请求时）加载各个服务，之后所有请求复用已导入的库、
+   模型路由器、语义缓存、本地分类器和训练好的反欺诈模型
+2. 客户端是一个很薄的命令行：只导入标准库，把请求以一行 JSON 发给服务进程并打印结果
+
+协议：每个请求和响应都是一行 JSON
+    请求  {"method": "sentiment", "params": {"review": "..."}}
+    响应  {"ok": true, "result": ..., "elapsed_ms": 1.23}
+          {"ok": false, "error": "..."}
+
+可用的服务:
+    sentiment  情感分析（1-情感分析-Qwen.py），params: {"review": "..."} 或 {"reviews": [...]}
+    weather    天气查询 Function Calling（2-天气Function-Qwen.py），params: {"query": "..."}
+    ops        运维事件分析（4-运维事件处置-Qwen.py，先经过告警预筛），params: {"query": "..."}
+    fraud      理赔欺诈打分（07-保险反欺诈 保存的打分模型包），params: {"claims": [{原始理赔字段: 取值}, ...]}（字段与训练数据的列一致）
+    status     服务状态：已加载的服务、请求数和平均耗时
+    shutdown   停止服务进程
+
+命令行:
+    python warm_daemon.py serve --preload sentiment,fraud
+    python warm_daemon.py call sentiment '{"review": "这款音效特别好"}'
+    python warm_daemon.py status
+    python warm_daemon.py stop
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+FRAUD_DIR = BASE_DIR / '07-保险反欺诈'
+DEFAULT_SOCKET = os.environ.get('WARM_DAEMON_SOCKET', '/tmp/llm_dev_learning.sock')
+
+
+def load_script(filename, module_name):
+    """
+    按文件路径导入脚本（脚本文件名含中文和连字符，不能直接 import）
+    参数：
+        filename: 相对于本目录的脚本文件名
+        module_name: 导入后的模块名
+    返回：
+        module: 已执行的模块（脚本的 __main__ 部分不会执行）
+    """
+    spec = importlib.util.spec_from_file_location(module_name, BASE_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ==================== 各服务的加载与处理 ====================
+# 每个服务是一个 (加载函数, 处理函数, 关闭函数) 三元组；加载函数返回的状态在进程内常驻
+
+def _load_sentiment():
+    return load_script('1-情感分析-Qwen.py', 'sentiment_qwen')
+
+
+def _handle_sentiment(module, params):
+    reviews = params.get('reviews') or [params['review']]
+    results = []
+    for review in reviews:
+        label, source, confidence = module.classify_review(review)
+        results.append({'review': review, 'label': label, 'source': source, 'confidence': confidence})
+    return results if 'reviews' in params else results[0]
+
+
+def _close_sentiment(module):
+    module.semantic_cache.save_snapshot(module.SEMANTIC_CACHE_SNAPSHOT)
+
+
+def _load_weather():
+    return load_script('2-天气Function-Qwen.py', 'weather_qwen')
+
+
+def _handle_weather(module, params):
+    from trace_recorder import to_jsonable
+    message = module.run_conversation(params.get('query', '大连的天气怎样'))
+    if message is None:
+        # 与 ops 相同：模型调用失败时报错，交给调用方（work_queue 的 worker）重试
+        raise RuntimeError("天气查询没有得到模型的回复，模型调用可能失败")
+    return to_jsonable(message)
+
+
+def _load_ops():
+    from metric_triage import MetricTriage
+    from semantic_cache import SemanticCache
+
+    module = load_script('4-运维事件处置-Qwen.py', 'ops_qwen')
+    module.daemon_semantic_cache = SemanticCache()
+    module.daemon_semantic_cache.load_snapshot(module.SEMANTIC_CACHE_SNAPSHOT)
+    # 预筛器常驻进程内，指标历史在多次告警之间持续积累
+    module.daemon_triage = MetricTriage()
+    return module
+
+
+def _handle_ops(module, params):
+    triage = module.daemon_triage
+    decisions_before = dict(triage.decisions)
+    messages = module.run_ops_analysis(params.get('query'), semantic_cache=module.daemon_semantic_cache,
+                                       triage=triage)
+    final_message = messages[-1]
+    if final_message.get('role') != 'assistant':
+        # run_ops_analysis 在模型调用失败时只打印错误并结束循环，这里必须报错，
+        # 否则 work_queue 的 worker 会把失败的任务项当作完成确认掉，不会重试或进入死信
+        raise RuntimeError(f"运维分析没有得到模型的结论（最后一条消息为 {final_message.get('role')}），模型调用可能失败")
+    return {
+        'conclusion': final_message.get('content'),
+        'rounds': sum(1 for message in messages if message.get('role') == 'assistant'),
+        'triage': triage.last_result['decision'] if triage.decisions != decisions_before else None,
+        'llm_call_rate': round(triage.llm_call_rate(), 3),
+    }
+
+
+def _close_ops(module):
+    module.daemon_semantic_cache.save_snapshot(module.SEMANTIC_CACHE_SNAPSHOT)
+
+
+def _load_fraud():
+    import joblib
+    import numpy as np
+
+    # 编译后的树模型等依赖 07 目录下的本地模块，反序列化前加入搜索路径
+    if str(FRAUD_DIR) not in sys.path:
+        sys.path.insert(0, str(FRAUD_DIR))
+    from claim_explain import make_explainer
+
+    bundle_path = FRAUD_DIR / 'checkpoints' / 'fraud_scoring_bundle.joblib'
+    if not bundle_path.exists():
+        raise FileNotFoundError(f"未找到打分模型包 {bundle_path}，请先运行 insurance_fraud_case_study.py")
+    bundle = joblib.load(bundle_path)
+    if 'high_claim_cutoff' not in bundle:
+        raise ValueError(f"打分模型包 {bundle_path} 缺少特征工程参数，请重新运行 insurance_fraud_case_study.py")
+    # 模型在标准化后的特征上训练，标准化后的背景均值为0
+    bundle['explainer'] = make_explainer(bundle['model'], np.zeros((1, len(bundle['numeric_features']))))
+    return bundle
+
+
+def _handle_fraud(bundle, params):
+    from claim_explain import reason_codes
+    from claim_features import prepare_claims
+
+    features = bundle['numeric_features']
+    # 原始理赔走与训练相同的编码和特征工程，缺少必需字段时报错（不做均值填充，否则分数和原因码都不可信）
+    claims = prepare_claims(params['claims'], features, bundle['label_encoders'], bundle['high_claim_cutoff'])
+
+    X = bundle['scaler'].transform(claims.values)
+    scorer = bundle['compiled_model'] or bundle['model']
+    scores = scorer.predict_proba(X)[:, 1]
+    result = {'model': bundle['model_name'], 'scores': scores.round(6).tolist()}
+    if bundle['explainer'] is not None:
+        result['reasons'] = reason_codes(bundle['explainer'].shap_values(X), claims, features,
+                                         bundle['label_encoders'], top_k=params.get('top_k', 3))
+    return result
+
+
+SERVICES = {
+    'sentiment': (_load_sentiment, _handle_sentiment, _close_sentiment),
+    'weather': (_load_weather, _handle_weather, None),
+    'ops': (_load_ops, _handle_ops, _close_ops),
+    'fraud': (_load_fraud, _handle_fraud, None),
+}
+
+
+class DaemonState:
+    """服务进程内的常驻状态：已加载的服务、每个服务的锁和请求统计"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.services = {}
+        self.service_locks = {name: threading.Lock() for name in SERVICES}
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get_service(self, name):
+        """返回已加载的服务状态，第一次使用时加载"""
+        if name not in SERVICES:
+            raise KeyError(f"未知的服务: {name}")
+        if name not in self.services:
+            load_start = time.perf_counter()
+            self.services[name] = SERVICES[name][0]()
+            self._record(f'{name}:load', time.perf_counter() - load_start)
+        return self.services[name]
+
+    def preload(self, names):
+        for name in names:
+            with self.service_locks[name]:
+                self.get_service(name)
+
+    def handle(self, method, params):
+        if method == 'status':
+            return self.status()
+        # 各脚本内部有共享状态（语义缓存、本地分类器等），同一服务的请求串行处理
+        with self.service_locks.get(method) or threading.Lock():
+            service = self.get_service(method)
+            return SERVICES[method][1](service, params)
+
+    def _record(self, name, elapsed):
+        with self._stats_lock:
+            count, total = self.stats.get(name, (0, 0.0))
+            self.stats[name] = (count + 1, total + elapsed)
+
+    def status(self):
+        with self._stats_lock:
+            stats = {name: {'count': count, 'avg_ms': round(total / count * 1000, 3)}
+                     for name, (count, total) in self.stats.items()}
+        return {
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'loaded_services': sorted(self.services),
+            'stats': stats,
+        }
+
+    def close(self):
+        for name, service in self.services.items():
+            close_fn = SERVICES[name][2]
+            if close_fn:
+                close_fn(service)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        state = self.server.state
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            try:
+                request = json.loads(line)
+                method = request['method']
+                if method == 'shutdown':
+                    response = {'ok': True, 'result': 'shutting down'}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    response = {'ok': True, 'result': state.handle(method, request.get('params') or {})}
+                    state._record(method, time.perf_counter() - start)
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            response['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class WarmDaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, state):
+        self.state = state
+        super().__init__(socket_path, _RequestHandler)
+
+
+def serve(socket_path=DEFAULT_SOCKET, preload=()):
+    """
+    启动常驻服务（阻塞直到收到 shutdown 请求或 Ctrl+C）
+    参数：
+        socket_path: Unix socket 路径
+        preload: 启动时预先加载的服务名
+    """
+    # 各脚本的缓存、轨迹等相对路径以本目录为基准
+    os.chdir(BASE_DIR)
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    if os.path.exists(socket_path):
+        if _is_alive(socket_path):
+            raise RuntimeError(f"常驻服务已在运行: {socket_path}")
+        os.unlink(socket_path)   # 上次异常退出留下的 socket 文件
+
+    state = DaemonState()
+    state.preload(preload)
+    server = WarmDaemonServer(socket_path, state)
+    print(f"常驻服务已启动: {socket_path}（pid {os.getpid()}，已加载: {sorted(state.services) or '无'}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("常驻服务已停止")
+
+
+# ==================== 客户端 ====================
+
+def request(method, params=None, socket_path=DEFAULT_SOCKET, timeout=120):
+    """
+    向常驻服务发送一个请求
+    参数：
+        method: 服务名，如 'sentiment'、'fraud'、'status'
+        params: 请求参数
+        socket_path: Unix socket 路径
+        timeout: 超时时间（秒）
+    返回：
+        dict: 服务响应（ok、result/error、elapsed_ms）
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        payload = json.dumps({'method': method, 'params': params or {}}, ensure_ascii=False) + '\n'
+        client.sendall(payload.encode('utf-8'))
+        with client.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("常驻服务未返回响应")
+    return json.loads(line)
+
+
+def _is_alive(socket_path):
+    try:
+        request('status', socket_path=socket_path, timeout=2)
+        return True
+    except OSError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻服务：通过本地 Unix socket 复用已加载的库、客户端和模型')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket 路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve_parser = sub.add_parser('serve', help='启动常驻服务')
+    serve_parser.add_argument('--preload', default='', help=f"启动时预加载的服务，逗号分隔，可选: {','.join(SERVICES)}")
+    call_parser = sub.add_parser('call', help='调用一个服务')
+    call_parser.add_argument('method', help='服务名')
+    call_parser.add_argument('params', nargs='?', default='{}', help='JSON 格式的参数')
+    sub.add_parser('status', help='查看服务状态')
+    sub.add_parser('stop', help='停止常驻服务')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.socket, [name for name in args.preload.split(',') if name])
+        return 0
+
+    method = {'status': 'status', 'stop': 'shutdown'}.get(args.command, getattr(args, 'method', None))
+    params = json.loads(args.params) if args.command == 'call' else {}
+    try:
+        response = request(method, params, socket_path=args.socket)
+    except OSError as e:
+        print(f"无法连接常驻服务 {args.socket}: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
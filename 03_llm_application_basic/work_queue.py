@@ -0,0 +1,564 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+分布式任务队列（多机分摊大模型批处理）
+一台机器上的情感分析或告警分析批任务，受限于这台机器的调用配额和CPU，并发再高也有上限。
+分布式模式把批任务拆成分片放进 Redis 队列（.env.example 中的 REDIS_URL），多台机器上的
+worker 各自拉取分片处理，吞吐量随 worker 数量线性增长:
+1. 协调者（Coordinator）把输入记录按 shard_size 分片入队：评论按批（1-情感分析-Qwen.py），
+   告警逐条（4-运维事件处置-Qwen.py），每个分片一个任务项
+2. worker 取出任务项时获得一个可见性超时（visibility timeout）租约，处理完后确认（ack）并写回结果；
+   worker 崩溃或超时未确认的任务项，租约到期后自动回到队列，由其他 worker 重新处理
+3. 处理抛异常的任务项重新入队重试，累计尝试 max_attempts 次仍失败的（毒消息）移入死信，不再重试
+4. worker 复用 warm_daemon 的服务加载逻辑，进程内常驻模型路由器、语义缓存和本地分类器
+
+任务项至少被处理一次（at-least-once）：租约到期后旧 worker 仍可能写回结果，同一任务项的结果以最后一次为准。
+
+两种队列实现接口相同:
+    RedisBroker     Redis 实现，取出、确认、重试都用 Lua 脚本保证原子性，租约时间以 Redis 服务器时钟为准
+    InMemoryBroker  进程内实现，用于测试和单机多线程运行，不依赖 Redis
+
+命令行:
+    python work_queue.py submit sentiment reviews.txt --shard-size 20 --wait
+    python work_queue.py submit fraud claims.jsonl --wait   # 理赔每行一个 JSON 对象（原始理赔字段）
+    python work_queue.py worker                      # 在每台机器上启动一个或多个
+    python work_queue.py stats
+    python work_queue.py bench --workers 1,2,4,8     # 进程内模拟大模型延迟，验证吞吐量随 worker 数线性增长
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+DEFAULT_QUEUE = 'llm_batch'
+
+# 批量任务：一个分片的全部记录放在同一个参数里；逐条任务：每个分片只有一条记录
+BATCH_PARAM_KEYS = {'sentiment': 'reviews', 'fraud': 'claims'}
+SINGLE_PARAM_KEYS = {'ops': 'query', 'weather': 'query'}
+# 记录是结构化数据的任务：输入文件每行一个 JSON 对象，其余任务每行一条文本
+JSON_RECORD_TASKS = ('fraud',)
+
+
+def read_records(task, path):
+    """
+    读取 submit 的输入文件
+    文本任务每行一条记录（告警中的换行写成 \\n）；JSON_RECORD_TASKS 中的任务每行一个 JSON 对象，
+    例如理赔 {"total_claim_amount": 71610, ...}，解析失败或不是对象时指出行号，不把原始字符串提交给 worker
+    参数：
+        task: 任务类型
+        path: 输入文件路径
+    返回：
+        记录列表
+    """
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            if task not in JSON_RECORD_TASKS:
+                records.append(line.rstrip('\n').replace('\\n', '\n'))
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path} 第 {line_no} 行不是合法的 JSON: {e}") from e
+            if not isinstance(record, dict):
+                raise ValueError(f"{path} 第 {line_no} 行应为 JSON 对象，实际为 {type(record).__name__}")
+            records.append(record)
+    return records
+
+
+class InMemoryBroker:
+    """
+    进程内任务队列（与 RedisBroker 接口相同）
+    参数：
+        visibility_timeout: 任务项取出后的租约时长（秒），超时未确认则重新入队
+        max_attempts: 每个任务项的最大尝试次数，超过后移入死信
+    """
+
+    def __init__(self, visibility_timeout=300, max_attempts=3):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending = collections.deque()
+        self._processing = {}
+        self._payloads = {}
+        self._attempts = collections.Counter()
+        self._results = {}
+        self._dead = {}
+        self._retried = 0
+
+    def enqueue(self, items):
+        """
+        任务项入队
+        参数：
+            items: [(任务项ID, 可JSON序列化的任务内容), ...]
+        """
+        with self._lock:
+            for item_id, payload in items:
+                self._payloads[item_id] = json.dumps(payload, ensure_ascii=False)
+                self._pending.append(item_id)
+
+    def reserve(self):
+        """
+        取出一个任务项并获得租约
+        返回：
+            (任务项ID, 任务内容, 第几次尝试)，队列为空时返回 None
+        """
+        with self._lock:
+            self._requeue_expired_locked()
+            while self._pending:
+                item_id = self._pending.popleft()
+                # 租约到期重新入队后，原 worker 可能已经写回了结果
+                if item_id in self._results or item_id in self._dead:
+                    continue
+                self._attempts[item_id] += 1
+                self._processing[item_id] = time.monotonic() + self.visibility_timeout
+                return item_id, json.loads(self._payloads[item_id]), self._attempts[item_id]
+        return None
+
+    def ack(self, item_id, result):
+        """确认任务项处理完成并写回结果"""
+        with self._lock:
+            self._processing.pop(item_id, None)
+            self._results[item_id] = json.dumps(result, ensure_ascii=False)
+
+    def nack(self, item_id, error):
+        """
+        任务项处理失败：未达到最大尝试次数时重新入队，否则移入死信
+        返回：
+            'retry' 或 'dead'
+        """
+        with self._lock:
+            self._processing.pop(item_id, None)
+            if self._attempts[item_id] >= self.max_attempts:
+                self._dead[item_id] = error
+                return 'dead'
+            self._pending.append(item_id)
+            self._retried += 1
+            return 'retry'
+
+    def requeue_expired(self):
+        """把租约到期的任务项放回队列（或移入死信），返回处理的数量"""
+        with self._lock:
+            return self._requeue_expired_locked()
+
+    def _requeue_expired_locked(self):
+        now = time.monotonic()
+        expired = [item_id for item_id, deadline in self._processing.items() if deadline <= now]
+        for item_id in expired:
+            del self._processing[item_id]
+            if self._attempts[item_id] >= self.max_attempts:
+                self._dead[item_id] = 'visibility timeout exceeded'
+            else:
+                self._pending.append(item_id)
+                self._retried += 1
+        return len(expired)
+
+    def results(self, item_ids):
+        """返回 {任务项ID: 结果}，只包含已完成的任务项"""
+        with self._lock:
+            return {item_id: json.loads(self._results[item_id]) for item_id in item_ids if item_id in self._results}
+
+    def dead(self, item_ids):
+        """返回 {任务项ID: 最后一次的错误信息}，只包含已移入死信的任务项"""
+        with self._lock:
+            return {item_id: self._dead[item_id] for item_id in item_ids if item_id in self._dead}
+
+    def stats(self):
+        """队列状态：待处理、处理中、已完成、死信、重试次数"""
+        with self._lock:
+            return {'pending': len(self._pending), 'processing': len(self._processing),
+                    'done': len(self._results), 'dead': len(self._dead), 'retried': self._retried}
+
+
+# Redis 实现的 Lua 脚本；KEYS 依次为 pending、processing、payloads、attempts、results、dead、counters
+_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+while true do
+    local item_id = redis.call('RPOP', KEYS[1])
+    if not item_id then return nil end
+    if redis.call('HEXISTS', KEYS[5], item_id) == 0 and redis.call('HEXISTS', KEYS[6], item_id) == 0 then
+        local attempts = redis.call('HINCRBY', KEYS[4], item_id, 1)
+        redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), item_id)
+        return {item_id, redis.call('HGET', KEYS[3], item_id), attempts}
+    end
+end
+"""
+
+_ACK_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[5], ARGV[1], ARGV[2])
+return 1
+"""
+
+_NACK_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local attempts = tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0')
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[6], ARGV[1], ARGV[2])
+    return 'dead'
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('HINCRBY', KEYS[7], 'retried', 1)
+return 'retry'
+"""
+
+_REQUEUE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, item_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], item_id)
+    local attempts = tonumber(redis.call('HGET', KEYS[4], item_id) or '0')
+    if attempts >= tonumber(ARGV[1]) then
+        redis.call('HSET', KEYS[6], item_id, 'visibility timeout exceeded')
+    else
+        redis.call('LPUSH', KEYS[1], item_id)
+        redis.call('HINCRBY', KEYS[7], 'retried', 1)
+    end
+end
+return #expired
+"""
+
+
+class RedisBroker:
+    """
+    Redis 任务队列（多机共享）
+    参数：
+        url: Redis 地址，默认读取环境变量 REDIS_URL
+        queue: 队列名，所有键以 llmq:{queue}: 为前缀
+        visibility_timeout: 任务项取出后的租约时长（秒）
+        max_attempts: 每个任务项的最大尝试次数
+        client: 已创建的 Redis 客户端（测试时可传入其他兼容客户端），为 None 时按 url 创建
+    """
+
+    def __init__(self, url=None, queue=DEFAULT_QUEUE, visibility_timeout=300, max_attempts=3, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+                                          decode_responses=True)
+        self.client = client
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        prefix = f"llmq:{queue}:"
+        self.keys = [prefix + name for name in
+                     ('pending', 'processing', 'payloads', 'attempts', 'results', 'dead', 'counters')]
+        self._reserve = client.register_script(_RESERVE_SCRIPT)
+        self._ack = client.register_script(_ACK_SCRIPT)
+        self._nack = client.register_script(_NACK_SCRIPT)
+        self._requeue = client.register_script(_REQUEUE_SCRIPT)
+
+    def enqueue(self, items):
+        pending, _, payloads = self.keys[:3]
+        pipe = self.client.pipeline()
+        for item_id, payload in items:
+            pipe.hset(payloads, item_id, json.dumps(payload, ensure_ascii=False))
+            pipe.lpush(pending, item_id)
+        pipe.execute()
+
+    def reserve(self):
+        # 先回收租约到期的任务项：worker 崩溃后不需要单独的巡检进程
+        self.requeue_expired()
+        reserved = self._reserve(keys=self.keys, args=[self.visibility_timeout])
+        if not reserved:
+            return None
+        item_id, payload, attempts = reserved
+        return item_id, json.loads(payload), int(attempts)
+
+    def ack(self, item_id, result):
+        self._ack(keys=self.keys, args=[item_id, json.dumps(result, ensure_ascii=False)])
+
+    def nack(self, item_id, error):
+        return self._nack(keys=self.keys, args=[item_id, error, self.max_attempts])
+
+    def requeue_expired(self):
+        return self._requeue(keys=self.keys, args=[self.max_attempts])
+
+    def results(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+        values = self.client.hmget(self.keys[4], item_ids)
+        return {item_id: json.loads(value) for item_id, value in zip(item_ids, values) if value is not None}
+
+    def dead(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+        values = self.client.hmget(self.keys[5], item_ids)
+        return {item_id: value for item_id, value in zip(item_ids, values) if value is not None}
+
+    def stats(self):
+        pending, processing, _, _, results, dead, counters = self.keys
+        pipe = self.client.pipeline()
+        pipe.llen(pending)
+        pipe.zcard(processing)
+        pipe.hlen(results)
+        pipe.hlen(dead)
+        pipe.hget(counters, 'retried')
+        n_pending, n_processing, n_done, n_dead, retried = pipe.execute()
+        return {'pending': n_pending, 'processing': n_processing, 'done': n_done,
+                'dead': n_dead, 'retried': int(retried or 0)}
+
+    def purge(self):
+        """删除这个队列的全部键"""
+        self.client.delete(*self.keys)
+
+
+def open_broker(url=None, queue=DEFAULT_QUEUE, **kwargs):
+    """
+    按地址创建任务队列
+    参数：
+        url: 'memory://' 使用进程内队列；其他值（或 None，读取 REDIS_URL）使用 Redis
+        queue: 队列名
+        **kwargs: visibility_timeout、max_attempts
+    返回：
+        InMemoryBroker 或 RedisBroker
+    """
+    url = url or os.environ.get('REDIS_URL')
+    if url and url.startswith('memory://'):
+        return InMemoryBroker(**kwargs)
+    return RedisBroker(url, queue=queue, **kwargs)
+
+
+class Coordinator:
+    """
+    协调者：把输入记录分片入队，并按提交顺序收集结果
+    参数：
+        broker: 任务队列
+        shard_size: 批量任务（情感分析等）每个分片的记录数；逐条任务（运维告警等）固定为1
+    """
+
+    def __init__(self, broker, shard_size=20):
+        self.broker = broker
+        self.shard_size = shard_size
+
+    def submit(self, task, records, job_id=None):
+        """
+        提交一个批任务
+        参数：
+            task: 任务类型，如 'sentiment'、'ops'
+            records: 输入记录列表（评论、告警文本，或理赔 {字段: 取值} 等）
+            job_id: 任务ID，默认随机生成
+        返回：
+            dict: job_id、task、item_ids（按分片顺序）
+        """
+        if task not in BATCH_PARAM_KEYS and task not in SINGLE_PARAM_KEYS:
+            raise ValueError(f"不支持的任务类型: {task}")
+        job_id = job_id or uuid.uuid4().hex[:12]
+        size = self.shard_size if task in BATCH_PARAM_KEYS else 1
+        items = []
+        for index, start in enumerate(range(0, len(records), size)):
+            shard = list(records[start:start + size])
+            params = {BATCH_PARAM_KEYS[task]: shard} if task in BATCH_PARAM_KEYS else {SINGLE_PARAM_KEYS[task]: shard[0]}
+            items.append((f"{job_id}:{index:06d}", {'task': task, 'params': params}))
+        self.broker.enqueue(items)
+        return {'job_id': job_id, 'task': task, 'item_ids': [item_id for item_id, _ in items]}
+
+    def wait(self, job, timeout=None, poll_interval=0.2):
+        """
+        等待批任务的所有分片完成（或进入死信）
+        参数：
+            job: submit() 的返回值
+            timeout: 最长等待时间（秒），None 表示一直等待
+            poll_interval: 轮询间隔（秒）
+        返回：
+            dict: results（按分片顺序，未完成或进入死信的分片为 None）、dead（{任务项ID: 错误信息}）、complete
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        item_ids = job['item_ids']
+        while True:
+            results = self.broker.results(item_ids)
+            dead = self.broker.dead(item_id for item_id in item_ids if item_id not in results)
+            complete = len(results) + len(dead) == len(item_ids)
+            if complete or (deadline is not None and time.monotonic() >= deadline):
+                return {'results': [results.get(item_id) for item_id in item_ids], 'dead': dead, 'complete': complete}
+            time.sleep(poll_interval)
+
+
+class Worker:
+    """
+    worker：循环取出任务项、处理、确认；处理失败时交给队列决定重试还是移入死信
+    参数：
+        broker: 任务队列
+        handler: 处理函数 handler(task, params) -> 结果，默认使用 warm_daemon 的常驻服务
+        poll_interval: 队列为空时的等待间隔（秒）
+    """
+
+    def __init__(self, broker, handler=None, poll_interval=0.5):
+        self.broker = broker
+        self.state = None
+        if handler is None:
+            from warm_daemon import DaemonState
+            self.state = DaemonState()
+            handler = self.state.handle
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processed = 0
+        self.failed = 0
+
+    def run_once(self):
+        """
+        处理一个任务项
+        返回：
+            bool: 是否取到了任务项
+        """
+        reserved = self.broker.reserve()
+        if reserved is None:
+            return False
+        item_id, payload, attempt = reserved
+        try:
+            result = self.handler(payload['task'], payload['params'])
+        except Exception as e:
+            outcome = self.broker.nack(item_id, f"{type(e).__name__}: {e}")
+            self.failed += 1
+            print(f"[{self.worker_id}] {item_id} 第{attempt}次处理失败（{outcome}）: {e}", file=sys.stderr)
+        else:
+            self.broker.ack(item_id, result)
+            self.processed += 1
+        return True
+
+    def run(self, max_items=None, idle_timeout=None, stop_event=None):
+        """
+        循环处理任务项
+        参数：
+            max_items: 最多处理的任务项数，None 表示不限
+            idle_timeout: 队列连续为空超过该时长（秒）后退出，None 表示一直等待
+            stop_event: threading.Event，被设置后退出
+        返回：
+            int: 成功处理的任务项数
+        """
+        idle_since = None
+        handled = 0
+        while not (stop_event and stop_event.is_set()) and (max_items is None or handled < max_items):
+            if self.run_once():
+                handled += 1
+                idle_since = None
+                continue
+            idle_since = idle_since or time.monotonic()
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                break
+            time.sleep(self.poll_interval)
+        return self.processed
+
+    def close(self):
+        """保存常驻服务的缓存快照"""
+        if self.state is not None:
+            self.state.close()
+
+
+def benchmark_scaling(worker_counts=(1, 2, 4, 8), n_records=400, shard_size=5, latency=0.02, broker_factory=None):
+    """
+    验证吞吐量随 worker 数量线性增长：用 sleep 模拟大模型调用延迟，多个 worker 线程并行消费同一个队列
+    参数：
+        worker_counts: 依次测试的 worker 数量
+        n_records: 每轮的评论数
+        shard_size: 每个分片的评论数
+        latency: 每条评论的模拟处理延迟（秒）
+        broker_factory: 创建任务队列的函数，默认 InMemoryBroker
+    返回：
+        list: 每个 worker 数量的 {workers, seconds, records_per_s, speedup}
+    """
+    broker_factory = broker_factory or InMemoryBroker
+
+    def handler(task, params):
+        time.sleep(latency * len(params['reviews']))
+        return ['正向' for _ in params['reviews']]
+
+    rows = []
+    for n_workers in worker_counts:
+        broker = broker_factory()
+        coordinator = Coordinator(broker, shard_size=shard_size)
+        job = coordinator.submit('sentiment', [f"评论{i}" for i in range(n_records)])
+        stop_event = threading.Event()
+        workers = [Worker(broker, handler=handler, poll_interval=0.005) for _ in range(n_workers)]
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker.run, kwargs={'stop_event': stop_event}) for worker in workers]
+        for thread in threads:
+            thread.start()
+        outcome = coordinator.wait(job, poll_interval=0.005)
+        seconds = time.perf_counter() - start
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        assert outcome['complete'] and not outcome['dead']
+        rows.append({'workers': n_workers, 'seconds': round(seconds, 3),
+                     'records_per_s': round(n_records / seconds, 1)})
+    for row in rows:
+        row['speedup'] = round(row['records_per_s'] / rows[0]['records_per_s'], 2)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分布式任务队列：多台机器上的 worker 分摊大模型批处理')
+    parser.add_argument('--redis-url', default=None, help="Redis 地址，默认读取 REDIS_URL；'memory://' 使用进程内队列")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help='队列名；不同任务类型需要不同的 worker 时可以分开使用不同队列')
+    parser.add_argument('--visibility-timeout', type=float, default=300, help='任务项租约时长（秒）')
+    parser.add_argument('--max-attempts', type=int, default=3, help='每个任务项的最大尝试次数')
+    sub = parser.add_subparsers(dest='command', required=True)
+    submit_parser = sub.add_parser('submit', help='分片提交批任务')
+    submit_parser.add_argument('task', choices=sorted({*BATCH_PARAM_KEYS, *SINGLE_PARAM_KEYS}))
+    submit_parser.add_argument('input', help='输入文件，每行一条记录（评论或告警，告警中的换行写成 \\n；'
+                                             'fraud 每行一个理赔 JSON 对象）')
+    submit_parser.add_argument('--shard-size', type=int, default=20, help='批量任务每个分片的记录数')
+    submit_parser.add_argument('--wait', action='store_true', help='等待全部分片完成并输出结果')
+    worker_parser = sub.add_parser('worker', help='启动 worker')
+    worker_parser.add_argument('--idle-timeout', type=float, default=None, help='队列空闲超过该时长（秒）后退出')
+    sub.add_parser('stats', help='查看队列状态')
+    bench_parser = sub.add_parser('bench', help='进程内模拟延迟，测试吞吐量随 worker 数的扩展')
+    bench_parser.add_argument('--workers', default='1,2,4,8', help='worker 数量，逗号分隔')
+    bench_parser.add_argument('--records', type=int, default=400)
+    bench_parser.add_argument('--latency', type=float, default=0.02, help='每条记录的模拟延迟（秒）')
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        rows = benchmark_scaling([int(n) for n in args.workers.split(',')], args.records, latency=args.latency)
+        print(f"{'workers':>8} {'seconds':>8} {'records/s':>10} {'speedup':>8}")
+        for row in rows:
+            print(f"{row['workers']:>8} {row['seconds']:>8} {row['records_per_s']:>10} {row['speedup']:>8}")
+        return 0
+
+    broker = open_broker(args.redis_url, queue=args.queue,
+                         visibility_timeout=args.visibility_timeout, max_attempts=args.max_attempts)
+    if args.command == 'stats':
+        print(json.dumps(broker.stats(), ensure_ascii=False, indent=2))
+    elif args.command == 'submit':
+        try:
+            records = read_records(args.task, args.input)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        coordinator = Coordinator(broker, shard_size=args.shard_size)
+        job = coordinator.submit(args.task, records)
+        print(f"已提交任务 {job['job_id']}: {len(records)} 条记录，{len(job['item_ids'])} 个分片")
+        if args.wait:
+            outcome = coordinator.wait(job)
+            for item_id, result in zip(job['item_ids'], outcome['results']):
+                print(json.dumps({'item_id': item_id, 'result': result, 'error': outcome['dead'].get(item_id)},
+                                 ensure_ascii=False))
+    elif args.command == 'worker':
+        # 各脚本的缓存、轨迹等相对路径以本目录为基准（与 warm_daemon 一致）
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        worker = Worker(broker)
+        print(f"worker {worker.worker_id} 已启动，队列 {args.queue}")
+        try:
+            worker.run(idle_timeout=args.idle_timeout)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
+            print(f"worker 已停止：成功 {worker.processed} 个，失败 {worker.failed} 个")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())